@@ -1,15 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event, select
 from core import db
+import unit_of_work
 
 class Application(db.Model):
     __tablename__ = 'applications'
+    __table_args__ = (
+        # Отклики на вакансии работодателя в порядке поступления (keyset-пагинация)
+        db.Index('ix_applications_job_created_id', 'job_id', 'created_at', 'id'),
+        # Все отклики работодателя в порядке поступления (список откликов по всем вакансиям)
+        db.Index('ix_applications_employer_created_id', 'employer_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
     # Foreign keys
     job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), nullable=False, index=True)
     applicant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # Копия jobs.employer_id: заполняется при вставке (см. _fill_employer_id)
+    employer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     
     # Application content
     cover_letter = db.Column(db.Text, nullable=True)
@@ -97,7 +107,7 @@ class Application(db.Model):
         if notes:
             self.employer_notes = notes
         
-        db.session.commit()
+        unit_of_work.commit()
         return old_status, new_status
     
     def schedule_interview(self, interview_date, interview_type='video', notes=None):
@@ -109,7 +119,7 @@ class Application(db.Model):
             self.interview_notes = notes
         self.status = 'interview'
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        unit_of_work.commit()
     
     def get_notice_period_display(self):
         """Возвращает период уведомления в читаемом формате"""
@@ -215,29 +225,9 @@ class Application(db.Model):
     @staticmethod
     def get_statistics(employer_id=None, days=30):
         """Получает статистику по откликам"""
-        from datetime import timedelta
+        from stats_service import application_statistics
         
-        since_date = datetime.utcnow() - timedelta(days=days)
-        query = Application.query.filter(Application.created_at >= since_date)
-        
-        if employer_id:
-            query = query.join(Job).filter(Job.employer_id == employer_id)
-        
-        total = query.count()
-        pending = query.filter_by(status='pending').count()
-        reviewed = query.filter_by(status='reviewed').count()
-        accepted = query.filter_by(status='accepted').count()
-        rejected = query.filter_by(status='rejected').count()
-        
-        return {
-            'total': total,
-            'pending': pending,
-            'reviewed': reviewed,
-            'accepted': accepted,
-            'rejected': rejected,
-            'response_rate': round((reviewed + accepted + rejected) / total * 100, 1) if total > 0 else 0,
-            'acceptance_rate': round(accepted / total * 100, 1) if total > 0 else 0
-        }
+        return application_statistics(employer_id=employer_id, days=days)
     
     @staticmethod
     def check_duplicate(job_id, applicant_id):
@@ -247,3 +237,10 @@ class Application(db.Model):
             applicant_id=applicant_id
         ).first() is not None
 
+
+@event.listens_for(Application, 'before_insert')
+def _fill_employer_id(mapper, connection, target):
+    """Заполняет employer_id по вакансии, если его не передали явно"""
+    if target.employer_id is None and target.job_id is not None:
+        from job import Job
+        target.employer_id = connection.scalar(select(Job.employer_id).where(Job.id == target.job_id))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк отрисовки сообщений дайджеста
+
+Моделирует дайджест по 10 000 вакансий: каждое сообщение содержит 10
+вакансий, как send_user_digest. Сравнивает прежнюю сборку строк
+конкатенацией (без экранирования HTML) с шаблонами rendering, которые
+экранируют каждое поле. Каждый прогон начинается с пустых кэшей rendering:
+строка вакансии отрисовывается при первом появлении в дайджесте, а в
+следующих сообщениях берется по содержимому. БД не нужна: вакансии
+создаются в памяти.
+
+Выигрыш есть только за счет повторов: при 10 000 сообщений шаблоны
+быстрее конкатенации (около 0.85-0.9). Когда почти каждая вакансия в
+дайджесте встречается впервые (--messages 1000), шаблоны не быстрее и до
+~1.2 раза медленнее: это цена экранирования, которого прежде не было.
+
+    python bench_rendering.py --jobs 10000 --messages 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from job import Job
+import rendering
+
+JOBS_PER_MESSAGE = 10
+
+# Прогонов каждого варианта
+REPEAT = 5
+
+
+def make_jobs(count: int, rng: random.Random) -> list:
+    """Вакансии в памяти с разными вилками зарплат"""
+    now = datetime.utcnow()
+    cities = ['Москва', 'Санкт-Петербург', 'Казань', None]
+    jobs = []
+    for job_id in range(1, count + 1):
+        salary_min = rng.choice([None, 80000, 100000, 150000])
+        salary_max = rng.choice([None, 200000, 250000])
+        jobs.append(Job(
+            id=job_id, title=f'Python-разработчик <{job_id}>', company=f'ООО "Компания {job_id % 500}"',
+            location=rng.choice(cities), salary_min=salary_min, salary_max=salary_max, salary_currency='RUB',
+            description='Разработка сервисов & интеграций. ' * 10,
+            created_at=now - timedelta(minutes=job_id), updated_at=now
+        ))
+    return jobs
+
+
+def legacy_digest(jobs: list) -> str:
+    """Сборка сообщения сводки конкатенацией (как до rendering)"""
+    text = f"🔔 <b>Найдено {len(jobs)} новых вакансий по вашим подпискам</b>\n\n"
+    for i, job in enumerate(jobs, 1):
+        salary_range = "По договоренности"
+        if job.salary_min and job.salary_max:
+            salary_range = f"{job.salary_min:,} - {job.salary_max:,} руб."
+        elif job.salary_min:
+            salary_range = f"от {job.salary_min:,} руб."
+        elif job.salary_max:
+            salary_range = f"до {job.salary_max:,} руб."
+        text += f"{i}. <b>{job.title}</b> в {job.company}\n"
+        text += f"   📍 {job.location or 'Не указано'} | 💰 {salary_range}\n"
+        text += f"   🔎 \"Python\"\n\n"
+    return text
+
+
+def template_digest(jobs: list) -> str:
+    """Сборка сообщения сводки через rendering"""
+    text = f"🔔 <b>Найдено {len(jobs)} новых вакансий по вашим подпискам</b>\n\n"
+    for i, job in enumerate(jobs, 1):
+        text += f"{i}. " + rendering.render_job_summary(job)
+        text += f"   🔎 \"Python\"\n\n"
+    return text
+
+
+def reset_caches():
+    """Каждый прогон начинается с пустых кэшей rendering, как новый дайджест"""
+    rendering._render_summary.cache_clear()
+
+
+def measure(name: str, build, messages: list, repeat: int = REPEAT) -> float:
+    """Лучшее время из repeat прогонов (меньше всего шума от планировщика ОС)"""
+    elapsed = float('inf')
+    for _ in range(repeat):
+        reset_caches()
+        started_at = time.perf_counter()
+        for jobs in messages:
+            build(jobs)
+        elapsed = min(elapsed, time.perf_counter() - started_at)
+    per_message = elapsed / len(messages) * 1e6
+    print(f"{name:<32} {elapsed:8.3f} с  {per_message:8.1f} мкс/сообщение")
+    return per_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Стоимость отрисовки сообщений дайджеста')
+    parser.add_argument('--jobs', type=int, default=10000, help='Количество вакансий')
+    parser.add_argument('--messages', type=int, default=10000, help='Количество сообщений')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    jobs = make_jobs(args.jobs, rng)
+    messages = [rng.sample(jobs, JOBS_PER_MESSAGE) for _ in range(args.messages)]
+
+    print(f"Дайджест: {args.jobs} вакансий, {args.messages} сообщений по {JOBS_PER_MESSAGE} вакансий\n")
+    legacy = measure('конкатенация', legacy_digest, messages)
+    templated = measure('шаблоны с экранированием', template_digest, messages)
+    print(f"\nШаблоны / конкатенация: {templated / legacy:.2f} (меньше 1 - шаблоны быстрее)")
+
+
+if __name__ == '__main__':
+    main()
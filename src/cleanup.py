@@ -0,0 +1,120 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, exists, func, select, update
+
+from core import db
+from job import Job
+from application import Application
+from subscription import Subscription
+from notification_log import NotificationLog
+from job_cache import job_cards
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки: одна пачка - один короткий UPDATE/DELETE и один commit
+CLEANUP_CHUNK_SIZE = int(os.getenv('CLEANUP_CHUNK_SIZE', 1000))
+
+# Режим проверки: только подсчитать, что было бы изменено
+CLEANUP_DRY_RUN = os.getenv('CLEANUP_DRY_RUN', 'false').lower() == 'true'
+
+# Вакансии без откликов старше этого срока деактивируются
+STALE_JOB_AGE = timedelta(days=90)
+
+# Сколько хранить журнал отправленных уведомлений
+NOTIFICATION_LOG_RETENTION = timedelta(days=90)
+
+
+def _run_chunked(name: str, id_column, condition, build_statement, dry_run: bool, chunk_size: int) -> int:
+    """
+    Выполняет изменение пачками по chunk_size строк
+
+    Каждая пачка выбирает ID подзапросом (ORDER BY id LIMIT ... FOR UPDATE
+    SKIP LOCKED), изменяется одним запросом и сразу фиксируется, поэтому
+    память и длительность блокировок не зависят от размера таблицы.
+
+    Args:
+        name: Название шага для логов
+        id_column: Колонка первичного ключа
+        condition: Условие отбора строк
+        build_statement: Функция (подзапрос ID) -> UPDATE/DELETE
+        dry_run: Только подсчитать строки
+        chunk_size: Размер пачки
+
+    Returns:
+        int: Количество измененных (при dry_run - подходящих) строк
+    """
+    if dry_run:
+        count = db.session.execute(select(func.count()).select_from(id_column.table).where(condition)).scalar()
+        db.session.rollback()
+        logger.info(f"Очистка (проверка): {name} - будет затронуто {count} строк")
+        return count
+
+    total = 0
+    chunks = 0
+    while True:
+        ids = (
+            select(id_column).where(condition)
+            .order_by(id_column).limit(chunk_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        affected = db.session.execute(build_statement(ids)).rowcount
+        db.session.commit()
+        total += affected
+        chunks += 1
+        if affected:
+            logger.info(f"Очистка: {name} - пачка {chunks}, {affected} строк (всего {total})")
+        if affected < chunk_size:
+            break
+    return total
+
+
+def deactivate_expired_subscriptions(now: Optional[datetime] = None, dry_run: bool = CLEANUP_DRY_RUN,
+                                     chunk_size: int = CLEANUP_CHUNK_SIZE) -> int:
+    """Деактивирует активные подписки с истекшим сроком"""
+    now = now or datetime.utcnow()
+    table = Subscription.__table__
+    condition = (table.c.is_active == True) & (table.c.expires_at < now)
+    return _run_chunked(
+        'истекшие подписки', table.c.id, condition,
+        lambda ids: update(table).where(table.c.id.in_(ids)).values(is_active=False, updated_at=now),
+        dry_run, chunk_size
+    )
+
+
+def deactivate_stale_jobs(now: Optional[datetime] = None, dry_run: bool = CLEANUP_DRY_RUN,
+                          chunk_size: int = CLEANUP_CHUNK_SIZE) -> int:
+    """Деактивирует вакансии старше STALE_JOB_AGE, на которые нет откликов"""
+    now = now or datetime.utcnow()
+    table = Job.__table__
+    applications = Application.__table__
+    condition = (
+        (table.c.is_active == True)
+        & (table.c.created_at < now - STALE_JOB_AGE)
+        & ~exists().where(applications.c.job_id == table.c.id)
+    )
+    deactivated = _run_chunked(
+        'старые вакансии без откликов', table.c.id, condition,
+        lambda ids: update(table).where(table.c.id.in_(ids)).values(is_active=False, updated_at=now),
+        dry_run, chunk_size
+    )
+    if deactivated and not dry_run:
+        # Массовый UPDATE идет в обход ORM, поэтому кэш карточек сбрасывается целиком
+        job_cards.clear(broadcast=True)
+    return deactivated
+
+
+def purge_notification_log(now: Optional[datetime] = None, dry_run: bool = CLEANUP_DRY_RUN,
+                           chunk_size: int = CLEANUP_CHUNK_SIZE) -> int:
+    """Удаляет записи журнала уведомлений старше NOTIFICATION_LOG_RETENTION"""
+    now = now or datetime.utcnow()
+    table = NotificationLog.__table__
+    condition = table.c.sent_at < now - NOTIFICATION_LOG_RETENTION
+    return _run_chunked(
+        'журнал уведомлений', table.c.id, condition,
+        lambda ids: delete(table).where(table.c.id.in_(ids)),
+        dry_run, chunk_size
+    )
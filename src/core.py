@@ -1,5 +1,6 @@
 # core.py
 import os
+import json
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy  # <--- Важный импорт
@@ -7,12 +8,16 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# после load_dotenv: настройки пула и реплики читаются из окружения
+from db_pool import DB_PGBOUNCER, engine_options, install_pgbouncer_mode, session_options
+import read_replica
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # --- Правильная инициализация ---
 app = Flask(__name__)
-db = SQLAlchemy() # <--- Создаем объект SQLAlchemy
+db = SQLAlchemy(session_options={**session_options(), 'class_': read_replica.RoutingSession}) # <--- Создаем объект SQLAlchemy
 
 # Конфигурируем Flask-приложение
 db_user = os.getenv('POSTGRES_USER')
@@ -25,9 +30,40 @@ if not all([db_user, db_password, db_host, db_port, db_name]):
     logger.error("Ключевые переменные окружения для подключения к БД не установлены!")
 
 DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+# Прямое подключение к PostgreSQL в обход PgBouncer (для LISTEN, которому нужна постоянная сессия)
+db_direct_host = os.getenv('POSTGRES_DIRECT_HOST') or db_host
+db_direct_port = os.getenv('POSTGRES_DIRECT_PORT') or db_port
+DATABASE_DIRECT_URL = f"postgresql://{db_user}:{db_password}@{db_direct_host}:{db_direct_port}/{db_name}"
+
+# Реплика для чтения; без POSTGRES_REPLICA_HOST все запросы идут на основную БД
+db_replica_host = os.getenv('POSTGRES_REPLICA_HOST')
+db_replica_port = os.getenv('POSTGRES_REPLICA_PORT') or db_port
+DATABASE_REPLICA_URL = (
+    f"postgresql://{db_user}:{db_password}@{db_replica_host}:{db_replica_port}/{db_name}" if db_replica_host else None
+)
+
+if DB_PGBOUNCER:
+    install_pgbouncer_mode()
+read_replica.configure(DATABASE_REPLICA_URL)
+
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Размер пула, таймауты и statement_timeout задаются переменными DB_* (см. db_pool)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 
 # Связываем SQLAlchemy с нашим приложением
 # ЭТОТ ШАГ ИСПРАВЛЯЕТ ОШИБКУ 'RuntimeError'
 db.init_app(app)
+
+
+def as_json_list(value):
+    """Список из значения JSONB-колонки (поддерживаются и старые JSON-строки)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [part.strip() for part in value.split(',') if part.strip()]
+    return list(value) if isinstance(value, (list, tuple)) else [value]
@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Подключение через PgBouncer в режиме pool_mode=transaction
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+# Постоянные соединения пула на процесс (0 - без пула, NullPool)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+
+# Дополнительные соединения сверх DB_POOL_SIZE при пиковой нагрузке
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+
+# Сколько ждать свободное соединение (сек.), затем TimeoutError
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+
+# Пересоздавать соединения старше этого возраста (сек.; -1 - никогда)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+# Проверять соединение перед выдачей из пула (SELECT 1)
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+# Ограничение времени одного запроса на сервере (мс; 0 - без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+
+# Таймаут установки соединения (сек.)
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+
+# Ожидание соединения дольше этого порога (мс) считается медленным
+DB_POOL_SLOW_CHECKOUT_MS = int(os.getenv('DB_POOL_SLOW_CHECKOUT_MS', 100))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который считает выдачи соединений, время ожидания и таймауты
+
+    Время ожидания включает ожидание свободного соединения, создание нового
+    и pre-ping. Счетчики читаются через get_stats().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._slow_checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            logger.warning(f"Пул соединений БД исчерпан: {self.status()}")
+            raise
+        waited = time.perf_counter() - started_at
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if waited * 1000 >= DB_POOL_SLOW_CHECKOUT_MS:
+                self._slow_checkouts += 1
+        return connection
+
+    def get_stats(self) -> dict:
+        """Текущее состояние пула и накопленные метрики ожидания"""
+        with self._stats_lock:
+            checkouts = self._checkouts
+            stats = {
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'slow_checkouts': self._slow_checkouts,
+                'wait_avg_ms': round(self._wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 2),
+            }
+        stats.update({
+            'size': self.size(),
+            'connections': self.size() + self.overflow(),  # overflow() < 0, пока пул не заполнен
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': max(0, self.overflow()),
+            'max_overflow': self._max_overflow,
+            'timeout': self.timeout(),
+        })
+        return stats
+
+
+def engine_options() -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS из переменных окружения DB_*"""
+    connect_args = {
+        'connect_timeout': DB_CONNECT_TIMEOUT,
+        'application_name': os.getenv('DB_APPLICATION_NAME', 'telegram-hr-bot'),
+    }
+    # PgBouncer не передает параметр options серверу: там таймаут ставится в каждой транзакции
+    if DB_STATEMENT_TIMEOUT_MS > 0 and not DB_PGBOUNCER:
+        connect_args['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+
+    if DB_POOL_SIZE <= 0:
+        return {'poolclass': NullPool, 'pool_pre_ping': DB_POOL_PRE_PING, 'connect_args': connect_args}
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'connect_args': connect_args,
+    }
+
+
+def session_options() -> dict:
+    """Параметры сессии: за PgBouncer объекты не перечитываются после commit"""
+    if DB_PGBOUNCER:
+        return {'expire_on_commit': False}
+    return {}
+
+
+def _set_local_statement_timeout(connection):
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+
+def _mark_flushed(session, flush_context):
+    session.info['has_writes'] = True
+
+
+def _mark_executed(orm_execute_state):
+    # session.execute(update(...)) и т.п. пишут без flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['has_writes'] = True
+
+
+def _clear_flushed(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('has_writes', None)
+
+
+def track_writes():
+    """Отмечает в session.info['has_writes'], что текущая транзакция уже записывала (flush или не-SELECT запрос)"""
+    if not event.contains(Session, 'after_flush', _mark_flushed):
+        event.listen(Session, 'after_flush', _mark_flushed)
+        event.listen(Session, 'do_orm_execute', _mark_executed)
+        event.listen(Session, 'after_transaction_end', _clear_flushed)
+
+
+def install_pgbouncer_mode():
+    """Включает совместимость с PgBouncer (pool_mode=transaction)
+
+    В этом режиме серверное соединение закреплено за клиентом только на время
+    транзакции, поэтому состояние уровня сессии не используется:
+    statement_timeout ставится SET LOCAL в начале каждой транзакции.
+    psycopg2 не создает серверных prepared statements, а именованные курсоры
+    (yield_per) живут внутри транзакции, так что оба безопасны.
+    """
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        event.listen(Engine, 'begin', _set_local_statement_timeout)
+    track_writes()
+    logger.info("БД: режим PgBouncer (транзакционный пул)")
+
+
+def release_read_transaction(session):
+    """Завершает транзакцию сессии, если в ней только чтение
+
+    Вызывается перед сетевыми запросами (Telegram API), чтобы соединение
+    PgBouncer не простаивало внутри транзакции. Транзакция с изменениями
+    (в том числе уже отправленными flush) не трогается.
+    """
+    if not session.in_transaction() or session.info.get('has_writes'):
+        return
+    if session.new or session.dirty or session.deleted:
+        return
+    session.commit()
+
+
+def disable_statement_timeout(executor):
+    """Снимает DB_STATEMENT_TIMEOUT_MS до конца текущей транзакции (миграции, пакетные задачи)
+
+    Args:
+        executor: Connection или Session (для сессии с репликой - соединение, в котором пойдет запрос,
+            см. RoutingSession)
+    """
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        executor.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+def pool_stats(engine) -> dict:
+    """Метрики пула соединений движка (для мониторинга)"""
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.get_stats()
+    return {'status': pool.status()}
@@ -0,0 +1,348 @@
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+from telebot.apihelper import ApiHTTPException, ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду на бота и ~1 сообщение в секунду в один чат
+DEFAULT_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', 8))
+DEFAULT_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 28))
+DEFAULT_CHAT_INTERVAL = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 1.0))
+DEFAULT_MAX_RETRIES = int(os.getenv('NOTIFICATION_MAX_RETRIES', 5))
+# 429 не расходует обычные попытки, но и ждать бесконечно сообщение не должно
+DEFAULT_MAX_RATE_LIMITED = int(os.getenv('NOTIFICATION_MAX_RATE_LIMITED', 10))
+DEFAULT_MAX_PENDING = int(os.getenv('NOTIFICATION_MAX_PENDING', 200000))
+
+# Коды ошибок, при которых повторная отправка бессмысленна (бот заблокирован, чат не найден и т.п.)
+PERMANENT_ERROR_CODES = {400, 403, 404}
+
+# Как часто писать в лог прогресс отправки
+PROGRESS_LOG_EVERY = 1000
+
+
+class DeliveryMessage:
+    """Сообщение в очереди доставки"""
+
+    __slots__ = ('chat_id', 'text', 'kwargs', 'callback', 'attempts', 'rate_limited')
+
+    def __init__(self, chat_id: int, text: str, kwargs: dict, callback: Optional[Callable] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.callback = callback
+        self.attempts = 0
+        self.rate_limited = 0
+
+
+class TokenBucket:
+    """Ограничитель скорости по алгоритму token bucket"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов (например, после ответа 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def acquire(self):
+        """Блокирует поток до получения токена"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class NotificationDelivery:
+    """Очередь доставки уведомлений с пулом воркеров и соблюдением лимитов Telegram
+
+    Сообщения отправляются в фоне: глобальный лимит обеспечивает token bucket,
+    лимит на чат - резервирование слотов по времени. Ответ 429 приостанавливает
+    отправку на retry_after секунд (не больше max_rate_limited раз на
+    сообщение), сетевые ошибки и 5xx повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(self, bot, workers: int = DEFAULT_WORKERS, global_rate: float = DEFAULT_GLOBAL_RATE,
+                 chat_interval: float = DEFAULT_CHAT_INTERVAL, max_retries: int = DEFAULT_MAX_RETRIES,
+                 max_pending: int = DEFAULT_MAX_PENDING, max_rate_limited: int = DEFAULT_MAX_RATE_LIMITED):
+        """
+        Args:
+            bot: Экземпляр telebot.TeleBot
+            workers: Количество потоков отправки
+            global_rate: Максимум сообщений в секунду на бота
+            chat_interval: Минимальный интервал между сообщениями в один чат (сек.)
+            max_retries: Максимум повторных попыток для одного сообщения
+            max_pending: Максимальный размер очереди (при переполнении enqueue ждет)
+            max_rate_limited: Сколько раз сообщение может получить 429, прежде чем считаться недоставленным
+        """
+        self.bot = bot
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self.max_rate_limited = max_rate_limited
+
+        self._bucket = TokenBucket(global_rate)
+        self._heap = []  # (ready_at, seq, message)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._chat_slots: Dict[int, float] = {}
+        self._in_flight = 0
+        self._threads = []
+        self.running = False
+
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    # === УПРАВЛЕНИЕ ===
+
+    def start(self):
+        """Запускает воркеры доставки (повторный вызов ничего не делает)"""
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+            self._threads = [
+                threading.Thread(target=self._worker, name=f'delivery-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Очередь доставки запущена: {self.workers} воркеров")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает воркеры, дождавшись отправки очереди"""
+        self.join(timeout)
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        logger.info("Очередь доставки остановлена")
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Ждет, пока очередь опустеет; возвращает False по таймауту"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # === ПОСТАНОВКА В ОЧЕРЕДЬ ===
+
+    def enqueue(self, chat_id: int, text: str, callback: Optional[Callable] = None, **kwargs):
+        """
+        Ставит сообщение в очередь отправки
+
+        Args:
+            chat_id: ID чата получателя
+            text: Текст сообщения
+            callback: Необязательная функция callback(message, ok), вызывается после доставки или отказа
+            **kwargs: Дополнительные параметры send_message (parse_mode, reply_markup, ...)
+        """
+        self.start()
+        message = DeliveryMessage(chat_id, text, kwargs, callback)
+        with self._cond:
+            while len(self._heap) >= self.max_pending:
+                self._cond.wait()
+            idle = not self._heap and not self._in_flight
+            self._push(message, self._reserve_chat_slot(chat_id))
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+            if idle:
+                # Новая волна рассылки: пропускная способность считается с ее начала
+                self._run_started_at = time.monotonic()
+                self._run_finished_at = self._run_started_at
+                self._run_sent = 0
+
+    def pending(self) -> int:
+        """Количество сообщений, ожидающих отправки"""
+        with self._cond:
+            return len(self._heap) + self._in_flight
+
+    def _push(self, message: DeliveryMessage, ready_at: float):
+        heapq.heappush(self._heap, (ready_at, next(self._seq), message))
+        self._cond.notify_all()
+
+    def _reserve_chat_slot(self, chat_id: int, not_before: float = 0.0) -> float:
+        """Резервирует ближайшее время отправки в чат с учетом интервала (вызывается под self._cond)"""
+        now = time.monotonic()
+        slot = max(now, not_before, self._chat_slots.get(chat_id, 0.0))
+        self._chat_slots[chat_id] = slot + self.chat_interval
+        if len(self._chat_slots) > self.max_pending:
+            self._chat_slots = {cid: t for cid, t in self._chat_slots.items() if t > now}
+        return slot
+
+    # === ВОРКЕРЫ ===
+
+    def _next_message(self) -> Optional[DeliveryMessage]:
+        with self._cond:
+            while self.running:
+                if self._heap:
+                    ready_at = self._heap[0][0]
+                    wait = ready_at - time.monotonic()
+                    if wait <= 0:
+                        _, _, message = heapq.heappop(self._heap)
+                        self._in_flight += 1
+                        self._cond.notify_all()
+                        return message
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            message = self._next_message()
+            if message is None:
+                return
+            try:
+                self._deliver(message)
+            except Exception as e:
+                logger.error(f"Ошибка в воркере доставки: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _deliver(self, message: DeliveryMessage):
+        self._bucket.acquire()
+        message.attempts += 1
+        try:
+            self.bot.send_message(message.chat_id, message.text, **message.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = self._retry_after(e)
+                logger.warning(f"Telegram 429 для чата {message.chat_id}, пауза {retry_after} с")
+                self._bucket.pause(retry_after)
+                self._count('rate_limited')
+                message.rate_limited += 1
+                if message.rate_limited > self.max_rate_limited:
+                    logger.error(f"Сообщение в чат {message.chat_id} не доставлено: "
+                                 f"получено {message.rate_limited} ответов 429")
+                    self._finish(message, ok=False)
+                else:
+                    self._retry(message, retry_after, counted=False)
+            elif e.error_code in PERMANENT_ERROR_CODES:
+                logger.warning(f"Сообщение в чат {message.chat_id} не доставлено: {e.description}")
+                self._finish(message, ok=False)
+            else:
+                self._retry(message, self._backoff(message.attempts), error=e)
+            return
+        except (requests.exceptions.RequestException, ApiHTTPException) as e:
+            # Сетевые ошибки и ответы без JSON (502 от прокси и т.п.) - временные
+            self._retry(message, self._backoff(message.attempts), error=e)
+            return
+        except Exception as e:
+            # Прочее (ошибка в параметрах сообщения и т.п.) повтор не исправит
+            logger.error(f"Сообщение в чат {message.chat_id} не доставлено: {e!r}")
+            self._finish(message, ok=False)
+            return
+
+        self._finish(message, ok=True)
+
+    @staticmethod
+    def _retry_after(error: ApiTelegramException) -> float:
+        try:
+            return float(error.result_json['parameters']['retry_after'])
+        except (KeyError, TypeError, ValueError):
+            return 1.0
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(60.0, 2 ** (attempt - 1)) + random.uniform(0, 0.5)
+
+    def _retry(self, message: DeliveryMessage, delay: float, error: Optional[Exception] = None, counted: bool = True):
+        if counted and message.attempts > self.max_retries:
+            logger.error(f"Сообщение в чат {message.chat_id} не доставлено после {message.attempts} попыток: {error}")
+            self._finish(message, ok=False)
+            return
+        if not counted:
+            # 429 не расходует попытки: сообщение просто ждет retry_after
+            message.attempts -= 1
+        self._count('retried')
+        with self._cond:
+            self._push(message, self._reserve_chat_slot(message.chat_id, time.monotonic() + delay))
+
+    def _finish(self, message: DeliveryMessage, ok: bool):
+        with self._stats_lock:
+            self._stats['sent' if ok else 'failed'] += 1
+            if ok:
+                self._run_sent += 1
+            self._run_finished_at = time.monotonic()
+            done = self._stats['sent'] + self._stats['failed']
+
+        if message.callback:
+            try:
+                message.callback(message, ok)
+            except Exception as e:
+                logger.error(f"Ошибка в callback доставки: {e}")
+
+        if done % PROGRESS_LOG_EVERY == 0 or (ok and self.pending() <= 1):
+            self.log_stats()
+
+    # === СТАТИСТИКА ===
+
+    def _reset_stats(self):
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'rate_limited': 0,
+        }
+        self._run_started_at = None
+        self._run_finished_at = None
+        self._run_sent = 0
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику доставки"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            elapsed = (self._run_finished_at - self._run_started_at) if self._run_started_at else 0.0
+            run_sent = self._run_sent
+        stats['pending'] = self.pending()
+        stats['run_sent'] = run_sent
+        stats['run_seconds'] = round(elapsed, 1)
+        stats['throughput_per_second'] = round(run_sent / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+    def log_stats(self):
+        """Пишет в лог текущую пропускную способность"""
+        stats = self.get_stats()
+        logger.info(
+            f"Доставка: отправлено {stats['sent']}, ошибок {stats['failed']}, "
+            f"повторов {stats['retried']}, 429: {stats['rate_limited']}, в очереди {stats['pending']}, "
+            f"{stats['throughput_per_second']} сообщ./с"
+        )
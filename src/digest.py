@@ -0,0 +1,295 @@
+import logging
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, case, cast, column, exists, func, literal, not_, or_, select, update, values
+from sqlalchemy.dialects.postgresql import JSONB
+
+from core import db
+from user import User
+from job import Job
+from subscription import Subscription
+import job_search
+from db_pool import disable_statement_timeout
+from notification_aggregator import apply_daily_caps, batched, group_by_user, record_sent
+from notifications import Outbox
+
+logger = logging.getLogger(__name__)
+
+# Окно поиска вакансий и минимальный интервал между дайджестами
+DIGEST_PERIODS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+}
+
+# Лимит вакансий в дайджесте, если у подписки он не задан
+DEFAULT_MAX_JOBS = 10
+
+# Размер пачки при потоковом чтении результатов
+STREAM_BATCH_SIZE = 1000
+
+
+def _json(column):
+    """Приводит JSON-текст колонки к jsonb (пустая строка -> NULL)"""
+    return cast(func.nullif(func.btrim(column), ''), JSONB)
+
+
+def _json_array(column):
+    """Возвращает jsonb-массив из JSONB-колонки или пустой массив"""
+    return case(
+        (func.jsonb_typeof(column) == 'array', column),
+        else_=cast(literal('[]'), JSONB)
+    )
+
+
+def _elements(column):
+    """Элементы jsonb-массива колонки как таблица с колонкой value"""
+    return func.jsonb_array_elements_text(_json_array(column)).table_valued('value')
+
+
+def _any_of(column, condition):
+    """Список пуст или хотя бы один элемент удовлетворяет condition(value)"""
+    values = _elements(column)
+    return or_(
+        func.jsonb_array_length(_json_array(column)) == 0,
+        exists(select(literal(1)).select_from(values).where(condition(values.c.value)))
+    )
+
+
+def _lower_equals(job_column):
+    """Условие для _any_of: значение вакансии совпадает с элементом без учета регистра"""
+    return lambda value: func.lower(value) == func.lower(func.coalesce(job_column, ''))
+
+
+def _like(value):
+    """Шаблон ILIKE '%value%' для SQL-выражения"""
+    return func.concat('%', value, '%')
+
+
+def _match_conditions():
+    """Условия соответствия вакансии подписке (та же логика, что и find_matching_jobs)
+
+    Ключевые слова - полнотекстовый поиск со стеммингом; немедленные
+    уведомления сравнивают подстроки (разница описана в CompiledSubscription.matches).
+    """
+    criteria = _json(Subscription.criteria)
+    keywords = criteria['keywords'].astext
+    location = criteria['location'].astext
+    company = criteria['company'].astext
+
+    blacklist = _elements(Subscription.company_blacklist)
+    exclude = _elements(Subscription.exclude_keywords)
+
+    return and_(
+        or_(keywords.is_(None), job_search.text_filter(keywords)),
+        or_(location.is_(None), Job.location.ilike(_like(location))),
+        or_(company.is_(None), Job.company.ilike(_like(company))),
+        or_(func.coalesce(Subscription.min_salary, 0) == 0, Job.salary_min >= Subscription.min_salary),
+        or_(not_(func.coalesce(Subscription.only_remote, False)), Job.is_remote == True),
+        or_(not_(func.coalesce(Subscription.only_featured, False)), Job.is_featured == True),
+        or_(func.coalesce(Job.location, '') == '', _any_of(Subscription.locations, lambda value: Job.location.ilike(_like(value)))),
+        _any_of(Subscription.employment_types, _lower_equals(Job.employment_type)),
+        _any_of(Subscription.experience_levels, _lower_equals(Job.experience_level)),
+        _any_of(Subscription.categories, _lower_equals(Job.category)),
+        ~exists(
+            select(literal(1)).select_from(blacklist)
+            .where(Job.company.ilike(_like(blacklist.c.value)))
+        ),
+        ~exists(
+            select(literal(1)).select_from(exclude)
+            .where(and_(Job.title.ilike(_like(exclude.c.value)), Job.description.ilike(_like(exclude.c.value))))
+        ),
+    )
+
+
+def _due_subscriptions_filter(frequency: str, now: datetime):
+    """Условия для подписок, которым пора отправлять дайджест (см. should_send_notification)"""
+    period = DIGEST_PERIODS[frequency]
+    return and_(
+        Subscription.frequency == frequency,
+        Subscription.is_active == True,
+        Subscription.is_paused == False,
+        or_(Subscription.expires_at.is_(None), Subscription.expires_at >= now),
+        or_(Subscription.last_notification_sent.is_(None), Subscription.last_notification_sent <= now - period),
+    )
+
+
+def shard_filter(shard: int, shards: int):
+    """Условие шарда: подписки пользователей с user_id % shards == shard"""
+    return func.mod(Subscription.user_id, shards) == shard
+
+
+def iter_digest_matches(frequency: str, now: Optional[datetime] = None,
+                        shard: int = 0, shards: int = 1) -> Iterator[Tuple[Subscription, int, List[Job]]]:
+    """
+    Находит вакансии для всех подписок, которым пора отправлять дайджест, одним запросом
+
+    Пары (подписка, вакансия) вычисляются в БД для всего окна дайджеста,
+    результат читается потоково и группируется по подписке; подписки одного
+    пользователя идут подряд.
+
+    Args:
+        frequency: 'daily' или 'weekly'
+        now: Текущее время (по умолчанию datetime.utcnow())
+        shard: Номер шарда (0..shards-1)
+        shards: Количество шардов (1 - все подписки)
+
+    Yields:
+        (подписка, telegram_id пользователя, список вакансий)
+    """
+    now = now or datetime.utcnow()
+    since_date = now - DIGEST_PERIODS[frequency]
+
+    due = _due_subscriptions_filter(frequency, now)
+    if shards > 1:
+        due = and_(due, shard_filter(shard, shards))
+
+    limit = func.coalesce(func.nullif(Subscription.max_notifications_per_day, 0), DEFAULT_MAX_JOBS)
+    rank = func.row_number().over(
+        partition_by=Subscription.id,
+        order_by=(Job.created_at.desc(), Job.id.desc())
+    )
+
+    pairs = (
+        select(
+            Subscription.id.label('subscription_id'),
+            Job.id.label('job_id'),
+            rank.label('rank'),
+            limit.label('max_jobs'),
+        )
+        .select_from(Subscription)
+        .join(Job, and_(
+            Job.is_active == True,
+            Job.created_at >= since_date,
+            _match_conditions(),
+        ))
+        .where(due)
+        .subquery()
+    )
+
+    # Подбор по всем подпискам - пакетная задача, общий лимит времени запроса к ней не относится.
+    # Сам подбор только читает и при наличии реплики выполняется на ней. Соединение (реплика
+    # или основная БД) выбирается один раз, чтобы SET LOCAL и запрос попали в одну транзакцию
+    connection = db.session.connection(bind_arguments={'replica': True})
+    disable_statement_timeout(connection)
+
+    query = (
+        select(Subscription, User.telegram_id, Job)
+        .join(pairs, pairs.c.subscription_id == Subscription.id)
+        .join(Job, Job.id == pairs.c.job_id)
+        .join(User, User.id == Subscription.user_id)
+        .where(pairs.c.rank <= pairs.c.max_jobs)
+        .order_by(Subscription.user_id, Subscription.id, pairs.c.rank)
+    )
+    result = db.session.execute(
+        query,
+        execution_options={'yield_per': STREAM_BATCH_SIZE},
+        bind_arguments={'bind': connection.engine},
+    )
+
+    for _, rows in groupby(result, key=lambda row: row[0].id):
+        rows = list(rows)
+        subscription, telegram_id, _ = rows[0]
+        yield subscription, telegram_id, [job for _, _, job in rows]
+
+
+def mark_digests_sent(jobs_found: Dict[int, int], sent_at: Optional[datetime] = None, connection=None):
+    """
+    Отмечает отправку дайджестов пачкой UPDATE (аналог mark_notification_sent)
+
+    Args:
+        jobs_found: {subscription_id: количество вакансий в дайджесте}
+        sent_at: Время отправки
+        connection: Соединение, в транзакции которого выполнить UPDATE (без commit);
+            по умолчанию db.session с commit
+    """
+    if not jobs_found:
+        return
+
+    sent_at = sent_at or datetime.utcnow()
+    table = Subscription.__table__
+    # Одна инструкция UPDATE ... FROM (VALUES ...) вместо executemany (psycopg2 выполняет его построчно).
+    # updated_at не меняется: отправка не меняет критерии, и скомпилированная подписка в кэше
+    # остается действительной
+    sent = values(column('id', Integer), column('jobs_count', Integer), name='sent').data(list(jobs_found.items()))
+    statement = (
+        update(table)
+        .where(table.c.id == sent.c.id)
+        .values(
+            last_notification_sent=sent_at,
+            total_notifications_sent=func.coalesce(table.c.total_notifications_sent, 0)
+            + case((sent.c.jobs_count > 0, 1), else_=0),
+            total_jobs_found=func.coalesce(table.c.total_jobs_found, 0) + sent.c.jobs_count,
+            updated_at=table.c.updated_at,
+        )
+    )
+    if connection is not None:
+        connection.execute(statement)
+        return
+    db.session.execute(statement)
+    db.session.commit()
+
+
+def send_digest_bulk(delivery, frequency: str, started_at: Optional[datetime] = None,
+                     shard: int = 0, shards: int = 1) -> dict:
+    """
+    Потоково рассылает результаты пакетного подбора и пачкой отмечает отправку
+
+    Вакансии всех подписок пользователя объединяются в одно сообщение без
+    повторов и с учетом скользящего дневного лимита.
+
+    Args:
+        delivery: Очередь доставки (NotificationDelivery)
+        frequency: 'daily' или 'weekly'
+        started_at: Время запуска дайджеста (общее для всех шардов)
+        shard: Номер шарда
+        shards: Количество шардов
+
+    Returns:
+        dict: Метрики (подписки, пользователи, сообщения, время)
+    """
+    started_at = started_at or datetime.utcnow()
+    label = f"Дайджест ({frequency})" if shards == 1 else f"Дайджест ({frequency}), шард {shard + 1}/{shards}"
+    clock = time.monotonic()
+    jobs_found = {}
+    users_seen = 0
+    users_notified = 0
+
+    # closing: при ошибке потоковый курсор закрывается до rollback
+    with closing(iter_digest_matches(frequency, started_at, shard, shards)) as matches:
+        for batch in batched(group_by_user(matches)):
+            digests = apply_daily_caps(batch, started_at)
+            outbox = Outbox()
+            for digest in digests:
+                outbox.add_digest(digest)
+            batch_jobs = {}
+            for digest in batch:
+                batch_jobs.update(digest.jobs_by_subscription())
+            # Журнал и отметки подписок фиксируются на пачку в отдельном соединении:
+            # commit в сессии закрыл бы потоковый курсор подбора, а при сбое
+            # позже повтор не должен отправить эту пачку еще раз. Сообщения
+            # пачки ставятся в очередь только после этого commit
+            with db.engine.begin() as connection:
+                record_sent(digests, started_at, connection)
+                mark_digests_sent(batch_jobs, started_at, connection)
+            outbox.flush(delivery)
+            jobs_found.update(batch_jobs)
+            users_seen += len(batch)
+            users_notified += len(digests)
+            logger.info(f"{label}: обработано {users_seen} пользователей, {users_notified} сообщений в очереди")
+
+    db.session.commit()
+
+    elapsed = time.monotonic() - clock
+    logger.info(f"{label}: {len(jobs_found)} подписок с вакансиями, "
+                f"{users_notified} сообщений, подбор за {elapsed:.1f} с")
+    return {
+        'shard': shard,
+        'subscriptions': len(jobs_found),
+        'users': users_seen,
+        'messages': users_notified,
+        'elapsed': round(elapsed, 2),
+    }
@@ -0,0 +1,116 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Количество процессов (шардов) дайджеста; 1 - выполнение в процессе бота
+DIGEST_WORKERS = int(os.getenv('DIGEST_WORKERS', 1))
+
+# Сколько шард ждет отправки своей очереди сообщений (сек.)
+DIGEST_SHARD_TIMEOUT = int(os.getenv('DIGEST_SHARD_TIMEOUT', 3600))
+
+
+def run_digest_shard(frequency: str, started_at: datetime, shard: int, shards: int) -> dict:
+    """
+    Выполняет один шард дайджеста (точка входа процесса пула)
+
+    Процесс создает собственные подключения к БД и Telegram-клиент, рассылает
+    дайджест подписок пользователей с user_id % shards == shard и ждет, пока
+    его очередь доставки опустеет. Лимит Telegram делится между шардами.
+
+    Returns:
+        dict: Метрики шарда (см. send_digest_bulk) и статистика доставки
+    """
+    import telebot
+    from core import app, db
+    from application import Application  # noqa: F401 (регистрация модели для связей Job)
+    from delivery import DEFAULT_GLOBAL_RATE, NotificationDelivery
+    from digest import send_digest_bulk
+
+    bot = telebot.TeleBot(os.getenv('TELEGRAM_BOT_TOKEN'), threaded=False)
+    delivery = NotificationDelivery(bot, global_rate=DEFAULT_GLOBAL_RATE / shards)
+
+    try:
+        with app.app_context():
+            try:
+                metrics = send_digest_bulk(delivery, frequency, started_at, shard, shards)
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+    finally:
+        # Пачки, зафиксированные до ошибки, все равно доставляются
+        delivery.stop(timeout=DIGEST_SHARD_TIMEOUT)
+
+    stats = delivery.get_stats()
+    metrics.update({
+        'sent': stats['sent'],
+        'failed': stats['failed'],
+        'undelivered': stats['pending'],
+    })
+    return metrics
+
+
+def run_sharded_digest(frequency: str, workers: int = DIGEST_WORKERS,
+                       started_at: Optional[datetime] = None) -> dict:
+    """
+    Делит дайджест на workers шардов по user_id и выполняет их в пуле процессов
+
+    Все подписки пользователя попадают в один шард, поэтому объединение
+    сообщений и дневной лимит работают так же, как в одном процессе.
+    Функция возвращает управление только после завершения всех шардов.
+
+    Args:
+        frequency: 'daily' или 'weekly'
+        workers: Количество процессов и шардов
+        started_at: Время запуска дайджеста (по умолчанию datetime.utcnow())
+
+    Returns:
+        dict: Суммарные метрики, метрики по шардам и номера упавших шардов
+    """
+    started_at = started_at or datetime.utcnow()
+    clock = time.monotonic()
+    results = []
+    failed = []
+
+    # spawn: дочерний процесс не наследует потоки и соединения бота
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {
+            pool.submit(run_digest_shard, frequency, started_at, shard, workers): shard
+            for shard in range(workers)
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append(shard)
+                logger.error(f"Дайджест ({frequency}): шард {shard + 1}/{workers} завершился с ошибкой: {e}")
+                continue
+            results.append(result)
+            logger.info(
+                f"Дайджест ({frequency}): шард {shard + 1}/{workers} готов ({len(results)}/{workers}) - "
+                f"{result['messages']} сообщений, отправлено {result['sent']}, ошибок {result['failed']}, "
+                f"{result['elapsed']} с"
+            )
+
+    totals = {
+        key: sum(result[key] for result in results)
+        for key in ('subscriptions', 'users', 'messages', 'sent', 'failed', 'undelivered')
+    }
+    totals.update({
+        'shards': sorted(results, key=lambda result: result['shard']),
+        'failed_shards': sorted(failed),
+        'elapsed': round(time.monotonic() - clock, 2),
+    })
+    logger.info(
+        f"Дайджест ({frequency}) в {workers} процессах: {totals['subscriptions']} подписок, "
+        f"{totals['messages']} сообщений, отправлено {totals['sent']}, ошибок {totals['failed']}, "
+        f"за {totals['elapsed']} с"
+    )
+    return totals
@@ -0,0 +1,225 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import select
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+from sqlalchemy import func, select as sql_select
+
+logger = logging.getLogger(__name__)
+
+# Тип шины: memory (внутри процесса) или postgres (LISTEN/NOTIFY между экземплярами)
+EVENT_BUS = os.getenv('EVENT_BUS', 'memory').lower()
+EVENTS_CHANNEL = os.getenv('EVENTS_CHANNEL', 'hr_bot_events')
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', 10000))
+
+# Пауза перед переподключением слушателя LISTEN (сек.)
+LISTEN_RECONNECT_DELAY = 5
+
+# Типы событий
+JOB_CREATED = 'job_created'
+JOB_CHANGED = 'job_changed'  # изменение вакансии, сбрасывает кэш карточек
+
+# Маркер остановки обработчика
+_STOP = object()
+
+# Маркер отложенной публикации (publish_later)
+_PUBLISH = object()
+
+
+class EventBus:
+    """Шина событий внутри процесса
+
+    publish() только ставит событие в очередь и сразу возвращается;
+    обработчики вызываются по порядку в фоновом потоке. Ошибка обработчика
+    записывается в лог и не мешает остальным.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self._handlers: Dict[str, List[Callable]] = defaultdict(list)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'failed': 0, 'dropped': 0}
+
+    def subscribe(self, event_type: str, handler: Callable[[dict], None]):
+        """Подписывает обработчик handler(payload) на события event_type"""
+        with self._lock:
+            self._handlers[event_type].append(handler)
+        self.start()
+
+    def publish(self, event_type: str, payload: Optional[dict] = None) -> bool:
+        """Публикует событие; возвращает False, если очередь переполнена"""
+        self._count('published')
+        return self._deliver(event_type, payload or {})
+
+    def publish_later(self, event_type: str, payload: Optional[dict] = None) -> bool:
+        """Публикует событие из фонового потока шины
+
+        Для вызова из мест, которые не должны ждать публикации (after_commit,
+        обработчики update): NOTIFY у PostgresEventBus выполняется в потоке шины.
+        """
+        return self._deliver(_PUBLISH, (event_type, payload or {}))
+
+    def _deliver(self, event_type, payload) -> bool:
+        """Ставит событие в очередь локальных обработчиков"""
+        self.start()
+        try:
+            self._queue.put_nowait((event_type, payload))
+        except queue.Full:
+            self._count('dropped')
+            name = payload[0] if event_type is _PUBLISH else event_type
+            logger.warning(f"Очередь событий переполнена, событие {name} пропущено")
+            return False
+        return True
+
+    def start(self):
+        """Запускает обработку событий (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='event-bus', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = 5):
+        """Останавливает обработку после событий, уже стоящих в очереди"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            event_type, payload = item
+            if event_type is _PUBLISH:
+                self.publish(*payload)
+                continue
+            with self._lock:
+                handlers = list(self._handlers.get(event_type, ()))
+            for handler in handlers:
+                try:
+                    handler(payload)
+                    self._count('delivered')
+                except Exception as e:
+                    self._count('failed')
+                    logger.error(f"Ошибка обработчика события {event_type}: {e}")
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику шины"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        stats['backend'] = 'memory'
+        return stats
+
+
+class PostgresEventBus(EventBus):
+    """Шина событий через PostgreSQL LISTEN/NOTIFY
+
+    События рассылаются всем экземплярам бота: publish() выполняет
+    pg_notify, а фоновый поток каждого экземпляра слушает канал и передает
+    полученные события локальным обработчикам. Если NOTIFY не удался,
+    событие доставляется только локально.
+    """
+
+    def __init__(self, app, db, dsn: str, channel: str = EVENTS_CHANNEL, **kwargs):
+        super().__init__(**kwargs)
+        self.app = app
+        self.db = db
+        self.dsn = dsn
+        self.channel = channel
+        self._stop_event = threading.Event()
+        self._listener = None
+
+    def publish(self, event_type: str, payload: Optional[dict] = None) -> bool:
+        self._count('published')
+        payload = payload or {}
+        message = json.dumps({'type': event_type, 'payload': payload}, ensure_ascii=False)
+        try:
+            with self.app.app_context():
+                with self.db.engine.begin() as connection:
+                    connection.execute(sql_select(func.pg_notify(self.channel, message)))
+            return True
+        except Exception as e:
+            logger.warning(f"NOTIFY не удался ({e}), событие {event_type} доставлено локально")
+            return self._deliver(event_type, payload)
+
+    def start(self):
+        super().start()
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._stop_event.clear()
+            self._listener = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+        self._listener.start()
+
+    def stop(self, timeout: Optional[float] = 5):
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            self._stop_event.set()
+            listener.join(timeout)
+        super().stop(timeout)
+
+    def _listen(self):
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(self.dsn)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.info(f"Шина событий слушает канал {self.channel}")
+
+                while not self._stop_event.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._on_notify(connection.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Ошибка слушателя событий: {e}")
+                self._stop_event.wait(LISTEN_RECONNECT_DELAY)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def _on_notify(self, data: str):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning("Получено некорректное событие, пропущено")
+            return
+        self._deliver(message.get('type'), message.get('payload') or {})
+
+    def get_stats(self) -> dict:
+        stats = super().get_stats()
+        stats['backend'] = 'postgres'
+        stats['listening'] = self._listener is not None
+        return stats
+
+
+def create_event_bus(app, db) -> EventBus:
+    """Создает шину событий: LISTEN/NOTIFY при EVENT_BUS=postgres, иначе в памяти процесса"""
+    if EVENT_BUS == 'postgres':
+        from core import DATABASE_DIRECT_URL
+        logger.info("Шина событий: PostgreSQL LISTEN/NOTIFY")
+        # LISTEN требует постоянной сессии, поэтому слушатель подключается в обход PgBouncer
+        return PostgresEventBus(app, db, DATABASE_DIRECT_URL)
+    return EventBus()
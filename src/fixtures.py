@@ -0,0 +1,62 @@
+"""
+Общие построители объектов для тестов: подписки и вакансии (без сохранения в БД), update Telegram
+"""
+
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from telebot import types
+
+from user import User  # noqa: F401 (регистрация моделей для связей Subscription)
+from job import Job  # noqa: F401
+from application import Application  # noqa: F401
+from subscription import Subscription
+
+# Момент "сейчас" для возраста тестовых вакансий
+NOW = datetime(2024, 1, 2)
+
+
+def make_subscription(subscription_id, criteria=None, **kwargs) -> Subscription:
+    """Немедленная активная подписка пользователя 1 с критериями criteria"""
+    params = dict(
+        id=subscription_id,
+        user_id=1,
+        name=f'Подписка {subscription_id}',
+        subscription_type='custom',
+        criteria=json.dumps(criteria or {}, ensure_ascii=False),
+        frequency='immediate',
+        is_active=True,
+        is_paused=False,
+    )
+    params.update(kwargs)
+    return Subscription(**params)
+
+
+def make_job(job_id=None, age_hours=0, **kwargs) -> SimpleNamespace:
+    """Вакансия Python-разработчика, созданная age_hours часов назад"""
+    params = dict(
+        id=job_id,
+        title='Python разработчик',
+        description='Разработка backend сервисов на Flask и PostgreSQL',
+        company='ТестКомпания',
+        location='Москва',
+        salary_min=150000,
+        created_at=NOW - timedelta(hours=age_hours),
+    )
+    params.update(kwargs)
+    return SimpleNamespace(**params)
+
+
+def make_update(update_id, chat_id, text='hi') -> types.Update:
+    """Update с текстовым сообщением из личного чата chat_id"""
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': text,
+        }
+    })
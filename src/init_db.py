@@ -5,14 +5,17 @@ from user import User  # noqa: F401
 from job import Job  # noqa: F401
 from application import Application  # noqa: F401
 from subscription import Subscription  # noqa: F401
+from scheduler_state import SchedulerState  # noqa: F401
+from notification_log import NotificationLog  # noqa: F401
+from schema import upgrade_schema
 
 
 def init_db(db):
-        """Создает все таблицы, определённые моделями."""
+    """Создает все таблицы, определённые моделями, и обновляет схему существующих."""
     try:
-              db.create_all()
+        db.create_all()
+        upgrade_schema(db)
 
         logger.info("База данных успешно инициализирована.")
     except Exception as e:
         logger.error(f"Ошибка при инициализации БД: {e}")
-
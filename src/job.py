@@ -1,9 +1,45 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from core import db
+from functools import lru_cache
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from core import db, as_json_list
+import unit_of_work
+
+# Поисковый вектор вакансии: название (A), компания (B), описание (C) в русской и английской конфигурациях
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(company, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(company, '')), 'B') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')"
+)
+
+# Отображение валют в сообщениях
+CURRENCY_DISPLAY = {'RUB': 'руб.'}
+
+
+@lru_cache(maxsize=4096)
+def format_salary_range(salary_min, salary_max, currency='RUB'):
+    """Диапазон зарплаты в читаемом формате (результат кэшируется: вилок немного)"""
+    currency = CURRENCY_DISPLAY.get(currency or 'RUB', currency)
+    if salary_min and salary_max:
+        return f"{salary_min:,} - {salary_max:,} {currency}"
+    elif salary_min:
+        return f"от {salary_min:,} {currency}"
+    elif salary_max:
+        return f"до {salary_max:,} {currency}"
+    else:
+        return "По договоренности"
 
 class Job(db.Model):
     __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_jobs_active_published_id', 'is_active', 'published_at', 'id'),
+        db.Index('ix_jobs_tags', 'tags', postgresql_using='gin', postgresql_ops={'tags': 'jsonb_path_ops'}),
+        db.Index('ix_jobs_skills_required', 'skills_required', postgresql_using='gin', postgresql_ops={'skills_required': 'jsonb_path_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
@@ -26,7 +62,7 @@ class Job(db.Model):
     requirements = db.Column(db.Text, nullable=True)
     responsibilities = db.Column(db.Text, nullable=True)
     benefits = db.Column(db.Text, nullable=True)
-    skills_required = db.Column(db.Text, nullable=True)  # JSON string
+    skills_required = db.Column(JSONB, nullable=True)  # JSON array
     
     # Contact information
     contact_email = db.Column(db.String(120), nullable=True)
@@ -39,7 +75,7 @@ class Job(db.Model):
     
     # Job metadata
     category = db.Column(db.String(50), nullable=True, index=True)  # IT, Marketing, Sales, etc.
-    tags = db.Column(db.Text, nullable=True)  # JSON string
+    tags = db.Column(JSONB, nullable=True)  # JSON array
     priority = db.Column(db.Integer, default=0)  # For featured jobs
     
     # Status and visibility
@@ -58,6 +94,9 @@ class Job(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Full-text search (поддерживается самой БД)
+    search_vector = db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR_SQL, persisted=True))
+    
     # Foreign keys
     employer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     
@@ -75,24 +114,20 @@ class Job(db.Model):
     
     def get_salary_range(self):
         """Возвращает диапазон зарплаты в читаемом формате"""
-        if self.salary_min and self.salary_max:
-            return f"{self.salary_min:,} - {self.salary_max:,} {self.salary_currency}"
-        elif self.salary_min:
-            return f"от {self.salary_min:,} {self.salary_currency}"
-        elif self.salary_max:
-            return f"до {self.salary_max:,} {self.salary_currency}"
-        else:
-            return "Зарплата не указана"
-    
-    def increment_views(self):
-        """Увеличивает счетчик просмотров"""
-        self.views_count += 1
-        db.session.commit()
+        return format_salary_range(self.salary_min, self.salary_max, self.salary_currency)
     
     def increment_applications(self):
-        """Увеличивает счетчик откликов"""
-        self.applications_count += 1
-        db.session.commit()
+        """Увеличивает счетчик откликов (applications_count = applications_count + 1 на стороне БД)"""
+        self.applications_count = db.func.coalesce(Job.applications_count, 0) + 1
+        unit_of_work.commit()
+    
+    def get_skills_list(self):
+        """Возвращает список требуемых навыков"""
+        return as_json_list(self.skills_required)
+    
+    def get_tags_list(self):
+        """Возвращает список тегов"""
+        return as_json_list(self.tags)
     
     def get_short_description(self, max_length=200):
         """Возвращает краткое описание вакансии"""
@@ -144,14 +179,14 @@ class Job(db.Model):
             'requirements': self.requirements,
             'responsibilities': self.responsibilities,
             'benefits': self.benefits,
-            'skills_required': self.skills_required,
+            'skills_required': self.get_skills_list(),
             'contact_email': self.contact_email,
             'contact_phone': self.contact_phone,
             'contact_person': self.contact_person,
             'company_website': self.company_website,
             'application_url': self.application_url,
             'category': self.category,
-            'tags': self.tags,
+            'tags': self.get_tags_list(),
             'priority': self.priority,
             'is_active': self.is_active,
             'is_featured': self.is_featured,
@@ -169,18 +204,29 @@ class Job(db.Model):
     
     @staticmethod
     def search(query=None, location=None, salary_min=None, employment_type=None, 
-               experience_level=None, category=None, is_remote=None, page=1, per_page=10):
-        """Поиск вакансий с фильтрами"""
+               experience_level=None, category=None, is_remote=None, page=1, per_page=10,
+               cursor=None, tags=None, skills=None):
+        """Поиск вакансий с фильтрами
+        
+        tags и skills - списки, вакансия должна содержать все их элементы
+        (оператор @> по GIN-индексу).
+        
+        Если передан cursor (пустая строка - первая страница), используется
+        keyset-пагинация без OFFSET и COUNT и возвращается KeysetPage,
+        иначе - Pagination по номеру страницы.
+        """
+        import job_search
+        from pagination import keyset_paginate
+        
         jobs_query = Job.query.filter(Job.is_active == True)
+        order_by = []
+        sort_key = []
         
         if query:
-            jobs_query = jobs_query.filter(
-                db.or_(
-                    Job.title.ilike(f'%{query}%'),
-                    Job.description.ilike(f'%{query}%'),
-                    Job.company.ilike(f'%{query}%')
-                )
-            )
+            # Полнотекстовый поиск по GIN-индексу, сначала самые релевантные
+            jobs_query = jobs_query.filter(job_search.text_filter(query))
+            order_by.append(job_search.text_rank(query).desc())
+            sort_key.append(db.cast(job_search.text_rank(query), db.Float))
         
         if location:
             jobs_query = jobs_query.filter(Job.location.ilike(f'%{location}%'))
@@ -200,8 +246,24 @@ class Job(db.Model):
         if is_remote is not None:
             jobs_query = jobs_query.filter(Job.is_remote == is_remote)
         
+        if tags:
+            jobs_query = jobs_query.filter(Job.tags.contains(list(tags)))
+        
+        if skills:
+            jobs_query = jobs_query.filter(Job.skills_required.contains(list(skills)))
+        
+        if cursor is not None:
+            sort_key += [
+                db.func.coalesce(Job.is_urgent, False),
+                db.func.coalesce(Job.is_featured, False),
+                Job.published_at,
+                Job.id
+            ]
+            return keyset_paginate(jobs_query, sort_key, per_page, cursor=cursor or None)
+        
         # Сортировка: сначала срочные, потом по дате публикации
         jobs_query = jobs_query.order_by(
+            *order_by,
             Job.is_urgent.desc(),
             Job.is_featured.desc(),
             Job.published_at.desc()
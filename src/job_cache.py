@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from job import Job
+from application import Application
+from events import JOB_CHANGED
+
+# Максимальное количество карточек каждого вида (вытесняются давно не использованные)
+JOB_CACHE_SIZE = int(os.getenv('JOB_CACHE_SIZE', 2000))
+
+# Время жизни карточки (сек.): ограничивает устаревание при изменениях в обход ORM
+JOB_CACHE_TTL = float(os.getenv('JOB_CACHE_TTL', 300))
+
+# Изменение только этих полей не меняет карточку вакансии
+NON_CARD_FIELDS = frozenset({'views_count', 'updated_at'})
+
+
+class JobCardCache:
+    """LRU-кэш отрисованных карточек вакансий с ограниченным временем жизни
+
+    У каждого вида карточки (details, row, ...) свой LRU на max_size записей,
+    поэтому массовая отрисовка одного вида не вытесняет горячие карточки
+    другого. Запись хранится вместе с updated_at вакансии. Если вызывающий
+    знает текущий updated_at, карточка с другим updated_at считается
+    устаревшей; без него (открытие по ID) действует явная инвалидация при
+    изменении вакансии и TTL.
+    """
+
+    def __init__(self, max_size: int = JOB_CACHE_SIZE, ttl: float = JOB_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._kinds: 'Dict[Hashable, OrderedDict[int, tuple]]' = {}
+        self._lock = threading.Lock()
+        self._event_bus = None
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, kind: Hashable, job_id: int, updated_at: Optional[datetime] = None):
+        """Возвращает карточку или None (промах)"""
+        if self.max_size <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entries = self._kinds.get(kind)
+            entry = entries.get(job_id) if entries is not None else None
+            if entry is not None:
+                cached_updated_at, expires_at, value = entry
+                if expires_at > now and (updated_at is None or cached_updated_at == updated_at):
+                    entries.move_to_end(job_id)
+                    self._stats['hits'] += 1
+                    return value
+                del entries[job_id]
+                self._stats['stale'] += 1
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, kind: Hashable, job_id: int, updated_at: Optional[datetime], value):
+        """Запоминает карточку, вытесняя самые давно использованные карточки того же вида"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            entries = self._kinds.setdefault(kind, OrderedDict())
+            entries[job_id] = (updated_at, time.monotonic() + self.ttl, value)
+            entries.move_to_end(job_id)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_or_render(self, kind: Hashable, job: Job, render: Callable[[Job], object]):
+        """Карточка вакансии job из кэша или render(job)"""
+        value = self.get(kind, job.id, job.updated_at)
+        if value is None:
+            value = render(job)
+            self.put(kind, job.id, job.updated_at, value)
+        return value
+
+    def invalidate(self, job_id: int):
+        """Удаляет все карточки вакансии"""
+        with self._lock:
+            removed = [entries.pop(job_id) for entries in self._kinds.values() if job_id in entries]
+            if removed:
+                self._stats['invalidations'] += 1
+
+    def clear(self, broadcast: bool = False):
+        """Очищает кэш (после массовых изменений в обход ORM)
+
+        Args:
+            broadcast: Сообщить об очистке другим экземплярам через шину событий
+        """
+        with self._lock:
+            self._kinds.clear()
+            self._stats['invalidations'] += 1
+        if broadcast and self._event_bus is not None:
+            self._event_bus.publish_later(JOB_CHANGED, {})
+
+    def attach(self, event_bus):
+        """Рассылает инвалидацию через шину событий (другим экземплярам бота)"""
+        self._event_bus = event_bus
+        event_bus.subscribe(JOB_CHANGED, self._on_job_changed)
+
+    def _on_job_changed(self, payload: dict):
+        job_ids = payload.get('job_ids')
+        if job_ids is None:
+            self.clear()
+        else:
+            for job_id in job_ids:
+                self.invalidate(job_id)
+
+    def jobs_changed(self, job_ids):
+        """Инвалидирует карточки локально и сообщает о них другим экземплярам
+
+        Рассылка идет одним событием и в фоне (publish_later): вызывается
+        из after_commit и не должна задерживать ответ пользователю.
+        """
+        job_ids = sorted(job_ids)
+        for job_id in job_ids:
+            self.invalidate(job_id)
+        if self._event_bus is not None:
+            self._event_bus.publish_later(JOB_CHANGED, {'job_ids': job_ids})
+
+    def get_stats(self) -> dict:
+        """Статистика кэша: попадания, промахи, доля попаданий"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = {kind: len(entries) for kind, entries in self._kinds.items()}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_size_per_kind'] = self.max_size
+        return stats
+
+
+job_cards = JobCardCache()
+
+
+def _remember_changed(target_session, job_id):
+    if target_session is not None and job_id is not None:
+        target_session.info.setdefault('changed_job_ids', set()).add(job_id)
+
+
+@event.listens_for(Job, 'after_update')
+def _job_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = {attr.key for attr in state.attrs if attr.history.has_changes()}
+    if changed - NON_CARD_FIELDS:
+        _remember_changed(object_session(target), target.id)
+
+
+@event.listens_for(Job, 'after_delete')
+def _job_deleted(mapper, connection, target):
+    _remember_changed(object_session(target), target.id)
+
+
+@event.listens_for(Application, 'after_insert')
+@event.listens_for(Application, 'after_delete')
+def _application_changed(mapper, connection, target):
+    # Карточка показывает количество откликов и хранит ID откликнувшихся
+    _remember_changed(object_session(target), target.job_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    job_ids = session.info.pop('changed_job_ids', None)
+    if job_ids:
+        job_cards.jobs_changed(job_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('changed_job_ids', None)
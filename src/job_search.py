@@ -0,0 +1,63 @@
+import re
+
+from sqlalchemy import func, or_
+
+from job import Job
+
+# Конфигурации полнотекстового поиска PostgreSQL
+SEARCH_CONFIGS = ('russian', 'english')
+
+# Слова запроса для префиксного поиска (частичные слова: "разраб" -> "разработчик")
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+MIN_PREFIX_LENGTH = 3
+
+
+def _prefix_query(query: str):
+    """Строит префиксный tsquery ('слово:* & слово:*') или None"""
+    words = [word for word in _WORD_RE.findall(query.lower()) if len(word) >= MIN_PREFIX_LENGTH]
+    if not words:
+        return None
+    return func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+
+
+def text_query(query):
+    """
+    Возвращает tsquery для поискового запроса
+
+    Запрос разбирается в русской и английской конфигурациях; для строковых
+    запросов добавляется префиксный вариант для частично введенных слов.
+
+    Args:
+        query: Строка запроса или SQL-выражение (например, поле критериев подписки)
+    """
+    ts_query = None
+    for config in SEARCH_CONFIGS:
+        part = func.websearch_to_tsquery(config, query)
+        ts_query = part if ts_query is None else ts_query.op('||')(part)
+
+    if isinstance(query, str):
+        prefix = _prefix_query(query)
+        if prefix is not None:
+            ts_query = ts_query.op('||')(prefix)
+
+    return ts_query
+
+
+def text_filter(query):
+    """
+    Условие полнотекстового поиска по вакансиям
+
+    Совпадение по tsvector (GIN-индекс) либо по подстроке в названии или
+    компании (триграммные индексы pg_trgm, если расширение установлено).
+    """
+    pattern = func.concat('%', query, '%')
+    return or_(
+        Job.search_vector.op('@@')(text_query(query)),
+        Job.title.ilike(pattern),
+        Job.company.ilike(pattern),
+    )
+
+
+def text_rank(query):
+    """Релевантность вакансии запросу (для сортировки)"""
+    return func.ts_rank_cd(Job.search_vector, text_query(query))
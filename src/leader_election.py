@@ -0,0 +1,170 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from scheduler_state import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+# Выбор ведущего планировщика между экземплярами бота
+LEADER_ELECTION_ENABLED = os.getenv('SCHEDULER_LEADER_ELECTION', 'true').lower() == 'true'
+
+# Срок аренды (сек.): столько ждет замена после падения ведущего
+LEADER_LEASE_TTL = int(os.getenv('LEADER_LEASE_TTL', 30))
+
+
+def _db_now():
+    """Текущее время БД в UTC (без часового пояса, как остальные колонки DateTime)"""
+    return func.timezone('utc', func.now())
+
+
+class LeaderElector:
+    """Выбор ведущего экземпляра через таблицу аренды scheduler_lease
+
+    Экземпляр становится ведущим, если аренда свободна, истекла или уже его;
+    фоновый поток продлевает ее каждые ttl/3 секунд. Если продлить аренду не
+    удалось, экземпляр перестает считать себя ведущим до истечения срока,
+    поэтому двух ведущих одновременно не бывает. После падения ведущего его
+    роль переходит к другому экземпляру не позже чем через ttl секунд.
+    """
+
+    def __init__(self, app, db, name: str = 'scheduler', ttl: int = LEADER_LEASE_TTL):
+        """
+        Args:
+            app: Flask-приложение (для app_context)
+            db: Экземпляр SQLAlchemy
+            name: Имя аренды
+            ttl: Срок аренды в секундах
+        """
+        self.app = app
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._valid_until = 0.0  # monotonic-время, до которого аренда точно наша
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Является ли экземпляр ведущим прямо сейчас"""
+        return time.monotonic() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        """Захватывает или продлевает аренду одним INSERT ... ON CONFLICT DO UPDATE"""
+        was_leader = self.is_leader
+        started_at = time.monotonic()
+        table = SchedulerLease.__table__
+        statement = insert(table).values(
+            name=self.name,
+            holder=self.holder,
+            acquired_at=_db_now(),
+            renewed_at=_db_now(),
+            expires_at=_db_now() + timedelta(seconds=self.ttl),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['name'],
+            set_={
+                'holder': statement.excluded.holder,
+                'acquired_at': case(
+                    (table.c.holder == statement.excluded.holder, table.c.acquired_at),
+                    else_=statement.excluded.acquired_at
+                ),
+                'renewed_at': statement.excluded.renewed_at,
+                'expires_at': statement.excluded.expires_at,
+            },
+            where=(table.c.holder == statement.excluded.holder) | (table.c.expires_at < statement.excluded.renewed_at)
+        ).returning(table.c.holder)
+
+        try:
+            with self.app.app_context():
+                with self.db.engine.begin() as connection:
+                    acquired = connection.execute(statement).first() is not None
+        except Exception as e:
+            logger.error(f"Ошибка продления аренды ведущего планировщика: {e}")
+            acquired = False
+
+        with self._lock:
+            if acquired:
+                # Отсчет от начала запроса: локальный срок не позже срока в БД
+                self._valid_until = started_at + self.ttl
+            elif not self.is_leader:
+                self._valid_until = 0.0
+
+        if acquired and not was_leader:
+            logger.info(f"Экземпляр {self.holder} стал ведущим планировщиком")
+        elif was_leader and not acquired:
+            logger.warning(f"Экземпляр {self.holder} не смог продлить аренду ведущего планировщика")
+        return acquired
+
+    def release(self):
+        """Освобождает аренду, чтобы другой экземпляр сразу стал ведущим"""
+        with self._lock:
+            self._valid_until = 0.0
+        table = SchedulerLease.__table__
+        try:
+            with self.app.app_context():
+                with self.db.engine.begin() as connection:
+                    connection.execute(
+                        update(table)
+                        .where(table.c.name == self.name, table.c.holder == self.holder)
+                        .values(expires_at=_db_now())
+                    )
+        except Exception as e:
+            logger.error(f"Ошибка освобождения аренды ведущего планировщика: {e}")
+
+    def start(self):
+        """Запускает фоновое продление аренды (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = 5):
+        """Останавливает продление и освобождает аренду"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop_event.set()
+            thread.join(timeout)
+            self.release()
+
+    def _run(self):
+        while True:
+            self.try_acquire()
+            if self._stop_event.wait(max(1.0, self.ttl / 3)):
+                return
+
+
+class AlwaysLeader:
+    """Заглушка для одного экземпляра: выбор ведущего выключен"""
+
+    holder = 'local'
+    is_leader = True
+
+    def start(self):
+        pass
+
+    def stop(self, timeout: Optional[float] = None):
+        pass
+
+
+def create_leader_elector(app, db):
+    """Создает LeaderElector или AlwaysLeader (SCHEDULER_LEADER_ELECTION=false)"""
+    if LEADER_ELECTION_ENABLED:
+        return LeaderElector(app, db)
+    return AlwaysLeader()
@@ -2,6 +2,7 @@
 import os
 import sys
 from threading import Thread
+from urllib.parse import urlparse
 from flask import jsonify
 from waitress import serve
 
@@ -12,19 +13,43 @@ from core import app, db, logger
 from init_db import init_db
 from telegram_bot import TelegramHRBot
 from scheduler import NotificationScheduler
+from db_pool import pool_stats
+from read_replica import router as replica_router
+from job_cache import job_cards
+
+# Процессы пула дайджеста (spawn) импортируют этот файл как __mp_main__:
+# инициализация БД и запуск бота в них не нужны
+IS_WORKER_PROCESS = __name__ == '__mp_main__'
 
 # Инициализируем БД в контексте приложения
-with app.app_context():
-    init_db(db)
+if not IS_WORKER_PROCESS:
+    with app.app_context():
+        init_db(db)
 
 # ИЗМЕНЕНИЕ 2: Передаем 'db' в конструктор бота
 bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
 telegram_bot = None
 if bot_token and ':' in bot_token:
-    telegram_bot = TelegramHRBot(token=bot_token, db=db, flask_app=app)
+    if not IS_WORKER_PROCESS:
+        telegram_bot = TelegramHRBot(token=bot_token, db=db, flask_app=app)
 else:
     logger.warning("TELEGRAM_BOT_TOKEN отсутствует или некорректен - бот не будет запущен")
 
+# Режим получения update: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    logger.warning("BOT_MODE=webhook, но TELEGRAM_WEBHOOK_URL не задан - используется polling")
+    BOT_MODE = 'polling'
+
+if telegram_bot and BOT_MODE == 'webhook':
+    app.add_url_rule(
+        urlparse(WEBHOOK_URL).path or '/webhook',
+        endpoint='telegram_webhook',
+        view_func=telegram_bot.handle_webhook,
+        methods=['POST']
+    )
+
 # ... (остальной код без изменений до health_check)
 
 @app.route('/api/health')
@@ -38,9 +63,33 @@ def health_check():
         logger.error(f"Health check failed: {e}")
         return jsonify({"status": "error"}), 503
 
+
+@app.route('/api/db/pool')
+def db_pool_stats():
+    """Метрики пула соединений БД этого процесса"""
+    return jsonify(pool_stats(db.engine)), 200
+
+
+@app.route('/api/db/replica')
+def db_replica_stats():
+    """Маршрутизация чтения на реплику: доступность, отставание, счетчики"""
+    stats = replica_router.get_stats()
+    if replica_router.enabled:
+        stats['pool'] = pool_stats(replica_router.engine())
+    return jsonify(stats), 200
+
+
+@app.route('/api/cache/jobs')
+def job_cache_stats():
+    """Кэш карточек вакансий: размер, попадания, промахи"""
+    return jsonify(job_cards.get_stats()), 200
+
 # ... (остальной код без изменений)
 if __name__ == '__main__':
-    if telegram_bot:
+    if telegram_bot and BOT_MODE == 'webhook':
+        logger.info("Запуск Telegram бота в режиме webhook...")
+        telegram_bot.run_webhook(WEBHOOK_URL, drop_pending_updates=False)
+    elif telegram_bot:
         logger.info("Запуск Telegram бота...")
         # Убедитесь, что метод называется 'run'
         bot_thread = Thread(target=telegram_bot.run, kwargs={'drop_pending_updates': True}, daemon=True)
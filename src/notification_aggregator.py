@@ -0,0 +1,157 @@
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from core import db
+from job import Job
+from notification_log import NotificationLog
+from subscription import Subscription
+
+# Окно скользящего дневного лимита
+NOTIFICATION_CAP_WINDOW = timedelta(days=1)
+
+# Лимит вакансий в сутки, если у подписок он не задан
+DEFAULT_DAILY_CAP = 10
+
+# Сколько пользователей обрабатывать одной пачкой (запросы лимитов и журнала - на пачку)
+AGGREGATION_BATCH_USERS = int(os.getenv('AGGREGATION_BATCH_USERS', 500))
+
+
+class UserDigest:
+    """Вакансии по всем подпискам одного пользователя для одного сообщения
+
+    Вакансия, подходящая под несколько подписок, хранится один раз вместе со
+    списком этих подписок.
+    """
+
+    __slots__ = ('user_id', 'telegram_id', 'subscriptions', 'jobs', 'matched_by')
+
+    def __init__(self, user_id: int, telegram_id: int):
+        self.user_id = user_id
+        self.telegram_id = telegram_id
+        self.subscriptions: List[Subscription] = []
+        self.jobs: Dict[int, Job] = OrderedDict()
+        self.matched_by: Dict[int, List[Subscription]] = {}
+
+    def add(self, subscription: Subscription, jobs: Iterable[Job]):
+        """Добавляет вакансии подписки (повторы не добавляются)"""
+        self.subscriptions.append(subscription)
+        for job in jobs:
+            if job.id not in self.jobs:
+                self.jobs[job.id] = job
+                self.matched_by[job.id] = []
+            self.matched_by[job.id].append(subscription)
+
+    @property
+    def daily_cap(self) -> int:
+        """Дневной лимит: наибольший max_notifications_per_day среди подписок"""
+        return max((subscription.max_notifications_per_day or DEFAULT_DAILY_CAP
+                    for subscription in self.subscriptions), default=DEFAULT_DAILY_CAP)
+
+    def limit(self, exclude_ids, remaining: int):
+        """Убирает уже отправленные вакансии и оставляет не больше remaining самых новых"""
+        ordered = sorted(self.jobs.values(), key=lambda job: (job.created_at or datetime.min, job.id), reverse=True)
+        kept = [job.id for job in ordered if job.id not in exclude_ids][:max(0, remaining)]
+        self.jobs = OrderedDict((job_id, self.jobs[job_id]) for job_id in kept)
+        self.matched_by = {job_id: self.matched_by[job_id] for job_id in kept}
+
+    def jobs_by_subscription(self) -> Dict[int, int]:
+        """Количество отправляемых вакансий по каждой подписке (включая нулевые)"""
+        counts = {subscription.id: 0 for subscription in self.subscriptions}
+        for subscriptions in self.matched_by.values():
+            for subscription in subscriptions:
+                counts[subscription.id] += 1
+        return counts
+
+
+def group_by_user(matches: Iterable[Tuple[Subscription, int, List[Job]]]) -> Iterator[UserDigest]:
+    """
+    Объединяет совпадения подписок в UserDigest по пользователям
+
+    Args:
+        matches: (подписка, telegram_id, вакансии), упорядоченные по user_id подписки
+    """
+    for user_id, rows in groupby(matches, key=lambda row: row[0].user_id):
+        digest = None
+        for subscription, telegram_id, jobs in rows:
+            if digest is None:
+                digest = UserDigest(user_id, telegram_id)
+            digest.add(subscription, jobs)
+        yield digest
+
+
+def batched(digests: Iterable[UserDigest], size: int = AGGREGATION_BATCH_USERS) -> Iterator[List[UserDigest]]:
+    """Разбивает поток UserDigest на пачки"""
+    iterator = iter(digests)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def apply_daily_caps(digests: List[UserDigest], now: Optional[datetime] = None) -> List[UserDigest]:
+    """
+    Применяет журнал отправок к пачке пользователей двумя запросами
+
+    Убирает вакансии, уже отправленные пользователю, и ограничивает остаток
+    скользящим дневным лимитом. Возвращает пользователей, которым есть что отправить.
+    """
+    if not digests:
+        return []
+
+    now = now or datetime.utcnow()
+    user_ids = [digest.user_id for digest in digests]
+    job_ids = {job_id for digest in digests for job_id in digest.jobs}
+
+    sent_today = dict(
+        db.session.query(NotificationLog.user_id, func.count(NotificationLog.id))
+        .filter(NotificationLog.user_id.in_(user_ids), NotificationLog.sent_at >= now - NOTIFICATION_CAP_WINDOW)
+        .group_by(NotificationLog.user_id)
+        .all()
+    )
+
+    already_sent = {}
+    for user_id, job_id in (
+        db.session.query(NotificationLog.user_id, NotificationLog.job_id)
+        .filter(NotificationLog.user_id.in_(user_ids), NotificationLog.job_id.in_(job_ids))
+    ):
+        already_sent.setdefault(user_id, set()).add(job_id)
+
+    for digest in digests:
+        digest.limit(already_sent.get(digest.user_id, ()), digest.daily_cap - sent_today.get(digest.user_id, 0))
+
+    return [digest for digest in digests if digest.jobs]
+
+
+def record_sent(digests: List[UserDigest], sent_at: Optional[datetime] = None, connection=None):
+    """Записывает отправленные вакансии в журнал одним INSERT (без commit)
+
+    Args:
+        digests: Отправленные сводки
+        sent_at: Время отправки
+        connection: Соединение для записи (по умолчанию db.session)
+    """
+    sent_at = sent_at or datetime.utcnow()
+    rows = [
+        {
+            'user_id': digest.user_id,
+            'job_id': job_id,
+            'subscription_id': digest.matched_by[job_id][0].id,
+            'sent_at': sent_at,
+        }
+        for digest in digests
+        for job_id in digest.jobs
+    ]
+    if rows:
+        (connection if connection is not None else db.session).execute(
+            insert(NotificationLog.__table__).on_conflict_do_nothing(
+                index_elements=['user_id', 'job_id']
+            ),
+            rows
+        )
@@ -0,0 +1,25 @@
+from datetime import datetime
+from core import db
+
+
+class NotificationLog(db.Model):
+    """Журнал отправленных пользователю вакансий
+
+    Используется для скользящего дневного лимита уведомлений и для того,
+    чтобы одна вакансия не приходила пользователю повторно по разным подпискам.
+    """
+    __tablename__ = 'notification_log'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'job_id', name='uq_notification_log_user_job'),
+        # Подсчет отправленного за последние сутки
+        db.Index('ix_notification_log_user_sent', 'user_id', 'sent_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscriptions.id', ondelete='SET NULL'), nullable=True)
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<NotificationLog job {self.job_id} -> user {self.user_id}>'
@@ -0,0 +1,112 @@
+import logging
+from typing import List, Optional, Tuple
+
+from telebot import types
+
+from job import Job
+from subscription import Subscription
+from notification_aggregator import UserDigest
+from rendering import render_job_notification, render_job_summary
+
+logger = logging.getLogger(__name__)
+
+# Сколько вакансий показывать в кратком списке подписки и в сводке по нескольким подпискам
+SUBSCRIPTION_LIST_LIMIT = 5
+DIGEST_LIST_LIMIT = 10
+
+
+def subscription_message(subscription: Subscription, jobs: List[Job]) -> Tuple[str, types.InlineKeyboardMarkup]:
+    """Текст и кнопки уведомления по одной подписке"""
+    markup = types.InlineKeyboardMarkup()
+    if len(jobs) == 1:
+        # Одна вакансия - подробное уведомление
+        job = jobs[0]
+        text = f"🔔 <b>Новая вакансия по подписке \"{subscription.name}\"</b>\n\n"
+        text += render_job_notification(job)
+        markup.add(
+            types.InlineKeyboardButton("👀 Подробнее", callback_data=f"view_job_{job.id}"),
+            types.InlineKeyboardButton("📝 Откликнуться", callback_data=f"apply_job_{job.id}")
+        )
+    else:
+        # Несколько вакансий - краткий список
+        text = f"🔔 <b>Найдено {len(jobs)} новых вакансий по подписке \"{subscription.name}\"</b>\n\n"
+        for i, job in enumerate(jobs[:SUBSCRIPTION_LIST_LIMIT], 1):
+            text += f"{i}. " + render_job_summary(job) + "\n"
+        if len(jobs) > SUBSCRIPTION_LIST_LIMIT:
+            text += f"... и еще {len(jobs) - SUBSCRIPTION_LIST_LIMIT} вакансий\n\n"
+        markup.add(
+            types.InlineKeyboardButton("📋 Посмотреть все", callback_data="all_jobs"),
+            types.InlineKeyboardButton("🔍 Поиск", callback_data="search_jobs")
+        )
+    markup.add(
+        types.InlineKeyboardButton("⚙️ Настроить подписку", callback_data=f"edit_subscription_{subscription.id}")
+    )
+    return text, markup
+
+
+def digest_message(digest: UserDigest) -> Tuple[str, types.InlineKeyboardMarkup]:
+    """Текст и кнопки одного сообщения с вакансиями по всем подпискам пользователя"""
+    subscriptions = {
+        subscription.id: subscription
+        for matched_by in digest.matched_by.values()
+        for subscription in matched_by
+    }
+    jobs = list(digest.jobs.values())
+    if len(subscriptions) == 1:
+        return subscription_message(next(iter(subscriptions.values())), jobs)
+
+    text = f"🔔 <b>Найдено {len(jobs)} новых вакансий по вашим подпискам</b>\n\n"
+    for i, job in enumerate(jobs[:DIGEST_LIST_LIMIT], 1):
+        names = ', '.join(f'"{subscription.name}"' for subscription in digest.matched_by[job.id])
+        text += f"{i}. " + render_job_summary(job)
+        text += f"   🔎 {names}\n\n"
+    if len(jobs) > DIGEST_LIST_LIMIT:
+        text += f"... и еще {len(jobs) - DIGEST_LIST_LIMIT} вакансий\n\n"
+
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton("📋 Посмотреть все", callback_data="all_jobs"),
+        types.InlineKeyboardButton("🔍 Поиск", callback_data="search_jobs")
+    )
+    markup.add(
+        types.InlineKeyboardButton("⚙️ Мои подписки", callback_data="subscriptions")
+    )
+    return text, markup
+
+
+class Outbox:
+    """Сообщения, готовые к отправке, но еще не поставленные в очередь доставки
+
+    Текст отрисовывается сразу (пока объекты сессии загружены), а в очередь
+    сообщения попадают через flush() - после commit курсоров и журнала
+    отправки. Если commit не прошел, outbox просто отбрасывается, и
+    следующий проход не пришлет те же вакансии второй раз. Блокировки строк
+    на время постановки в очередь (enqueue ждет при переполнении) не держатся.
+    """
+
+    def __init__(self):
+        self.messages: List[tuple] = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, telegram_id: int, text: str, **kwargs):
+        """Добавляет сообщение (kwargs - параметры send_message)"""
+        self.messages.append((telegram_id, text, kwargs))
+
+    def add_digest(self, digest: UserDigest) -> bool:
+        """Отрисовывает сводку пользователя; ошибка отрисовки пропускает только ее"""
+        try:
+            text, markup = digest_message(digest)
+        except Exception as e:
+            logger.error(f"Ошибка при подготовке сводки пользователю {digest.user_id}: {e}")
+            return False
+        self.add(digest.telegram_id, text, parse_mode='HTML', reply_markup=markup)
+        return True
+
+    def flush(self, delivery) -> int:
+        """Ставит сообщения в очередь доставки и очищает outbox"""
+        messages, self.messages = self.messages, []
+        for telegram_id, text, kwargs in messages:
+            delivery.enqueue(telegram_id, text, **kwargs)
+        return len(messages)
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence
+
+from sqlalchemy import literal, tuple_
+
+# Разделитель значений в курсоре (не встречается в base36 и в записи чисел)
+CURSOR_SEPARATOR = '~'
+
+_EPOCH = datetime(1970, 1, 1)
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _to_base36(number: int) -> str:
+    if number < 0:
+        return '-' + _to_base36(-number)
+    result = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        result = _DIGITS[remainder] + result
+        if not number:
+            return result
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    Кодирует значения ключа сортировки в компактную строку
+
+    Курсор должен помещаться в callback_data Telegram (64 байта), поэтому
+    целые числа и даты записываются в base36.
+    """
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append('n')
+        elif isinstance(value, bool):
+            parts.append('T' if value else 'F')
+        elif isinstance(value, int):
+            parts.append('i' + _to_base36(value))
+        elif isinstance(value, datetime):
+            parts.append('d' + _to_base36((value - _EPOCH) // timedelta(microseconds=1)))
+        elif isinstance(value, float):
+            parts.append('f' + repr(value))
+        else:
+            raise ValueError(f"Неподдерживаемый тип значения курсора: {type(value)}")
+    return CURSOR_SEPARATOR.join(parts)
+
+
+def decode_cursor(cursor: str) -> list:
+    """Декодирует строку курсора обратно в список значений"""
+    values = []
+    for part in cursor.split(CURSOR_SEPARATOR):
+        kind, raw = part[:1], part[1:]
+        if kind == 'n':
+            values.append(None)
+        elif kind in ('T', 'F'):
+            values.append(kind == 'T')
+        elif kind == 'i':
+            values.append(int(raw, 36))
+        elif kind == 'd':
+            values.append(_EPOCH + timedelta(microseconds=int(raw, 36)))
+        elif kind == 'f':
+            values.append(float(raw))
+        else:
+            raise ValueError(f"Некорректный курсор: {cursor}")
+    return values
+
+
+class KeysetPage:
+    """Страница результатов keyset-пагинации"""
+
+    def __init__(self, items: List, first_cursor: Optional[str], last_cursor: Optional[str],
+                 has_prev: bool, has_next: bool):
+        self.items = items
+        self.first_cursor = first_cursor  # курсор для перехода на предыдущую страницу
+        self.last_cursor = last_cursor    # курсор для перехода на следующую страницу
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, columns: Sequence, per_page: int, cursor: Optional[str] = None,
+                    backwards: bool = False) -> KeysetPage:
+    """
+    Keyset-пагинация по убыванию набора колонок (без OFFSET и COUNT)
+
+    Args:
+        query: ORM-запрос, возвращающий сущность или набор колонок
+        columns: Колонки/выражения ключа сортировки (последней должна идти уникальная колонка, например id)
+        per_page: Размер страницы
+        cursor: Курсор от соседней страницы (None - первая страница)
+        backwards: True - страница перед курсором, False - после курсора
+
+    Элементы страницы - сущности, если запрос возвращает одну сущность, иначе
+    строки результата (с доступом к колонкам по имени).
+    """
+    columns = list(columns)
+    single_entity = len(query.column_descriptions) == 1
+    query = query.add_columns(*[column.label(f'_keyset_{i}') for i, column in enumerate(columns)])
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            raise ValueError(f"Некорректный курсор: {cursor}")
+        key = tuple_(*columns)
+        bound = tuple_(*[literal(value) for value in values])
+        query = query.filter(key > bound if backwards else key < bound)
+
+    order = [column.asc() if backwards else column.desc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    width = len(columns)
+    items = [row[0] if single_entity else row for row in rows]
+    first_cursor = encode_cursor(rows[0][-width:]) if rows else None
+    last_cursor = encode_cursor(rows[-1][-width:]) if rows else None
+
+    if backwards:
+        return KeysetPage(items, first_cursor, last_cursor, has_prev=has_more, has_next=True)
+    return KeysetPage(items, first_cursor, last_cursor, has_prev=cursor is not None, has_next=has_more)
+
+
+class CachedCount:
+    """Приблизительный счетчик: значение пересчитывается не чаще раза в ttl секунд
+
+    Пересчет выполняется вне блокировки и одним потоком: остальные в это время
+    получают прежнее значение, а если его еще нет - ждут результата.
+    """
+
+    def __init__(self, counter: Callable[[], int], ttl: float = 60):
+        self.counter = counter
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._generation = 0  # меняется при invalidate(): результат начатого до него пересчета не сохраняется
+        self._refreshing: Optional[threading.Event] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        """Возвращает закэшированное значение, пересчитывая его по истечении ttl"""
+        while True:
+            with self._lock:
+                if self._value is not None and time.monotonic() < self._expires_at:
+                    return self._value
+                refreshing = self._refreshing
+                if refreshing is None:
+                    refreshing = self._refreshing = threading.Event()
+                    generation = self._generation
+                    break
+                if self._value is not None:
+                    return self._value
+            refreshing.wait()
+
+        try:
+            value = self.counter()
+            with self._lock:
+                if generation == self._generation:
+                    self._value = value
+                    self._expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            with self._lock:
+                self._refreshing = None
+            refreshing.set()
+
+    def invalidate(self):
+        """Сбрасывает закэшированное значение"""
+        with self._lock:
+            self._value = None
+            self._generation += 1
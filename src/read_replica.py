@@ -0,0 +1,248 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from db_pool import engine_options, track_writes
+
+logger = logging.getLogger(__name__)
+
+# Максимальное отставание реплики (сек.), при котором с нее еще можно читать
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+
+# Как часто проверять доступность и отставание реплики (сек.)
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))
+
+# Сколько после своей записи пользователь читает с основной БД (сек.)
+DB_READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES_WINDOW', 15))
+
+# Отставание реплики: 0, если все полученные WAL применены; NULL на основной БД
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+    """Выбор реплики для чтения с учетом отставания и read-your-writes
+
+    Реплика используется, только пока последняя проверка показала, что она
+    доступна и отстает не больше чем на max_lag секунд. Проверка выполняется
+    не чаще раза в check_interval секунд тем потоком, который первым заметил,
+    что срок истек; остальные потоки в это время используют прежний результат.
+    Пользователь, который недавно что-то записал, читает с основной БД.
+    """
+
+    def __init__(self, url: Optional[str] = None, max_lag: float = DB_REPLICA_MAX_LAG,
+                 check_interval: float = DB_REPLICA_CHECK_INTERVAL,
+                 read_your_writes_window: float = DB_READ_YOUR_WRITES_WINDOW):
+        self.url = url
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.read_your_writes_window = read_your_writes_window
+
+        self._engine = None
+        self._healthy = False
+        self._lag = None
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._writes = {}  # actor -> monotonic-время последней записи
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'fallbacks': 0, 'read_your_writes': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def configure(self, url: Optional[str]):
+        """Задает адрес реплики (None - чтение только с основной БД)"""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self.url = url
+            self._engine = None
+            self._healthy = False
+            self._checked_at = 0.0
+
+    def engine(self):
+        """Движок реплики (создается при первом обращении)"""
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_engine(self.url, **engine_options())
+                event.listen(self._engine, 'handle_error', self._on_error)
+            return self._engine
+
+    def choose(self) -> bool:
+        """Можно ли выполнить чтение на реплике (считается в статистике)"""
+        actor = current_actor()
+        if actor is not None and self.wrote_recently(actor):
+            self._count('read_your_writes')
+            self._count('primary_reads')
+            return False
+        if not self.available():
+            self._count('fallbacks')
+            self._count('primary_reads')
+            return False
+        self._count('replica_reads')
+        return True
+
+    def available(self) -> bool:
+        """Доступна ли реплика и укладывается ли отставание в max_lag"""
+        if time.monotonic() - self._checked_at >= self.check_interval and self._check_lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._check_lock.release()
+        return self._healthy
+
+    def check(self) -> bool:
+        """Проверяет реплику: соединение и отставание"""
+        was_healthy = self._healthy
+        try:
+            with self.engine().connect() as connection:
+                self._lag = float(connection.execute(text(REPLICA_LAG_SQL)).scalar() or 0)
+            self._healthy = self._lag <= self.max_lag
+        except Exception as e:
+            self._lag = None
+            self._healthy = False
+            if was_healthy or not self._checked_at:
+                logger.warning(f"Реплика БД недоступна, чтение с основной БД: {e}")
+        self._checked_at = time.monotonic()
+
+        if was_healthy and not self._healthy and self._lag is not None:
+            logger.warning(f"Реплика БД отстает на {self._lag:.1f} с (допустимо {self.max_lag} с), чтение с основной БД")
+        elif self._healthy and not was_healthy:
+            logger.info(f"Реплика БД доступна, отставание {self._lag:.1f} с")
+        return self._healthy
+
+    def _on_error(self, context):
+        # Обрыв соединения с репликой: сразу переходим на основную БД до следующей проверки
+        if context.is_disconnect:
+            self._healthy = False
+            self._checked_at = time.monotonic()
+
+    def note_write(self, actor):
+        """Запоминает запись пользователя (для read-your-writes)"""
+        now = time.monotonic()
+        with self._lock:
+            self._writes[actor] = now
+            if len(self._writes) > 10000:
+                deadline = now - self.read_your_writes_window
+                self._writes = {key: at for key, at in self._writes.items() if at > deadline}
+
+    def wrote_recently(self, actor) -> bool:
+        at = self._writes.get(actor)
+        return at is not None and time.monotonic() - at < self.read_your_writes_window
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Статистика маршрутизации чтения"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'enabled': self.enabled,
+            'healthy': self._healthy,
+            'lag_seconds': self._lag,
+            'max_lag_seconds': self.max_lag,
+        })
+        return stats
+
+
+router = ReplicaRouter()
+
+
+class RoutingSession(FlaskSession):
+    """Сессия, отправляющая чтение на реплику
+
+    Реплика используется только для SELECT внутри блока reads() или для
+    запросов с execution_options(replica=True), если в транзакции еще не
+    было записи и запрос не берет блокировку (FOR UPDATE). Все остальное,
+    включая flush, идет на основную БД.
+
+    Реплика выбирается заново для каждого запроса. Чтобы несколько запросов
+    (например, SET LOCAL и сам запрос) гарантированно шли в одно соединение,
+    его берут один раз: session.connection(bind_arguments={'replica': True}).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, replica=False, **kwargs):
+        if bind is None and router.enabled and self._is_replica_read(clause, replica) and router.choose():
+            return router.engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _is_replica_read(self, clause, replica=False) -> bool:
+        if not replica:
+            get_options = getattr(clause, 'get_execution_options', None)
+            if get_options is None:
+                return False  # session.connection() и т.п. без запроса - основная БД
+            replica = self.info.get('replica_reads') or get_options().get('replica')
+        if not replica:
+            return False
+        if self._flushing or self.info.get('has_writes'):
+            return False
+        if getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        return not (self.new or self.dirty or self.deleted)
+
+
+@contextmanager
+def reads(session):
+    """Блок, в котором чтение сессии идет на реплику (если она доступна)
+
+    Args:
+        session: db.session (scoped_session) или Session
+    """
+    session = session() if not isinstance(session, Session) else session
+    previous = session.info.get('replica_reads')
+    session.info['replica_reads'] = True
+    try:
+        yield session
+    finally:
+        session.info['replica_reads'] = previous
+
+
+@contextmanager
+def acting_as(actor):
+    """Связывает записи и чтения потока с пользователем (для read-your-writes)"""
+    previous = getattr(_local, 'actor', None)
+    _local.actor = actor
+    try:
+        yield
+    finally:
+        _local.actor = previous
+
+
+def current_actor():
+    """Пользователь, от имени которого выполняется текущий код (или None)"""
+    return getattr(_local, 'actor', None)
+
+
+def _after_commit(session):
+    actor = current_actor()
+    if actor is not None and session.info.get('has_writes') and router.enabled:
+        router.note_write(actor)
+
+
+def configure(url: Optional[str]):
+    """Включает чтение с реплики по адресу url (None - выключено)"""
+    router.configure(url)
+    if url:
+        track_writes()
+        if not event.contains(Session, 'after_commit', _after_commit):
+            event.listen(Session, 'after_commit', _after_commit)
+        logger.info("БД: чтение с реплики включено")
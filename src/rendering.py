@@ -0,0 +1,186 @@
+import os
+from functools import lru_cache
+from string import Formatter
+
+from job import Job, format_salary_range
+from job_cache import job_cards
+
+# Длина описания в уведомлении о новой вакансии
+NOTIFICATION_DESCRIPTION_LENGTH = 150
+
+# Длина описания в подтверждении создания вакансии
+CONFIRMATION_DESCRIPTION_LENGTH = 200
+
+# Сколько строк сводки хранить (по содержимому вакансии; больше вакансий в окне дайджеста)
+SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', 20000))
+
+APPLICATION_STATUSES = {
+    'pending': '⏳ Ожидает рассмотрения',
+    'accepted': '✅ Принят',
+    'rejected': '❌ Отклонен'
+}
+
+
+class MessageTemplate:
+    """Шаблон сообщения с полями {name}
+
+    Текст разбирается один раз при загрузке модуля (опечатка в имени поля
+    видна сразу), а render(values) - это сам str.format_map шаблона: один
+    вызов на C вместо цепочки конкатенаций. Значения подставляются как
+    есть: экранирование HTML выполняется заранее, при подготовке полей.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.fields = frozenset(name for _, name, _, _ in Formatter().parse(text) if name)
+        self.render = text.format_map
+
+
+JOB_DETAILS = MessageTemplate(
+    "💼 <b>{title}</b>\n\n"
+    "🏢 <b>Компания:</b> {company}\n"
+    "📍 <b>Местоположение:</b> {location}\n"
+    "💰 <b>Зарплата:</b> {salary}\n"
+    "📅 <b>Опубликовано:</b> {published}\n"
+    "📨 <b>Откликов:</b> {applications_count}\n\n"
+    "📝 <b>Описание:</b>\n{description}"
+)
+
+JOB_ROW = MessageTemplate(
+    "💼 <b>{title}</b>\n"
+    "🏢 {company}\n"
+    "📍 {location}\n"
+    "💰 {salary}\n"
+)
+
+JOB_NOTIFICATION = MessageTemplate(
+    "💼 <b>{title}</b>\n"
+    "🏢 {company}\n"
+    "📍 {location}\n"
+    "💰 {salary}\n"
+    "\n📝 {short_description}\n\n"
+    "🕒 Опубликовано: {published_at}"
+)
+
+JOB_SUMMARY = MessageTemplate(
+    "<b>{title}</b> в {company}\n"
+    "   📍 {location} | 💰 {salary}\n"
+)
+
+JOB_CONFIRMATION = MessageTemplate(
+    "📋 <b>Подтверждение создания вакансии</b>\n\n"
+    "💼 <b>Название:</b> {title}\n"
+    "🏢 <b>Компания:</b> {company}\n"
+    "📍 <b>Местоположение:</b> {location}\n"
+    "💰 <b>Зарплата:</b> {salary}\n"
+    "\n📝 <b>Описание:</b>\n{description}..."
+)
+
+APPLICATION_DETAILS = MessageTemplate(
+    "📨 <b>Детали отклика</b>\n\n"
+    "💼 <b>Вакансия:</b> {title}\n"
+    "🏢 <b>Компания:</b> {company}\n\n"
+    "👤 <b>Соискатель:</b> {applicant}\n"
+    "{username}"
+    "📅 <b>Дата отклика:</b> {applied_at}\n"
+    "📊 <b>Статус:</b> {status}\n\n"
+    "{cover_letter}"
+)
+
+
+def format_location(location) -> str:
+    """Местоположение вакансии для сообщений"""
+    return location or 'Не указано'
+
+
+def _shorten(text: str, length: int) -> str:
+    return text[:length] + "..." if len(text) > length else text
+
+
+def escape_text(value) -> str:
+    """Экранирует текст для parse_mode='HTML' (в тексте Telegram достаточно &, < и >)
+
+    Три str.replace вместо html.escape и без кэша: названия вакансий почти
+    все уникальны, и учет кэша стоил дороже самого экранирования.
+    """
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;') if value else ''
+
+
+def job_fields(job: Job) -> dict:
+    """Общие поля вакансии для шаблонов (каждое экранируется один раз)
+
+    Зарплата (Job.get_salary_range) не экранируется: в ней только цифры и слова.
+    """
+    return {
+        'title': escape_text(job.title),
+        'company': escape_text(job.company),
+        'location': escape_text(format_location(job.location)),
+        'salary': format_salary_range(job.salary_min, job.salary_max, job.salary_currency),
+    }
+
+
+def render_job_details(job: Job, applications_count: int) -> str:
+    """Карточка вакансии (без кнопок, одинаковая для всех пользователей)"""
+    fields = job_fields(job)
+    fields['published'] = job.created_at.strftime('%d.%m.%Y') if job.created_at else ''
+    fields['applications_count'] = applications_count
+    fields['description'] = escape_text(job.description)
+    return JOB_DETAILS.render(fields)
+
+
+def render_job_row(job: Job) -> str:
+    """Вакансия в списке (кэшируется: список листают многие пользователи)"""
+    return job_cards.get_or_render('row', job, lambda job: JOB_ROW.render(job_fields(job)))
+
+
+def render_job_notification(job: Job) -> str:
+    """Вакансия в уведомлении по подписке (без заголовка подписки)"""
+    fields = job_fields(job)
+    fields['short_description'] = escape_text(_shorten(job.description or '', NOTIFICATION_DESCRIPTION_LENGTH))
+    fields['published_at'] = job.created_at.strftime('%d.%m.%Y %H:%M') if job.created_at else ''
+    return JOB_NOTIFICATION.render(fields)
+
+
+def render_job_summary(job: Job) -> str:
+    """Вакансия в кратком списке уведомления или сводки (без номера)"""
+    return _render_summary(job.title, job.company, job.location, job.salary_min, job.salary_max, job.salary_currency)
+
+
+@lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _render_summary(title, company, location, salary_min, salary_max, currency) -> str:
+    # Ключ - само содержимое строки, поэтому инвалидация не нужна: в дайджесте
+    # одна вакансия попадает во многие сообщения и отрисовывается один раз
+    return JOB_SUMMARY.render({
+        'title': escape_text(title),
+        'company': escape_text(company),
+        'location': escape_text(format_location(location)),
+        'salary': format_salary_range(salary_min, salary_max, currency),
+    })
+
+
+def render_job_confirmation(job_data: dict) -> str:
+    """Подтверждение создания вакансии по данным формы"""
+    return JOB_CONFIRMATION.render({
+        'title': escape_text(job_data['title']),
+        'company': escape_text(job_data['company']),
+        'location': escape_text(format_location(job_data.get('location'))),
+        'salary': format_salary_range(job_data.get('salary_min'), job_data.get('salary_max')),
+        'description': escape_text(job_data['description'][:CONFIRMATION_DESCRIPTION_LENGTH]),
+    })
+
+
+def render_application_details(application, job: Job, applicant) -> str:
+    """Детали отклика для работодателя"""
+    fields = job_fields(job)
+    return APPLICATION_DETAILS.render({
+        'title': fields['title'],
+        'company': fields['company'],
+        'applicant': escape_text(applicant.get_full_name()),
+        'username': f"📱 <b>Username:</b> @{escape_text(applicant.username)}\n" if applicant.username else '',
+        'applied_at': application.created_at.strftime('%d.%m.%Y %H:%M'),
+        'status': escape_text(APPLICATION_STATUSES.get(application.status, application.status)),
+        'cover_letter': (
+            f"📝 <b>Сопроводительное письмо:</b>\n{escape_text(application.cover_letter)}"
+            if application.cover_letter else ''
+        ),
+    })
@@ -1,18 +1,46 @@
 import schedule
+import os
 import time
 import threading
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional
 
-from user import db
+from user import User, db
 from job import Job
 from subscription import Subscription
+from subscription_index import SubscriptionIndex
+from subscription_matcher import IndexedJob, compile_subscription
+import job_search
+from delivery import NotificationDelivery
+from digest import send_digest_bulk
+from scheduler_state import JobIdHorizon, SchedulerState, mark_jobs_sent
+from events import JOB_CREATED
+from cleanup import CLEANUP_DRY_RUN, deactivate_expired_subscriptions, deactivate_stale_jobs, purge_notification_log
+from unit_of_work import UnitOfWork
+from leader_election import create_leader_elector
+from notification_aggregator import UserDigest, apply_daily_caps, batched, group_by_user, record_sent
+from digest_workers import DIGEST_WORKERS, run_sharded_digest
+from job_cache import job_cards
+from notifications import Outbox, digest_message, subscription_message
 
 # УДАЛЕНО: from main import bot - больше не импортируем bot из main
 
 logger = logging.getLogger(__name__)
 
+# Как часто проверять наступившие задачи (сек.)
+SCHEDULER_POLL_INTERVAL = 10
+
+# Водяной знак ленты новых вакансий для немедленных уведомлений
+IMMEDIATE_WATERMARK = 'immediate'
+
+# Сколько новых вакансий обрабатывать за один проход
+IMMEDIATE_BATCH_SIZE = int(os.getenv('IMMEDIATE_BATCH_SIZE', 500))
+
+# Окно при первом запуске (пока водяного знака еще нет)
+IMMEDIATE_INITIAL_WINDOW = timedelta(hours=1)
+
 class NotificationScheduler:
     """Планировщик уведомлений о новых вакансиях"""
     
@@ -26,36 +54,60 @@ class NotificationScheduler:
         self.bot = bot_instance
         self.app = bot_instance.app  # Получаем Flask app из экземпляра бота
         self.running = False
+        self.subscription_index = SubscriptionIndex()  # Индекс немедленных подписок
+        self.delivery = NotificationDelivery(bot_instance.bot)  # Очередь отправки сообщений
+        self.immediate_watermark = 0  # Последний известный водяной знак (для пропуска уже обработанных событий)
+        self.job_id_horizon = JobIdHorizon()  # До какого ID все вставки вакансий уже зафиксированы
+        self.leader = create_leader_elector(self.app, db)  # Плановые задачи выполняет только ведущий экземпляр
         self.setup_schedule()
         
+        # Новые вакансии рассылаются по событию, плановый тик остается страховкой
+        self.event_bus = getattr(bot_instance, 'event_bus', None)
+        if self.event_bus is not None:
+            self.event_bus.subscribe(JOB_CREATED, self.on_job_created)
+        
         logger.info("NotificationScheduler инициализирован")
     
     def setup_schedule(self):
-        """Настройка расписания уведомлений"""
+        """Настройка расписания уведомлений
+        
+        Задачи наступают на всех экземплярах, но выполняет их только ведущий
+        (см. leader_only): на ведомом задача просто переносится на следующий
+        запуск, и после смены ведущего пропущенные задачи не выполняются разом.
+        """
         # Проверка немедленных уведомлений каждые 5 минут
-        schedule.every(5).minutes.do(self.send_immediate_notifications)
+        schedule.every(5).minutes.do(self.leader_only, self.send_immediate_notifications)
         
         # Ежедневные уведомления в 9:00
-        schedule.every().day.at("09:00").do(self.send_daily_notifications)
+        schedule.every().day.at("09:00").do(self.leader_only, self.send_daily_notifications)
         
         # Еженедельные уведомления по понедельникам в 10:00
-        schedule.every().monday.at("10:00").do(self.send_weekly_notifications)
+        schedule.every().monday.at("10:00").do(self.leader_only, self.send_weekly_notifications)
         
         # Очистка старых данных каждый день в 2:00
-        schedule.every().day.at("02:00").do(self.cleanup_old_data)
+        schedule.every().day.at("02:00").do(self.leader_only, self.cleanup_old_data)
+    
+    def leader_only(self, task):
+        """Выполняет плановую задачу, только если этот экземпляр ведущий"""
+        if not self.leader.is_leader:
+            logger.debug(f"Задача {task.__name__} пропущена: экземпляр не ведущий")
+            return
+        task()
     
     def start(self):
         """Запускает планировщик"""
         self.running = True
+        self.delivery.start()
+        self.leader.start()
         
         def run_scheduler():
             while self.running:
                 try:
                     schedule.run_pending()
-                    time.sleep(60)  # Проверяем каждую минуту
+                    time.sleep(SCHEDULER_POLL_INTERVAL)
                 except Exception as e:
                     logger.error(f"Ошибка в планировщике: {e}")
-                    time.sleep(60)
+                    time.sleep(SCHEDULER_POLL_INTERVAL)
         
         scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
         scheduler_thread.start()
@@ -65,58 +117,189 @@ class NotificationScheduler:
     def stop(self):
         """Останавливает планировщик"""
         self.running = False
+        self.leader.stop()
+        self.delivery.stop(timeout=30)
+        self.subscription_index.close()
         logger.info("Планировщик уведомлений остановлен")
     
     def send_immediate_notifications(self):
-        """Отправляет немедленные уведомления"""
+        """Отправляет немедленные уведомления о вакансиях, появившихся после прошлого тика"""
         with self.app.app_context():
             try:
-                # Получаем подписки с немедленными уведомлениями
-                subscriptions = Subscription.query.filter_by(
-                    frequency='immediate',
-                    is_active=True,
-                    is_paused=False
-                ).all()
-                
-                for subscription in subscriptions:
-                    self.process_subscription(subscription)
-                    
+                self.process_new_jobs()
             except Exception as e:
+                db.session.rollback()
                 logger.error(f"Ошибка при отправке немедленных уведомлений: {e}")
     
+    def process_new_jobs(self) -> int:
+        """
+        Обрабатывает новые вакансии по водяному знаку
+        
+        Каждая вакансия читается один раз и сопоставляется со всеми
+        немедленными подписками через индекс, поэтому стоимость тика зависит
+        от количества новых вакансий, а не от числа подписчиков. Курсор каждой
+        подписки (last_job_id_sent) защищает от повторной отправки.
+        
+        Returns:
+            int: Количество обработанных вакансий
+        """
+        started_at = datetime.utcnow()
+        # Водяной знак не должен обогнать вакансию, транзакция которой еще не
+        # зафиксирована: граница берется из снимка транзакций БД, а не по часам
+        safe_job_id = self.job_id_horizon.safe_job_id()
+        state = SchedulerState.acquire(IMMEDIATE_WATERMARK, self._initial_watermark)
+        if state is None:
+            logger.debug("Немедленные уведомления уже обрабатывает другой процесс")
+            db.session.rollback()
+            return 0
+        
+        processed = 0
+        notified = 0
+        outbox = Outbox()
+        while state.last_job_id < safe_job_id:
+            jobs = Job.query.filter(
+                Job.id > state.last_job_id,
+                Job.id <= safe_job_id
+            ).order_by(Job.id).limit(IMMEDIATE_BATCH_SIZE).all()
+            if not jobs:
+                # До границы видимых вакансий больше нет (откаченные вставки)
+                state.last_job_id = safe_job_id
+                break
+            
+            notified += self.notify_subscribers([job for job in jobs if job.is_active], outbox, started_at)
+            state.advance(jobs[-1])
+            processed += len(jobs)
+            if len(jobs) < IMMEDIATE_BATCH_SIZE:
+                state.last_job_id = safe_job_id
+                break
+        
+        db.session.commit()
+        # В очередь доставки - только после commit курсоров и журнала отправки
+        outbox.flush(self.delivery)
+        self.immediate_watermark = state.last_job_id
+        if processed:
+            logger.info(f"Немедленные уведомления: {processed} новых вакансий, {notified} пользователей, "
+                        f"водяной знак {state.last_job_id}")
+        return processed
+    
+    @staticmethod
+    def _initial_watermark() -> int:
+        """Начальный водяной знак: последняя вакансия старше окна первого запуска"""
+        since_date = datetime.utcnow() - IMMEDIATE_INITIAL_WINDOW
+        return db.session.query(
+            db.func.coalesce(db.func.max(Job.id), 0)
+        ).filter(Job.created_at < since_date).scalar()
+    
+    def notify_subscribers(self, jobs: List[Job], outbox: Outbox, sent_at: Optional[datetime] = None) -> int:
+        """
+        Готовит уведомления немедленным подписчикам и сохраняет их курсоры (без commit)
+        
+        Строки подписок блокируются, а курсор last_job_id_sent проверяется
+        заново под блокировкой, поэтому вакансия не уходит подписчику дважды.
+        Сообщения складываются в outbox: вызывающий ставит их в очередь
+        доставки только после commit (см. Outbox).
+        
+        Returns:
+            int: Количество уведомленных пользователей
+        """
+        if not jobs:
+            return 0
+        
+        self.subscription_index.sync()
+        matches: Dict[int, List[Job]] = defaultdict(list)
+        for job in jobs:
+            for subscription_id in self.subscription_index.match(job):
+                matches[subscription_id].append(job)
+        if not matches:
+            return 0
+        
+        rows = db.session.query(Subscription, User.telegram_id).join(
+            User, User.id == Subscription.user_id
+        ).filter(
+            Subscription.id.in_(list(matches))
+        ).order_by(Subscription.user_id, Subscription.id).with_for_update(of=Subscription).all()
+        
+        cursors = {}
+        new_matches = []
+        for subscription, telegram_id in rows:
+            cursor = subscription.last_job_id_sent or 0
+            new_jobs = [job for job in matches[subscription.id] if job.id > cursor]
+            if new_jobs:
+                cursors[subscription.id] = max(job.id for job in new_jobs)
+                new_matches.append((subscription, telegram_id, new_jobs))
+        
+        # Одно сообщение на пользователя: без повторов и в пределах дневного лимита
+        jobs_sent = {}
+        users_notified = 0
+        for batch in batched(group_by_user(new_matches)):
+            digests = apply_daily_caps(batch, sent_at)
+            for digest in digests:
+                outbox.add_digest(digest)
+            record_sent(digests, sent_at)
+            for digest in batch:
+                jobs_sent.update(digest.jobs_by_subscription())
+            users_notified += len(digests)
+        
+        mark_jobs_sent({
+            subscription_id: (job_id, jobs_sent.get(subscription_id, 0))
+            for subscription_id, job_id in cursors.items()
+        }, sent_at)
+        return users_notified
+    
     def send_daily_notifications(self):
         """Отправляет ежедневные уведомления"""
-        with self.app.app_context():
-            try:
-                subscriptions = Subscription.query.filter_by(
-                    frequency='daily',
-                    is_active=True,
-                    is_paused=False
-                ).all()
-                
-                for subscription in subscriptions:
-                    if subscription.should_send_notification():
-                        self.process_subscription(subscription)
-                        
-            except Exception as e:
-                logger.error(f"Ошибка при отправке ежедневных уведомлений: {e}")
+        self.send_digest_notifications('daily')
     
     def send_weekly_notifications(self):
         """Отправляет еженедельные уведомления"""
+        self.send_digest_notifications('weekly')
+    
+    def send_digest_notifications(self, frequency: str):
+        """Отправляет дайджест: подбор вакансий для всех подписок одним запросом
+        
+        При DIGEST_WORKERS > 1 дайджест делится на шарды по user_id и
+        выполняется в пуле процессов (см. digest_workers).
+        """
+        started_at = datetime.utcnow()
+        shards = list(range(DIGEST_WORKERS))
+        if DIGEST_WORKERS > 1:
+            try:
+                shards = run_sharded_digest(frequency, DIGEST_WORKERS, started_at)['failed_shards']
+            except Exception as e:
+                logger.error(f"Ошибка пула дайджеста ({frequency}), выполнение в текущем процессе: {e}")
+            if not shards:
+                return
+        
+        # Упавшие шарды повторяются здесь: каждая пачка фиксирует журнал и отметки подписок
+        # сразу после постановки в очередь, поэтому повтор пропустит уже отправленное
         with self.app.app_context():
             try:
-                subscriptions = Subscription.query.filter_by(
-                    frequency='weekly',
-                    is_active=True,
-                    is_paused=False
-                ).all()
-                
+                for shard in shards:
+                    send_digest_bulk(self.delivery, frequency, started_at, shard, DIGEST_WORKERS)
+            except Exception as e:
+                logger.error(f"Ошибка пакетного подбора дайджеста ({frequency}), переход на обработку по подпискам: {e}")
+                db.session.rollback()
+                self.send_digest_per_subscription(frequency)
+    
+    def send_digest_per_subscription(self, frequency: str):
+        """Запасной режим: отдельный запрос для каждой подписки"""
+        try:
+            subscriptions = Subscription.query.filter_by(
+                frequency=frequency,
+                is_active=True,
+                is_paused=False
+            ).all()
+            
+            # mark_notification_sent фиксируется пачками, а не commit на каждую подписку
+            with UnitOfWork() as unit:
                 for subscription in subscriptions:
                     if subscription.should_send_notification():
                         self.process_subscription(subscription)
-                        
-            except Exception as e:
-                logger.error(f"Ошибка при отправке еженедельных уведомлений: {e}")
+            
+            logger.info(f"Уведомления ({frequency}) по подпискам: {unit.changes} отправок, {unit.commits} транзакций")
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомлений ({frequency}): {e}")
     
     def process_subscription(self, subscription: Subscription):
         """Обрабатывает подписку и отправляет уведомления"""
@@ -136,28 +319,33 @@ class NotificationScheduler:
             jobs = self.find_matching_jobs(criteria, since_date, subscription)
             
             if jobs:
-                self.send_notification_to_user(subscription, jobs)
-                subscription.mark_notification_sent(len(jobs))
+                # Журнал уведомлений исключает уже отправленное (например, пакетным дайджестом до сбоя)
+                digest = UserDigest(subscription.user_id, subscription.user.telegram_id)
+                digest.add(subscription, jobs)
+                digests = apply_daily_caps([digest])
+                if digests:
+                    self.send_notification_to_user(subscription, list(digest.jobs.values()), digest.telegram_id)
+                    record_sent(digests)
+                subscription.mark_notification_sent(len(digest.jobs))
                 
         except Exception as e:
             logger.error(f"Ошибка при обработке подписки {subscription.id}: {e}")
     
     def find_matching_jobs(self, criteria: dict, since_date: datetime, subscription: Subscription) -> List[Job]:
-        """Находит вакансии, соответствующие критериям"""
+        """Находит вакансии, соответствующие критериям
+        
+        Ключевые слова ищутся полнотекстово (job_search.text_filter), а не
+        подстрокой, как в немедленных уведомлениях (см. CompiledSubscription.matches).
+        """
         query = Job.query.filter(
             Job.is_active == True,
             Job.created_at >= since_date  # Изменено с published_at на created_at
         )
         
-        # Применяем фильтры из критериев
+        # Применяем фильтры из критериев (ключевые слова - полнотекстовый поиск)
         if 'keywords' in criteria:
             keywords = criteria['keywords']
-            query = query.filter(
-                db.or_(
-                    Job.title.ilike(f'%{keywords}%'),
-                    Job.description.ilike(f'%{keywords}%')
-                )
-            )
+            query = query.filter(job_search.text_filter(keywords))
         
         if 'location' in criteria:
             location = criteria['location']
@@ -177,151 +365,87 @@ class NotificationScheduler:
         if hasattr(subscription, 'only_featured') and subscription.only_featured:
             query = query.filter(Job.is_featured == True)
         
+        # Списки фильтров берутся из скомпилированной подписки (без повторного разбора JSON)
+        compiled = compile_subscription(subscription)
+        
+        # Списки допустимых значений (пустой список - без ограничения)
+        if compiled.locations:
+            query = query.filter(db.or_(
+                db.func.coalesce(Job.location, '') == '',
+                *[Job.location.ilike(f'%{location}%') for location in compiled.locations]
+            ))
+        if compiled.employment_types:
+            query = query.filter(db.func.lower(Job.employment_type).in_(compiled.employment_types))
+        if compiled.experience_levels:
+            query = query.filter(db.func.lower(Job.experience_level).in_(compiled.experience_levels))
+        if compiled.categories:
+            query = query.filter(db.func.lower(Job.category).in_(compiled.categories))
+        
         # Исключаем по черному списку компаний
-        if hasattr(subscription, 'get_company_blacklist_list'):
-            company_blacklist = subscription.get_company_blacklist_list()
-            if company_blacklist:
-                for company in company_blacklist:
-                    query = query.filter(~Job.company.ilike(f'%{company}%'))
+        for company in compiled.company_blacklist:
+            query = query.filter(~Job.company.ilike(f'%{company}%'))
         
         # Исключаем по ключевым словам
-        if hasattr(subscription, 'get_exclude_keywords_list'):
-            exclude_keywords = subscription.get_exclude_keywords_list()
-            if exclude_keywords:
-                for keyword in exclude_keywords:
-                    query = query.filter(
-                        ~db.and_(
-                            Job.title.ilike(f'%{keyword}%'),
-                            Job.description.ilike(f'%{keyword}%')
-                        )
-                    )
+        for keyword in compiled.exclude_keywords:
+            query = query.filter(
+                ~db.and_(
+                    Job.title.ilike(f'%{keyword}%'),
+                    Job.description.ilike(f'%{keyword}%')
+                )
+            )
         
         # Ограничиваем количество результатов
         max_jobs = getattr(subscription, 'max_notifications_per_day', 10) or 10
         
-        return query.order_by(Job.created_at.desc()).limit(max_jobs).all()
+        # Только чтение: при наличии реплики запрос выполняется на ней
+        return query.order_by(Job.created_at.desc()).limit(max_jobs).execution_options(replica=True).all()
     
-    def send_notification_to_user(self, subscription: Subscription, jobs: List[Job]):
+    def send_user_digest(self, digest: UserDigest):
+        """Отправляет пользователю одно сообщение с вакансиями по всем его подпискам"""
+        try:
+            text, markup = digest_message(digest)
+            self.delivery.enqueue(digest.telegram_id, text, parse_mode='HTML', reply_markup=markup)
+            logger.debug(f"Сводка пользователю {digest.telegram_id}: {len(digest.jobs)} вакансий поставлена в очередь")
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сводки пользователю {digest.user_id}: {e}")
+    
+    def send_notification_to_user(self, subscription: Subscription, jobs: List[Job], telegram_id: Optional[int] = None):
         """Отправляет уведомление пользователю"""
         try:
-            user = subscription.user
-            
-            if len(jobs) == 1:
-                # Одна вакансия - подробное уведомление
-                job = jobs[0]
-                text = f"🔔 <b>Новая вакансия по подписке \"{subscription.name}\"</b>\n\n"
-                text += f"💼 <b>{job.title}</b>\n"
-                text += f"🏢 {job.company}\n"
-                text += f"📍 {job.location or 'Не указано'}\n"
-                
-                # Формируем зарплату
-                if job.salary_min and job.salary_max:
-                    text += f"💰 {job.salary_min:,} - {job.salary_max:,} руб.\n"
-                elif job.salary_min:
-                    text += f"💰 от {job.salary_min:,} руб.\n"
-                elif job.salary_max:
-                    text += f"💰 до {job.salary_max:,} руб.\n"
-                else:
-                    text += f"💰 По договоренности\n"
-                
-                # Краткое описание
-                description = job.description[:150] + "..." if len(job.description) > 150 else job.description
-                text += f"\n📝 {description}\n\n"
-                text += f"🕒 Опубликовано: {job.created_at.strftime('%d.%m.%Y %H:%M')}"
-                
-                from telebot import types
-                markup = types.InlineKeyboardMarkup()
-                markup.add(
-                    types.InlineKeyboardButton("👀 Подробнее", callback_data=f"view_job_{job.id}"),
-                    types.InlineKeyboardButton("📝 Откликнуться", callback_data=f"apply_job_{job.id}")
-                )
-                markup.add(
-                    types.InlineKeyboardButton("⚙️ Настроить подписку", callback_data=f"edit_subscription_{subscription.id}")
-                )
-                
-            else:
-                # Несколько вакансий - краткий список
-                text = f"🔔 <b>Найдено {len(jobs)} новых вакансий по подписке \"{subscription.name}\"</b>\n\n"
-                
-                for i, job in enumerate(jobs[:5], 1):
-                    salary_range = "По договоренности"
-                    if job.salary_min and job.salary_max:
-                        salary_range = f"{job.salary_min:,} - {job.salary_max:,} руб."
-                    elif job.salary_min:
-                        salary_range = f"от {job.salary_min:,} руб."
-                    elif job.salary_max:
-                        salary_range = f"до {job.salary_max:,} руб."
-                    
-                    text += f"{i}. <b>{job.title}</b> в {job.company}\n"
-                    text += f"   📍 {job.location or 'Не указано'} | 💰 {salary_range}\n\n"
-                
-                if len(jobs) > 5:
-                    text += f"... и еще {len(jobs) - 5} вакансий\n\n"
-                
-                from telebot import types
-                markup = types.InlineKeyboardMarkup()
-                markup.add(
-                    types.InlineKeyboardButton("📋 Посмотреть все", callback_data="all_jobs"),
-                    types.InlineKeyboardButton("🔍 Поиск", callback_data="search_jobs")
-                )
-                markup.add(
-                    types.InlineKeyboardButton("⚙️ Настроить подписку", callback_data=f"edit_subscription_{subscription.id}")
-                )
-            
-            # Используем self.bot для отправки сообщения
-            if self.bot and hasattr(self.bot, 'bot'):
-                self.bot.bot.send_message(
-                    user.telegram_id,
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=markup
-                )
-                
-                logger.info(f"Отправлено уведомление пользователю {user.telegram_id} о {len(jobs)} вакансиях")
-            else:
-                logger.error("Bot instance не доступен для отправки уведомлений")
-            
+            if telegram_id is None:
+                telegram_id = subscription.user.telegram_id
+            text, markup = subscription_message(subscription, jobs)
+            # Отправка идет в фоне через очередь доставки с учетом лимитов Telegram
+            self.delivery.enqueue(telegram_id, text, parse_mode='HTML', reply_markup=markup)
+            logger.debug(f"Уведомление пользователю {telegram_id} о {len(jobs)} вакансиях поставлено в очередь")
         except Exception as e:
             logger.error(f"Ошибка при отправке уведомления пользователю {subscription.user_id}: {e}")
     
-    def cleanup_old_data(self):
-        """Очищает старые данные"""
+    def cleanup_old_data(self, dry_run: bool = CLEANUP_DRY_RUN):
+        """Очищает старые данные пачками UPDATE/DELETE без загрузки строк в память
+        
+        Args:
+            dry_run: Только подсчитать и записать в лог, что было бы изменено
+        """
         with self.app.app_context():
+            started_at = datetime.utcnow()
             try:
-                # Удаляем истекшие подписки
-                expired_date = datetime.utcnow()
-                expired_subscriptions = Subscription.query.filter(
-                    Subscription.expires_at < expired_date
-                ).all()
-                
-                for subscription in expired_subscriptions:
-                    if hasattr(subscription, 'deactivate'):
-                        subscription.deactivate()
-                    else:
-                        subscription.is_active = False
+                subscriptions = deactivate_expired_subscriptions(started_at, dry_run=dry_run)
+                logger.info(f"Деактивировано {subscriptions} истекших подписок")
                 
-                logger.info(f"Деактивировано {len(expired_subscriptions)} истекших подписок")
+                jobs = deactivate_stale_jobs(started_at, dry_run=dry_run)
+                logger.info(f"Деактивировано {jobs} старых вакансий")
                 
-                # Деактивируем старые вакансии (старше 90 дней без активности)
-                old_date = datetime.utcnow() - timedelta(days=90)
-                old_jobs = Job.query.filter(
-                    Job.is_active == True,
-                    Job.created_at < old_date
-                ).all()
+                # Журнал отправок нужен только для лимитов и защиты от повторов
+                log_rows = purge_notification_log(started_at, dry_run=dry_run)
+                logger.info(f"Удалено {log_rows} старых записей журнала уведомлений")
                 
-                # Проверяем количество откликов, если поле существует
-                for job in old_jobs:
-                    applications_count = 0
-                    if hasattr(job, 'applications'):
-                        applications_count = len(job.applications)
-                    
-                    if applications_count == 0:
-                        job.is_active = False
-                
-                db.session.commit()
-                logger.info(f"Деактивировано {len(old_jobs)} старых вакансий")
+                elapsed = (datetime.utcnow() - started_at).total_seconds()
+                mode = " (проверка, без изменений)" if dry_run else ""
+                logger.info(f"Очистка старых данных завершена за {elapsed:.1f} с{mode}")
                 
             except Exception as e:
+                db.session.rollback()
                 logger.error(f"Ошибка при очистке старых данных: {e}")
     
     def send_test_notification(self, user_id: int, message: str):
@@ -338,84 +462,42 @@ class NotificationScheduler:
     def send_notification(self, telegram_id: int, message_text: str):
         """Отправляет простое уведомление пользователю"""
         try:
-            if self.bot and hasattr(self.bot, 'bot'):
-                self.bot.bot.send_message(telegram_id, message_text)
-                logger.info(f"Отправлено уведомление пользователю {telegram_id}")
-            else:
-                logger.error("Bot instance не доступен для отправки уведомления")
+            self.delivery.enqueue(telegram_id, message_text)
+            logger.info(f"Уведомление пользователю {telegram_id} поставлено в очередь")
         except Exception as e:
             logger.error(f"Ошибка при отправке уведомления: {e}")
     
     def schedule_job_notification(self, job_id: int):
-        """Планирует уведомления о новой вакансии"""
-        try:
-            with self.app.app_context():
-                job = Job.query.get(job_id)
-                if not job:
-                    logger.error(f"Вакансия с ID {job_id} не найдена")
-                    return
-                
-                # Находим подписки, которые могут заинтересоваться этой вакансией
-                subscriptions = Subscription.query.filter_by(
-                    frequency='immediate',
-                    is_active=True,
-                    is_paused=False
-                ).all()
-                
-                for subscription in subscriptions:
-                    criteria = subscription.get_criteria_dict()
-                    
-                    # Проверяем, подходит ли вакансия под критерии
-                    if self.job_matches_criteria(job, criteria, subscription):
-                        self.send_notification_to_user(subscription, [job])
-                        subscription.mark_notification_sent(1)
-                
-                logger.info(f"Обработаны уведомления для вакансии {job_id}")
-                
-        except Exception as e:
-            logger.error(f"Ошибка при планировании уведомлений о вакансии {job_id}: {e}")
+        """Планирует уведомления о новой вакансии (публикует событие job_created)"""
+        if self.event_bus is not None:
+            self.event_bus.publish_later(JOB_CREATED, {'job_id': job_id})
+        else:
+            self.on_job_created({'job_id': job_id})
+    
+    def on_job_created(self, payload: dict):
+        """Обработчик события job_created (выполняется в фоновом потоке шины событий)
+        
+        Вакансия отправляется тем же проходом по водяному знаку, что и в
+        плановом тике, поэтому пачка событий приводит к одному проходу,
+        а курсоры подписок исключают повторы.
+        """
+        job_id = payload.get('job_id')
+        if job_id is not None and job_id <= self.immediate_watermark:
+            return  # уже обработана предыдущим проходом
+        
+        # Вакансия уже зафиксирована (событие публикуется после commit); если в этот
+        # момент идут другие вставки, ее заберет следующий проход (см. JobIdHorizon)
+        self.send_immediate_notifications()
     
     def job_matches_criteria(self, job: Job, criteria: dict, subscription: Subscription) -> bool:
-        """Проверяет, соответствует ли вакансия критериям подписки"""
+        """Проверяет, соответствует ли вакансия критериям подписки
+        
+        Критерии берутся из скомпилированной подписки (разбираются один раз
+        на изменение подписки); аргумент criteria оставлен для совместимости.
+        """
         try:
-            # Проверяем ключевые слова
-            if 'keywords' in criteria:
-                keywords = criteria['keywords'].lower()
-                if keywords not in job.title.lower() and keywords not in job.description.lower():
-                    return False
-            
-            # Проверяем местоположение
-            if 'location' in criteria:
-                location = criteria['location'].lower()
-                if job.location and location not in job.location.lower():
-                    return False
-            
-            # Проверяем компанию
-            if 'company' in criteria:
-                company = criteria['company'].lower()
-                if company not in job.company.lower():
-                    return False
-            
-            # Проверяем минимальную зарплату
-            if hasattr(subscription, 'min_salary') and subscription.min_salary:
-                if not job.salary_min or job.salary_min < subscription.min_salary:
-                    return False
-            
-            # Проверяем черный список компаний
-            if hasattr(subscription, 'get_company_blacklist_list'):
-                company_blacklist = subscription.get_company_blacklist_list()
-                for blacklisted_company in company_blacklist:
-                    if blacklisted_company.lower() in job.company.lower():
-                        return False
-            
-            # Проверяем исключающие ключевые слова
-            if hasattr(subscription, 'get_exclude_keywords_list'):
-                exclude_keywords = subscription.get_exclude_keywords_list()
-                for keyword in exclude_keywords:
-                    if keyword.lower() in job.title.lower() or keyword.lower() in job.description.lower():
-                        return False
-            
-            return True
+            prepared_job = job if isinstance(job, IndexedJob) else IndexedJob(job)
+            return compile_subscription(subscription).matches(prepared_job)
             
         except Exception as e:
             logger.error(f"Ошибка при проверке соответствия вакансии критериям: {e}")
@@ -455,7 +537,15 @@ class NotificationScheduler:
                     'immediate_subscriptions': immediate_subs,
                     'daily_subscriptions': daily_subs,
                     'weekly_subscriptions': weekly_subs,
-                    'scheduler_running': self.running
+                    'immediate_watermark': db.session.query(SchedulerState.last_job_id).filter_by(
+                        name=IMMEDIATE_WATERMARK
+                    ).scalar(),
+                    'scheduler_running': self.running,
+                    'scheduler_leader': self.leader.is_leader,
+                    'scheduler_instance': self.leader.holder,
+                    'delivery': self.delivery.get_stats(),
+                    'job_cards': job_cards.get_stats(),
+                    'events': self.event_bus.get_stats() if self.event_bus is not None else None
                 }
                 
             except Exception as e:
@@ -0,0 +1,156 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import Integer, case, column, func, text, update, values
+from sqlalchemy.dialects.postgresql import insert
+
+from core import db
+from subscription import Subscription
+
+
+class SchedulerState(db.Model):
+    """Водяной знак планировщика: до какой вакансии уже обработана лента новых вакансий
+
+    Строка блокируется (SELECT ... FOR UPDATE) на время тика, поэтому
+    несколько экземпляров бота не обрабатывают одни и те же вакансии.
+    """
+    __tablename__ = 'scheduler_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_job_id = db.Column(db.Integer, nullable=False, default=0)
+    last_job_created_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SchedulerState {self.name}: job {self.last_job_id}>'
+
+    @staticmethod
+    def acquire(name: str, initial_job_id: Callable[[], int]) -> Optional['SchedulerState']:
+        """
+        Блокирует строку водяного знака до конца транзакции, создавая ее при отсутствии
+
+        Args:
+            name: Имя водяного знака
+            initial_job_id: Функция, возвращающая начальный ID (вызывается только при создании)
+
+        Returns:
+            SchedulerState или None, если строку уже держит другой процесс
+        """
+        query = SchedulerState.query.filter_by(name=name).with_for_update(skip_locked=True)
+        state = query.first()
+        if state is not None:
+            return state
+
+        if db.session.query(SchedulerState.name).filter_by(name=name).first() is not None:
+            return None  # строка есть, но заблокирована другим процессом
+
+        db.session.execute(
+            insert(SchedulerState.__table__)
+            .values(name=name, last_job_id=initial_job_id(), updated_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['name'])
+        )
+        return query.first()
+
+    def advance(self, job):
+        """Сдвигает водяной знак на вакансию job"""
+        if job.id > self.last_job_id:
+            self.last_job_id = job.id
+            self.last_job_created_at = job.created_at
+
+
+# Последний выданный ID вакансии и границы текущего снимка транзакций (одним запросом)
+JOB_ID_HORIZON_SQL = """
+SELECT coalesce(pg_sequence_last_value(pg_get_serial_sequence('jobs', 'id')::regclass), 0),
+       pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+       pg_snapshot_xmax(pg_current_snapshot())::text::bigint
+"""
+
+
+class JobIdHorizon:
+    """Граница ID вакансий, до которой все вставки уже видны (по данным БД)
+
+    ID выдаются последовательностью раньше фиксации, поэтому вакансия с
+    меньшим ID может стать видна позже вакансии с большим. Каждый вызов
+    safe_job_id() запоминает последний выданный ID и xmax снимка: этот ID
+    становится безопасным, когда xmin нового снимка дошел до запомненного
+    xmax, то есть завершились все транзакции, которые могли держать ID не
+    больше него. Если пишущих транзакций нет, граница безопасна сразу же.
+    Долгая пишущая транзакция задерживает границу до своего завершения.
+    """
+
+    def __init__(self, max_pending: int = 100):
+        self._pending = deque(maxlen=max_pending)  # (last_job_id, xmax), по возрастанию
+        self._safe_job_id = 0
+        self._lock = threading.Lock()
+
+    def safe_job_id(self, connection=None) -> int:
+        """Наибольший ID, все вакансии до которого уже видны
+
+        Вызывается до блокировок и записей в транзакции: собственный
+        незавершенный xid не должен попасть в снимок.
+        """
+        executor = connection if connection is not None else db.session
+        last_job_id, xmin, xmax = executor.execute(text(JOB_ID_HORIZON_SQL)).one()
+        with self._lock:
+            self._pending.append((last_job_id, xmax))
+            while self._pending and self._pending[0][1] <= xmin:
+                self._safe_job_id = max(self._safe_job_id, self._pending.popleft()[0])
+            return self._safe_job_id
+
+
+class SchedulerLease(db.Model):
+    """Аренда роли ведущего планировщика (см. LeaderElector)
+
+    Ведущим считается экземпляр, указанный в holder, пока не истек expires_at.
+    Время берется из БД, поэтому расхождение часов экземпляров не важно.
+    """
+    __tablename__ = 'scheduler_lease'
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(255), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False)
+    renewed_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name}: {self.holder}>'
+
+
+def mark_jobs_sent(cursors: Dict[int, Tuple[int, int]], sent_at: Optional[datetime] = None):
+    """
+    Сохраняет курсоры подписок пачкой UPDATE (без commit)
+
+    updated_at не меняется: курсор не является изменением критериев, и
+    скомпилированная подписка в кэше остается действительной.
+
+    Args:
+        cursors: {subscription_id: (ID последней отправленной вакансии, количество вакансий)}
+        sent_at: Время отправки
+    """
+    if not cursors:
+        return
+
+    sent_at = sent_at or datetime.utcnow()
+    table = Subscription.__table__
+    # Одна инструкция UPDATE ... FROM (VALUES ...) вместо executemany (psycopg2 выполняет его построчно)
+    sent = values(
+        column('id', Integer), column('job_id', Integer), column('jobs_count', Integer), name='sent'
+    ).data([
+        (subscription_id, job_id, jobs_count)
+        for subscription_id, (job_id, jobs_count) in cursors.items()
+    ])
+    statement = (
+        update(table)
+        .where(table.c.id == sent.c.id)
+        .values(
+            last_job_id_sent=func.greatest(func.coalesce(table.c.last_job_id_sent, 0), sent.c.job_id),
+            last_notification_sent=sent_at,
+            total_notifications_sent=func.coalesce(table.c.total_notifications_sent, 0)
+            + case((sent.c.jobs_count > 0, 1), else_=0),
+            total_jobs_found=func.coalesce(table.c.total_jobs_found, 0) + sent.c.jobs_count,
+            updated_at=table.c.updated_at,
+        )
+    )
+    db.session.execute(statement)
@@ -0,0 +1,111 @@
+import logging
+
+from sqlalchemy import text
+
+from job import SEARCH_VECTOR_SQL
+from db_pool import disable_statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# Разбор старого JSON-текста: пустая строка -> NULL, JSON-массив - как есть,
+# скаляр - массив из одного элемента, не-JSON - список через запятую
+TRY_JSONB_ARRAY_SQL = """
+CREATE OR REPLACE FUNCTION try_jsonb_array(value text) RETURNS jsonb AS $$
+DECLARE
+    parsed jsonb;
+BEGIN
+    IF value IS NULL OR btrim(value) = '' THEN
+        RETURN NULL;
+    END IF;
+    BEGIN
+        parsed := value::jsonb;
+    EXCEPTION WHEN others THEN
+        RETURN (SELECT jsonb_agg(btrim(part)) FROM unnest(string_to_array(value, ',')) AS part
+                WHERE btrim(part) <> '');
+    END;
+    IF jsonb_typeof(parsed) = 'array' THEN
+        RETURN parsed;
+    ELSIF jsonb_typeof(parsed) = 'null' THEN
+        RETURN NULL;
+    END IF;
+    RETURN jsonb_build_array(parsed);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+
+def _to_jsonb(table, column):
+    """Переводит текстовую колонку в jsonb (ничего не делает, если она уже jsonb)"""
+    return f"""
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = '{table}' AND column_name = '{column}' AND data_type = 'text') THEN
+        ALTER TABLE {table} ALTER COLUMN {column} TYPE jsonb USING try_jsonb_array({column});
+    END IF;
+END
+$$
+"""
+
+
+# Идемпотентные шаги обновления схемы для уже существующих БД.
+# db.create_all() создает только отсутствующие таблицы, поэтому новые колонки
+# и индексы для старых таблиц добавляются здесь. Каждый шаг выполняется в
+# отдельной транзакции: ошибка одного шага не мешает остальным.
+SCHEMA_UPGRADES = [
+    ('Полнотекстовый поиск по вакансиям', [
+        f"ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_search_vector ON jobs USING gin (search_vector)",
+    ]),
+    ('Индекс для keyset-пагинации вакансий', [
+        "CREATE INDEX IF NOT EXISTS ix_jobs_active_published_id ON jobs (is_active, published_at, id)",
+    ]),
+    ('Индекс для списка откликов работодателя', [
+        "CREATE INDEX IF NOT EXISTS ix_applications_job_created_id ON applications (job_id, created_at, id)",
+    ]),
+    ('Работодатель в откликах для списка откликов по всем вакансиям', [
+        "ALTER TABLE applications ADD COLUMN IF NOT EXISTS employer_id integer REFERENCES users (id)",
+        "UPDATE applications SET employer_id = jobs.employer_id FROM jobs "
+        "WHERE jobs.id = applications.job_id AND applications.employer_id IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_applications_employer_created_id ON applications (employer_id, created_at, id)",
+    ]),
+    ('Списки в JSONB вместо JSON-текста', [
+        TRY_JSONB_ARRAY_SQL,
+        _to_jsonb('subscriptions', 'employment_types'),
+        _to_jsonb('subscriptions', 'experience_levels'),
+        _to_jsonb('subscriptions', 'locations'),
+        _to_jsonb('subscriptions', 'categories'),
+        _to_jsonb('subscriptions', 'exclude_keywords'),
+        _to_jsonb('subscriptions', 'company_blacklist'),
+        _to_jsonb('jobs', 'skills_required'),
+        _to_jsonb('jobs', 'tags'),
+        _to_jsonb('users', 'skills'),
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_locations ON subscriptions USING gin (locations jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_categories ON subscriptions USING gin (categories jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_employment_types ON subscriptions USING gin (employment_types jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_experience_levels ON subscriptions USING gin (experience_levels jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_tags ON jobs USING gin (tags jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_skills_required ON jobs USING gin (skills_required jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_users_skills ON users USING gin (skills jsonb_path_ops)",
+    ]),
+    ('Триграммные индексы для поиска по подстроке (pg_trgm)', [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_title_trgm ON jobs USING gin (title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_company_trgm ON jobs USING gin (company gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_location_trgm ON jobs USING gin (location gin_trgm_ops)",
+    ]),
+]
+
+
+def upgrade_schema(db):
+    """Применяет шаги обновления схемы к существующей БД"""
+    for name, statements in SCHEMA_UPGRADES:
+        try:
+            with db.engine.begin() as connection:
+                disable_statement_timeout(connection)  # построение индексов на больших таблицах
+                for statement in statements:
+                    connection.execute(text(statement))
+            logger.info(f"Схема БД: {name} - ок")
+        except Exception as e:
+            logger.warning(f"Схема БД: шаг '{name}' пропущен: {e}")
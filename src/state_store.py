@@ -0,0 +1,134 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import redis
+except ImportError:  # Redis необязателен: без него используется хранилище в памяти
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Время жизни состояния диалога (сек.) и максимум состояний в памяти
+STATE_TTL = int(os.getenv('STATE_TTL', 24 * 3600))
+STATE_MAX_USERS = int(os.getenv('STATE_MAX_USERS', 10000))
+STATE_KEY_PREFIX = os.getenv('STATE_KEY_PREFIX', 'hr_bot:state:')
+
+
+def dump_state(state: dict) -> str:
+    """Компактная сериализация состояния в JSON"""
+    return json.dumps(state, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_state(data) -> Optional[dict]:
+    """Десериализация состояния (None для пустых или поврежденных данных)"""
+    if not data:
+        return None
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    try:
+        return json.loads(data)
+    except ValueError:
+        logger.warning("Поврежденное состояние диалога пропущено")
+        return None
+
+
+class StateStore(ABC):
+    """Хранилище состояний диалогов пользователей
+
+    get() возвращает копию состояния: после изменения его нужно сохранить
+    через set(), иначе изменения не попадут в хранилище.
+    """
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[dict]:
+        """Состояние пользователя (None - нет или истекло)"""
+
+    @abstractmethod
+    def set(self, user_id: int, state: dict):
+        """Сохраняет состояние пользователя"""
+
+    @abstractmethod
+    def delete(self, user_id: int):
+        """Удаляет состояние пользователя"""
+
+
+class MemoryStateStore(StateStore):
+    """Состояния в памяти процесса с вытеснением по LRU и сроком жизни"""
+
+    def __init__(self, ttl: int = STATE_TTL, max_size: int = STATE_MAX_USERS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._states = OrderedDict()  # user_id -> (expires_at, json)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            item = self._states.get(user_id)
+            if item is None:
+                return None
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                del self._states[user_id]
+                return None
+            self._states.move_to_end(user_id)
+        return load_state(data)
+
+    def set(self, user_id: int, state: dict):
+        data = dump_state(state)
+        with self._lock:
+            self._states[user_id] = (time.monotonic() + self.ttl, data)
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+
+    def delete(self, user_id: int):
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._states)
+
+
+class RedisStateStore(StateStore):
+    """Состояния в Redis: общие для всех реплик и переживают перезапуск"""
+
+    def __init__(self, client, ttl: int = STATE_TTL, prefix: str = STATE_KEY_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    def get(self, user_id: int) -> Optional[dict]:
+        return load_state(self.client.get(self._key(user_id)))
+
+    def set(self, user_id: int, state: dict):
+        self.client.setex(self._key(user_id), self.ttl, dump_state(state))
+
+    def delete(self, user_id: int):
+        self.client.delete(self._key(user_id))
+
+
+def create_state_store() -> StateStore:
+    """Создает хранилище состояний: Redis, если задан REDIS_URL и он доступен, иначе память"""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning("REDIS_URL задан, но пакет redis не установлен - состояния хранятся в памяти")
+        else:
+            try:
+                client = redis.Redis.from_url(redis_url, socket_timeout=2, socket_connect_timeout=2)
+                client.ping()
+                logger.info("Состояния диалогов хранятся в Redis")
+                return RedisStateStore(client)
+            except Exception as e:
+                logger.warning(f"Redis недоступен ({e}) - состояния хранятся в памяти")
+    return MemoryStateStore()
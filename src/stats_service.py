@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Optional
+
+from sqlalchemy import func, select
+
+from core import db
+from job import Job
+from application import Application
+
+# Статусы откликов, по которым считается статистика
+APPLICATION_STATUSES = ('pending', 'reviewed', 'accepted', 'rejected')
+
+# Время жизни кэша статистики в секундах (0 - кэш выключен)
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 60))
+
+
+class StatsCache:
+    """Кэш результатов статистики с ограниченным временем жизни"""
+
+    def __init__(self, ttl: float = STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._values: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], dict]) -> dict:
+        """Возвращает значение из кэша или вычисляет и запоминает его"""
+        if self.ttl <= 0:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(key)
+            if cached and cached[0] > now:
+                return dict(cached[1])
+
+        value = compute()
+        with self._lock:
+            self._values[key] = (time.monotonic() + self.ttl, value)
+            # Убираем устаревшие записи, чтобы кэш не рос бесконечно
+            if len(self._values) > 10000:
+                self._values = {k: v for k, v in self._values.items() if v[0] > now}
+        return dict(value)
+
+    def invalidate(self, employer_id=None):
+        """Сбрасывает кэш (целиком или для одного работодателя)"""
+        with self._lock:
+            if employer_id is None:
+                self._values.clear()
+            else:
+                self._values = {k: v for k, v in self._values.items() if k[1] != employer_id}
+
+
+stats_cache = StatsCache()
+
+
+def _status_counts():
+    """Выражения count(*) и count(*) FILTER (WHERE status = ...) для всех статусов"""
+    columns = [func.count(Application.id).label('total')]
+    for status in APPLICATION_STATUSES:
+        columns.append(func.count(Application.id).filter(Application.status == status).label(status))
+    return columns
+
+
+def _with_rates(counts: dict) -> dict:
+    """Добавляет к счетчикам доли рассмотренных и принятых откликов (в процентах)"""
+    total = counts['total']
+    responded = counts['reviewed'] + counts['accepted'] + counts['rejected']
+    counts['response_rate'] = round(responded / total * 100, 1) if total > 0 else 0
+    counts['acceptance_rate'] = round(counts['accepted'] / total * 100, 1) if total > 0 else 0
+    return counts
+
+
+def application_statistics(employer_id: Optional[int] = None, days: Optional[int] = 30,
+                           use_cache: bool = True) -> dict:
+    """
+    Статистика откликов одним агрегирующим запросом
+
+    Args:
+        employer_id: ID работодателя (None - по всем вакансиям)
+        days: Период в днях (None - за все время)
+        use_cache: Использовать кэш статистики
+
+    Returns:
+        dict: total, pending, reviewed, accepted, rejected, response_rate, acceptance_rate
+    """
+    def compute():
+        statement = select(*_status_counts()).select_from(Application)
+        if employer_id:
+            statement = statement.join(Job, Job.id == Application.job_id).where(Job.employer_id == employer_id)
+        if days is not None:
+            statement = statement.where(Application.created_at >= datetime.utcnow() - timedelta(days=days))
+        return _with_rates(dict(db.session.execute(statement).one()._mapping))
+
+    if not use_cache:
+        return compute()
+    return stats_cache.get_or_compute(('applications', employer_id, days), compute)
+
+
+def employer_statistics(employer_id: int, use_cache: bool = True) -> dict:
+    """
+    Статистика работодателя за все время одним запросом
+
+    Счетчики откликов по статусам и число активных вакансий (скалярным
+    подзапросом) возвращаются одной строкой.
+
+    Returns:
+        dict: поля application_statistics, а также active_jobs и avg_applications
+    """
+    def compute():
+        active_jobs = (
+            select(func.count(Job.id))
+            .where(Job.employer_id == employer_id, Job.is_active == True)
+            .scalar_subquery()
+        )
+        statement = (
+            select(active_jobs.label('active_jobs'), *_status_counts())
+            .select_from(Application)
+            .join(Job, Job.id == Application.job_id)
+            .where(Job.employer_id == employer_id)
+        )
+        stats = _with_rates(dict(db.session.execute(statement).one()._mapping))
+        stats['avg_applications'] = stats['total'] / stats['active_jobs'] if stats['active_jobs'] else 0
+        return stats
+
+    if not use_cache:
+        return compute()
+    return stats_cache.get_or_compute(('employer', employer_id), compute)
@@ -1,10 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from core import db
+from sqlalchemy.dialects.postgresql import JSONB
+from core import db, as_json_list
+import unit_of_work
 import json
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        # Поиск подписок по элементам списков: locations @> '["Москва"]' и т.п.
+        db.Index('ix_subscriptions_locations', 'locations', postgresql_using='gin', postgresql_ops={'locations': 'jsonb_path_ops'}),
+        db.Index('ix_subscriptions_categories', 'categories', postgresql_using='gin', postgresql_ops={'categories': 'jsonb_path_ops'}),
+        db.Index('ix_subscriptions_employment_types', 'employment_types', postgresql_using='gin', postgresql_ops={'employment_types': 'jsonb_path_ops'}),
+        db.Index('ix_subscriptions_experience_levels', 'experience_levels', postgresql_using='gin', postgresql_ops={'experience_levels': 'jsonb_path_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -24,14 +33,14 @@ class Subscription(db.Model):
     # Filters
     min_salary = db.Column(db.Integer, nullable=True)
     max_salary = db.Column(db.Integer, nullable=True)
-    employment_types = db.Column(db.Text, nullable=True)  # JSON array
-    experience_levels = db.Column(db.Text, nullable=True)  # JSON array
-    locations = db.Column(db.Text, nullable=True)  # JSON array
-    categories = db.Column(db.Text, nullable=True)  # JSON array
+    employment_types = db.Column(JSONB, nullable=True)  # JSON array
+    experience_levels = db.Column(JSONB, nullable=True)  # JSON array
+    locations = db.Column(JSONB, nullable=True)  # JSON array
+    categories = db.Column(JSONB, nullable=True)  # JSON array
     
     # Advanced filters
-    exclude_keywords = db.Column(db.Text, nullable=True)  # JSON array
-    company_blacklist = db.Column(db.Text, nullable=True)  # JSON array
+    exclude_keywords = db.Column(JSONB, nullable=True)  # JSON array
+    company_blacklist = db.Column(JSONB, nullable=True)  # JSON array
     only_remote = db.Column(db.Boolean, default=False)
     only_featured = db.Column(db.Boolean, default=False)
     
@@ -67,69 +76,51 @@ class Subscription(db.Model):
     
     def get_employment_types_list(self):
         """Возвращает список типов занятости"""
-        try:
-            return json.loads(self.employment_types) if self.employment_types else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.employment_types)
     
     def set_employment_types_list(self, types_list):
         """Устанавливает список типов занятости"""
-        self.employment_types = json.dumps(types_list, ensure_ascii=False)
+        self.employment_types = list(types_list) if types_list else None
     
     def get_experience_levels_list(self):
         """Возвращает список уровней опыта"""
-        try:
-            return json.loads(self.experience_levels) if self.experience_levels else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.experience_levels)
     
     def set_experience_levels_list(self, levels_list):
         """Устанавливает список уровней опыта"""
-        self.experience_levels = json.dumps(levels_list, ensure_ascii=False)
+        self.experience_levels = list(levels_list) if levels_list else None
     
     def get_locations_list(self):
         """Возвращает список локаций"""
-        try:
-            return json.loads(self.locations) if self.locations else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.locations)
     
     def set_locations_list(self, locations_list):
         """Устанавливает список локаций"""
-        self.locations = json.dumps(locations_list, ensure_ascii=False)
+        self.locations = list(locations_list) if locations_list else None
     
     def get_categories_list(self):
         """Возвращает список категорий"""
-        try:
-            return json.loads(self.categories) if self.categories else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.categories)
     
     def set_categories_list(self, categories_list):
         """Устанавливает список категорий"""
-        self.categories = json.dumps(categories_list, ensure_ascii=False)
+        self.categories = list(categories_list) if categories_list else None
     
     def get_exclude_keywords_list(self):
         """Возвращает список исключаемых ключевых слов"""
-        try:
-            return json.loads(self.exclude_keywords) if self.exclude_keywords else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.exclude_keywords)
     
     def set_exclude_keywords_list(self, keywords_list):
         """Устанавливает список исключаемых ключевых слов"""
-        self.exclude_keywords = json.dumps(keywords_list, ensure_ascii=False)
+        self.exclude_keywords = list(keywords_list) if keywords_list else None
     
     def get_company_blacklist_list(self):
         """Возвращает черный список компаний"""
-        try:
-            return json.loads(self.company_blacklist) if self.company_blacklist else []
-        except json.JSONDecodeError:
-            return []
+        return as_json_list(self.company_blacklist)
     
     def set_company_blacklist_list(self, companies_list):
         """Устанавливает черный список компаний"""
-        self.company_blacklist = json.dumps(companies_list, ensure_ascii=False)
+        self.company_blacklist = list(companies_list) if companies_list else None
     
     def get_frequency_display(self):
         """Возвращает частоту уведомлений в читаемом формате"""
@@ -185,27 +176,27 @@ class Subscription(db.Model):
     def mark_notification_sent(self, jobs_count=0):
         """Отмечает, что уведомление было отправлено"""
         self.last_notification_sent = datetime.utcnow()
-        self.total_notifications_sent += 1
-        self.total_jobs_found += jobs_count
-        db.session.commit()
+        self.total_notifications_sent = db.func.coalesce(Subscription.total_notifications_sent, 0) + 1
+        self.total_jobs_found = db.func.coalesce(Subscription.total_jobs_found, 0) + jobs_count
+        unit_of_work.commit()
     
     def pause(self):
         """Приостанавливает подписку"""
         self.is_paused = True
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        unit_of_work.commit()
     
     def resume(self):
         """Возобновляет подписку"""
         self.is_paused = False
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        unit_of_work.commit()
     
     def deactivate(self):
         """Деактивирует подписку"""
         self.is_active = False
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+        unit_of_work.commit()
     
     def get_summary(self):
         """Возвращает краткое описание подписки"""
@@ -0,0 +1,283 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+
+from subscription import Subscription
+from subscription_matcher import CompiledSubscription, IndexedJob, compile_subscription, ngrams
+
+logger = logging.getLogger(__name__)
+
+# Шаг корзины зарплаты для индекса по min_salary
+SALARY_BUCKET_SIZE = 10000
+
+# Перекрытие окна инкрементальной синхронизации (на случай расхождения часов)
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Интервал полной перестройки индекса (самовосстановление после внешних изменений)
+FULL_REBUILD_INTERVAL = timedelta(hours=1)
+
+
+class SubscriptionIndex:
+    """Инвертированный индекс немедленных подписок для быстрого подбора по новой вакансии
+
+    Каждая подписка индексируется по одному, наиболее избирательному критерию
+    (ключевые слова → компания → местоположение → зарплата). По вакансии
+    собираются кандидаты, и только для них выполняется точная проверка.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[int, CompiledSubscription] = {}
+        self._postings: Dict[int, tuple] = {}  # subscription_id -> (раздел, ключ)
+
+        self._keyword_index: Dict[str, Set[int]] = defaultdict(set)
+        self._company_index: Dict[str, Set[int]] = defaultdict(set)
+        self._location_index: Dict[str, Set[int]] = defaultdict(set)
+        self._location_ids: Set[int] = set()
+        self._salary_index: Dict[int, Set[int]] = defaultdict(set)
+        self._unindexed: Set[int] = set()  # подписки без избирательных критериев
+
+        self._built_at: Optional[datetime] = None
+        self._synced_at: Optional[datetime] = None
+        self._dirty_ids: Set[int] = set()
+        self._deleted_ids: Set[int] = set()
+
+        event.listen(Subscription, 'after_insert', self._on_change)
+        event.listen(Subscription, 'after_update', self._on_change)
+        event.listen(Subscription, 'after_delete', self._on_delete)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """Отключает отслеживание изменений подписок (обработчики событий модели глобальные)"""
+        for identifier, handler in (('after_insert', self._on_change), ('after_update', self._on_change),
+                                    ('after_delete', self._on_delete)):
+            if event.contains(Subscription, identifier, handler):
+                event.remove(Subscription, identifier, handler)
+
+    @staticmethod
+    def is_eligible(subscription: Subscription) -> bool:
+        """Проверяет, должна ли подписка находиться в индексе"""
+        return (
+            subscription.frequency == 'immediate'
+            and bool(subscription.is_active)
+            and not subscription.is_paused
+        )
+
+    @staticmethod
+    def _eligible_query():
+        return Subscription.query.filter_by(
+            frequency='immediate',
+            is_active=True,
+            is_paused=False
+        )
+
+    # === ПОСТРОЕНИЕ И СИНХРОНИЗАЦИЯ ===
+
+    def rebuild(self):
+        """Полностью перестраивает индекс по таблице подписок"""
+        started_at = datetime.utcnow()
+        subscriptions = self._eligible_query().all()
+
+        with self._lock:
+            self._clear()
+            for subscription in subscriptions:
+                self._add(compile_subscription(subscription))
+            self._built_at = started_at
+            self._synced_at = started_at
+            self._dirty_ids.clear()
+            self._deleted_ids.clear()
+
+        logger.info(f"Индекс подписок перестроен: {len(subscriptions)} подписок")
+
+    def sync(self):
+        """Применяет изменения подписок, накопленные с прошлой синхронизации"""
+        now = datetime.utcnow()
+        if self._built_at is None or now - self._built_at > FULL_REBUILD_INTERVAL:
+            self.rebuild()
+            return
+
+        with self._lock:
+            dirty_ids = set(self._dirty_ids)
+            deleted_ids = set(self._deleted_ids)
+            since = self._synced_at - SYNC_OVERLAP
+            self._dirty_ids.clear()
+            self._deleted_ids.clear()
+
+        query = Subscription.query.filter(Subscription.updated_at >= since)
+        changed = {subscription.id: subscription for subscription in query.all()}
+
+        missing_ids = dirty_ids - set(changed) - deleted_ids
+        if missing_ids:
+            for subscription in Subscription.query.filter(Subscription.id.in_(missing_ids)).all():
+                changed[subscription.id] = subscription
+            deleted_ids |= missing_ids - set(changed)
+
+        with self._lock:
+            for subscription_id in deleted_ids:
+                self._remove(subscription_id)
+            for subscription in changed.values():
+                self.upsert(subscription)
+            self._synced_at = now
+
+    def upsert(self, subscription: Subscription):
+        """Добавляет или обновляет подписку в индексе"""
+        with self._lock:
+            self._remove(subscription.id)
+            if self.is_eligible(subscription):
+                self._add(compile_subscription(subscription))
+
+    def remove(self, subscription_id: int):
+        """Удаляет подписку из индекса"""
+        with self._lock:
+            self._remove(subscription_id)
+
+    def _on_change(self, mapper, connection, target):
+        if target.id is not None:
+            self._dirty_ids.add(target.id)
+
+    def _on_delete(self, mapper, connection, target):
+        if target.id is not None:
+            self._deleted_ids.add(target.id)
+
+    # === ПОИСК ===
+
+    def candidates(self, job: IndexedJob) -> Set[int]:
+        """Возвращает ID подписок-кандидатов для вакансии (без точной проверки)"""
+        with self._lock:
+            result = set(self._unindexed)
+
+            if self._keyword_index:
+                for gram in job.text_ngrams:
+                    ids = self._keyword_index.get(gram)
+                    if ids:
+                        result |= ids
+
+            if self._company_index:
+                for gram in ngrams(job.company):
+                    ids = self._company_index.get(gram)
+                    if ids:
+                        result |= ids
+
+            if job.location:
+                for gram in ngrams(job.location):
+                    ids = self._location_index.get(gram)
+                    if ids:
+                        result |= ids
+            else:
+                # Вакансия без местоположения подходит под любой фильтр по городу
+                result |= self._location_ids
+
+            if job.salary_min and self._salary_index:
+                top_bucket = job.salary_min // SALARY_BUCKET_SIZE
+                for bucket, ids in self._salary_index.items():
+                    if bucket <= top_bucket:
+                        result |= ids
+
+            return result
+
+    def match(self, job) -> List[int]:
+        """Возвращает ID немедленных подписок, которым соответствует вакансия"""
+        indexed_job = job if isinstance(job, IndexedJob) else IndexedJob(job)
+
+        with self._lock:
+            candidate_ids = self.candidates(indexed_job)
+            matched = [
+                subscription_id for subscription_id in candidate_ids
+                if self._entries[subscription_id].matches(indexed_job)
+            ]
+
+        logger.debug(f"Индекс подписок: {len(candidate_ids)} кандидатов, {len(matched)} совпадений")
+        return sorted(matched)
+
+    # === ВНУТРЕННИЕ МЕТОДЫ ===
+
+    def _clear(self):
+        self._entries.clear()
+        self._postings.clear()
+        self._keyword_index.clear()
+        self._company_index.clear()
+        self._location_index.clear()
+        self._location_ids.clear()
+        self._salary_index.clear()
+        self._unindexed.clear()
+
+    @staticmethod
+    def _least_loaded_gram(text: str, index: Dict[str, Set[int]]) -> Optional[str]:
+        """Выбирает n-грамму строки с самым коротким списком подписок"""
+        grams = ngrams(text)
+        if not grams:
+            return None
+        return min(grams, key=lambda gram: (len(index.get(gram, ())), gram))
+
+    def _add(self, entry: CompiledSubscription):
+        self._entries[entry.id] = entry
+
+        if entry.keywords:
+            gram = self._least_loaded_gram(entry.keywords, self._keyword_index)
+            if gram:
+                self._keyword_index[gram].add(entry.id)
+                self._postings[entry.id] = ('keyword', gram)
+                return
+
+        if entry.company:
+            gram = self._least_loaded_gram(entry.company, self._company_index)
+            if gram:
+                self._company_index[gram].add(entry.id)
+                self._postings[entry.id] = ('company', gram)
+                return
+
+        if entry.location:
+            gram = self._least_loaded_gram(entry.location, self._location_index)
+            if gram:
+                self._location_index[gram].add(entry.id)
+                self._location_ids.add(entry.id)
+                self._postings[entry.id] = ('location', gram)
+                return
+
+        if entry.min_salary:
+            bucket = entry.min_salary // SALARY_BUCKET_SIZE
+            self._salary_index[bucket].add(entry.id)
+            self._postings[entry.id] = ('salary', bucket)
+            return
+
+        self._unindexed.add(entry.id)
+        self._postings[entry.id] = ('unindexed', None)
+
+    def _remove(self, subscription_id: int):
+        if self._entries.pop(subscription_id, None) is None:
+            return
+
+        section, key = self._postings.pop(subscription_id)
+        if section == 'keyword':
+            self._discard(self._keyword_index, key, subscription_id)
+        elif section == 'company':
+            self._discard(self._company_index, key, subscription_id)
+        elif section == 'location':
+            self._discard(self._location_index, key, subscription_id)
+            self._location_ids.discard(subscription_id)
+        elif section == 'salary':
+            self._discard(self._salary_index, key, subscription_id)
+        else:
+            self._unindexed.discard(subscription_id)
+
+    @staticmethod
+    def _discard(index: dict, key, subscription_id: int):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(subscription_id)
+            if not ids:
+                del index[key]
+
+    def bulk_load(self, subscriptions: Iterable[Subscription]):
+        """Загружает подписки в индекс без обращения к БД (для тестов и прогрева)"""
+        with self._lock:
+            for subscription in subscriptions:
+                self.upsert(subscription)
+            self._built_at = self._built_at or datetime.utcnow()
+            self._synced_at = self._synced_at or self._built_at
@@ -0,0 +1,214 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Pattern, Set
+
+from subscription import Subscription
+
+# Максимум скомпилированных подписок в кэше
+MATCHER_CACHE_SIZE = 100000
+
+# Размер n-граммы для индекса подстрок (см. SubscriptionIndex)
+NGRAM_SIZE = 3
+
+
+def ngrams(text: str) -> Set[str]:
+    """Возвращает множество n-грамм строки"""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _lower(value) -> str:
+    """Приводит значение к строке в нижнем регистре"""
+    return str(value).lower() if value else ''
+
+
+def _lower_tuple(values: Iterable) -> tuple:
+    """Кортеж непустых значений в нижнем регистре (без повторов, порядок сохраняется)"""
+    return tuple(dict.fromkeys(_lower(value) for value in values if value))
+
+
+def _any_substring_pattern(values: tuple) -> Optional[Pattern]:
+    """Одно регулярное выражение "любая из подстрок" вместо цикла по списку"""
+    if not values:
+        return None
+    return re.compile('|'.join(re.escape(value) for value in values))
+
+
+class IndexedJob:
+    """Поля вакансии, один раз приведенные к нижнему регистру"""
+
+    __slots__ = ('title', 'description', 'company', 'location', 'salary_min', 'employment_type',
+                 'experience_level', 'category', 'is_remote', 'is_featured', '_text_ngrams')
+
+    def __init__(self, job):
+        self.title = _lower(job.title)
+        self.description = _lower(job.description)
+        self.company = _lower(job.company)
+        self.location = _lower(job.location)
+        self.salary_min = job.salary_min
+        self.employment_type = _lower(getattr(job, 'employment_type', None))
+        self.experience_level = _lower(getattr(job, 'experience_level', None))
+        self.category = _lower(getattr(job, 'category', None))
+        self.is_remote = bool(getattr(job, 'is_remote', False))
+        self.is_featured = bool(getattr(job, 'is_featured', False))
+        self._text_ngrams = None
+
+    @property
+    def text_ngrams(self) -> Set[str]:
+        """n-граммы заголовка и описания (считаются лениво)"""
+        if self._text_ngrams is None:
+            self._text_ngrams = ngrams(self.title) | ngrams(self.description)
+        return self._text_ngrams
+
+
+class CompiledSubscription:
+    """Неизменяемые критерии подписки, один раз разобранные из JSON
+
+    Строки приведены к нижнему регистру, списки фильтров - к кортежам и
+    frozenset, черный список компаний и исключающие слова - к готовым
+    регулярным выражениям.
+    """
+
+    __slots__ = ('id', 'updated_at', 'keywords', 'location', 'company', 'min_salary',
+                 'only_remote', 'only_featured', 'locations', 'company_blacklist', 'exclude_keywords',
+                 'employment_types', 'experience_levels', 'categories',
+                 '_blacklist_pattern', '_exclude_pattern')
+
+    def __init__(self, subscription: Subscription):
+        criteria = subscription.get_criteria_dict()
+        values = {
+            'id': subscription.id,
+            'updated_at': subscription.updated_at,
+            'keywords': _lower(criteria.get('keywords')) if 'keywords' in criteria else None,
+            'location': _lower(criteria.get('location')) if 'location' in criteria else None,
+            'company': _lower(criteria.get('company')) if 'company' in criteria else None,
+            'min_salary': subscription.min_salary or None,
+            'only_remote': bool(subscription.only_remote),
+            'only_featured': bool(subscription.only_featured),
+            'locations': _lower_tuple(subscription.get_locations_list()),
+            'company_blacklist': _lower_tuple(subscription.get_company_blacklist_list()),
+            'exclude_keywords': _lower_tuple(subscription.get_exclude_keywords_list()),
+            'employment_types': frozenset(_lower_tuple(subscription.get_employment_types_list())),
+            'experience_levels': frozenset(_lower_tuple(subscription.get_experience_levels_list())),
+            'categories': frozenset(_lower_tuple(subscription.get_categories_list())),
+        }
+        values['_blacklist_pattern'] = _any_substring_pattern(values['company_blacklist'])
+        values['_exclude_pattern'] = _any_substring_pattern(values['exclude_keywords'])
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledSubscription неизменяем")
+
+    def __repr__(self):
+        return f'<CompiledSubscription {self.id}>'
+
+    def matches(self, job: IndexedJob) -> bool:
+        """Точная проверка вакансии, подготовленной через IndexedJob
+
+        Ключевые слова здесь (немедленные уведомления) ищутся как подстрока
+        названия или описания без учета регистра. Ежедневная и еженедельная
+        сводки ищут их в БД через job_search.text_filter: полнотекстово, со
+        стеммингом (russian и english), по названию, компании и описанию,
+        плюс подстрокой в названии и компании. Поэтому "разработчики"
+        совпадет с "Python-разработчик" только в сводке, а "sql" с
+        "PostgreSQL" в описании - только в немедленном уведомлении.
+        Стемминг в Python повторить нельзя (нужен словарь PostgreSQL), а
+        индекс подписок отбирает кандидатов по n-граммам подстроки.
+        """
+        if self.keywords is not None:
+            if self.keywords not in job.title and self.keywords not in job.description:
+                return False
+
+        if self.location is not None:
+            if job.location and self.location not in job.location:
+                return False
+
+        if self.company is not None:
+            if self.company not in job.company:
+                return False
+
+        if self.min_salary:
+            if not job.salary_min or job.salary_min < self.min_salary:
+                return False
+
+        if self.only_remote and not job.is_remote:
+            return False
+
+        if self.only_featured and not job.is_featured:
+            return False
+
+        if self.locations and job.location:
+            if not any(location in job.location for location in self.locations):
+                return False
+
+        if self.employment_types and job.employment_type not in self.employment_types:
+            return False
+
+        if self.experience_levels and job.experience_level not in self.experience_levels:
+            return False
+
+        if self.categories and job.category not in self.categories:
+            return False
+
+        if self._blacklist_pattern is not None and self._blacklist_pattern.search(job.company):
+            return False
+
+        if self._exclude_pattern is not None:
+            if self._exclude_pattern.search(job.title) or self._exclude_pattern.search(job.description):
+                return False
+
+        return True
+
+
+class MatcherCache:
+    """Кэш скомпилированных подписок по ключу (id, updated_at)
+
+    Подписка разбирается заново только после изменения (updated_at
+    обновляется при каждом сохранении). Несохраненные подписки не кэшируются.
+    """
+
+    def __init__(self, max_size: int = MATCHER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # id -> CompiledSubscription
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subscription: Subscription) -> CompiledSubscription:
+        """Возвращает скомпилированную подписку, разбирая ее только при изменении"""
+        cacheable = subscription.id is not None and subscription.updated_at is not None
+        if cacheable:
+            with self._lock:
+                compiled = self._entries.get(subscription.id)
+                if compiled is not None and compiled.updated_at == subscription.updated_at:
+                    self._entries.move_to_end(subscription.id)
+                    self.hits += 1
+                    return compiled
+
+        compiled = CompiledSubscription(subscription)
+        with self._lock:
+            self.misses += 1
+            if cacheable:
+                self._entries[subscription.id] = compiled
+                self._entries.move_to_end(subscription.id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return compiled
+
+    def discard(self, subscription_id: int):
+        """Удаляет подписку из кэша"""
+        with self._lock:
+            self._entries.pop(subscription_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+matcher_cache = MatcherCache()
+
+
+def compile_subscription(subscription: Subscription) -> CompiledSubscription:
+    """Возвращает скомпилированные критерии подписки (из кэша, если подписка не менялась)"""
+    return matcher_cache.get(subscription)
@@ -1,12 +1,16 @@
 import os
 import json
+import atexit
+import hashlib
+import hmac
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
 import telebot
 from telebot import types
-from flask import Flask, request
+from flask import Flask, has_app_context, request
+from sqlalchemy import func
 
 # Импорты моделей (убираем импорты из main)
 from user import User, db
@@ -14,6 +18,16 @@ from job import Job
 from application import Application
 from subscription import Subscription
 from scheduler import NotificationScheduler
+from pagination import CachedCount, keyset_paginate
+from stats_service import employer_statistics, stats_cache
+from user_activity import ActivityTracker, JobViewCounter, UserCache, UserCacheMiddleware
+from update_processor import PooledTeleBot, UpdateProcessor
+from state_store import create_state_store
+from events import JOB_CREATED, create_event_bus
+from job_cache import job_cards
+import rendering
+from db_pool import DB_PGBOUNCER, release_read_transaction
+import read_replica
 
 # Импортируем logger из core, чтобы использовать единый логгер
 from core import logger
@@ -22,14 +36,34 @@ class TelegramHRBot:
     """Основной класс Telegram HR Bot с полным функционалом"""
     
     def __init__(self, token: str, flask_app: Flask, db):
-        self.bot = telebot.TeleBot(token)
+        self.bot = PooledTeleBot(token, use_class_middlewares=True)
         self.db = db
         self.app = flask_app
-        self.user_states = {}  # Хранение состояний пользователей
+        
+        # Update обрабатываются пулом воркеров: по порядку внутри чата, параллельно между чатами
+        self.update_processor = UpdateProcessor(self.bot, flask_app)
+        self.state_store = create_state_store()  # Хранение состояний пользователей (Redis или память)
         self.logger = logger  # Добавляем logger как атрибут класса
         
+        # Пользователь читается из БД не более одного раза за update, а last_activity пишется в фоне пачками
+        self.user_cache = UserCache()
+        self.activity_tracker = ActivityTracker(flask_app, db)
+        # Просмотры вакансий тоже копятся в памяти: открытие карточки не пишет в БД
+        self.job_views = JobViewCounter(flask_app, db)
+        self.bot.setup_middleware(UserCacheMiddleware(self.user_cache))
+        
+        # За PgBouncer транзакция только с чтением завершается до запроса к Telegram API,
+        # чтобы серверное соединение не простаивало на время сетевого вызова
+        if DB_PGBOUNCER:
+            self.bot.before_request = self._release_read_transaction
+        
         # УДАЛЕНО: Инициализация БД (create_engine, sessionmaker) - теперь db передается извне
         
+        # События (job_created и др.) обрабатываются в фоне, не задерживая ответ пользователю
+        self.event_bus = create_event_bus(flask_app, db)
+        # Сброс кэша карточек вакансий передается другим экземплярам через шину
+        job_cards.attach(self.event_bus)
+        
         # ДОБАВЛЕНО: Инициализация планировщика уведомлений
         self.scheduler = NotificationScheduler(self)
         
@@ -39,16 +73,33 @@ class TelegramHRBot:
         self.JOBS_PER_PAGE = 5
         self.APPLICATIONS_PER_PAGE = 5
         
+        # Приблизительное число активных вакансий (пересчитывается раз в минуту, а не на каждой странице)
+        self.active_jobs_count = CachedCount(self.count_active_jobs, ttl=60)
+        
         self.logger.info("TelegramHRBot инициализирован")
    
     def run(self, drop_pending_updates: bool = False):
         """Запускает бота в режиме бесконечного опроса."""
         self.logger.info("Bot is starting polling...")
-        # infinity_polling - это стандартный метод для непрерывной работы бота
-        self.bot.infinity_polling(skip_pending=drop_pending_updates)  
+        self.update_processor.start()
+        try:
+            # infinity_polling - это стандартный метод для непрерывной работы бота
+            self.bot.infinity_polling(skip_pending=drop_pending_updates)
+        finally:
+            self.update_processor.stop(timeout=30)
+
+    def _release_read_transaction(self):
+        """Освобождает соединение с БД перед запросом к Telegram API"""
+        if has_app_context():
+            release_read_transaction(self.db.session())
 
     def get_or_create_user(self, telegram_user):
         """Получает или создает пользователя, возвращает telegram_id"""
+        # Пользователь уже известен (в этом update или по кэшу ролей) - без запроса к БД
+        if self.user_cache.get(telegram_user.id) is not None or self.user_cache.get_role(telegram_user.id) is not None:
+            self.activity_tracker.touch(telegram_user.id)
+            return telegram_user.id
+        
         with self.app.app_context():
             user = self.db.session.query(User).filter_by(telegram_id=telegram_user.id).first()
             if not user:
@@ -64,15 +115,23 @@ class TelegramHRBot:
                 self.db.session.commit()
                 self.logger.info(f"Создан новый пользователь: {user.telegram_id}")
             else:
-                user.last_activity = datetime.utcnow()
-                self.db.session.commit()
+                # Время активности записывается в БД в фоне (ActivityTracker)
+                self.user_cache.put(user)
+                self.activity_tracker.touch(user.telegram_id)
             
             return telegram_user.id
 
     def get_user(self, telegram_id):
         """Получает пользователя по telegram_id в текущем контексте"""
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            return user
+        
         with self.app.app_context():
-            return self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
+            if user:
+                self.user_cache.put(user)
+            return user
 
     def handle_role_selection(self, call, role=None):
         """Обработка выбора роли пользователя"""
@@ -88,6 +147,7 @@ class TelegramHRBot:
                     # Обновляем роль
                     user.user_type = role
                     self.db.session.commit()
+                    self.user_cache.forget(telegram_id)
                     
                     # Проверяем, что роль сохранилась
                     self.db.session.refresh(user)
@@ -139,45 +199,33 @@ class TelegramHRBot:
         try:
             telegram_id = call.from_user.id
             
-            with self.app.app_context():
-                job = self.db.session.query(Job).get(job_id)
-                if not job:
-                    self.bot.answer_callback_query(call.id, "Вакансия не найдена")
-                    return
-                
-                user = self.get_user(telegram_id)
-                
-                text = f"💼 <b>{job.title}</b>\n\n"
-                text += f"🏢 <b>Компания:</b> {job.company}\n"
-                text += f"📍 <b>Местоположение:</b> {job.location or 'Не указано'}\n"
-                
-                # Формируем зарплату
-                if job.salary_min and job.salary_max:
-                    text += f"💰 <b>Зарплата:</b> {job.salary_min:,} - {job.salary_max:,} руб.\n"
-                elif job.salary_min:
-                    text += f"💰 <b>Зарплата:</b> от {job.salary_min:,} руб.\n"
-                elif job.salary_max:
-                    text += f"💰 <b>Зарплата:</b> до {job.salary_max:,} руб.\n"
-                else:
-                    text += f"💰 <b>Зарплата:</b> По договоренности\n"
+            with self.app.app_context(), read_replica.reads(self.db.session):
+                # Карточка (с числом откликов) из кэша; сбрасывается при изменении вакансии и новом отклике
+                text = job_cards.get('details', job_id)
+                if text is None:
+                    job = self.db.session.query(Job).get(job_id)
+                    if not job:
+                        self.bot.answer_callback_query(call.id, "Вакансия не найдена")
+                        return
+                    applications_count = self.db.session.query(Application).filter_by(job_id=job.id).count()
+                    text = rendering.render_job_details(job, applications_count)
+                    job_cards.put('details', job.id, job.updated_at, text)
                 
-                text += f"📅 <b>Опубликовано:</b> {job.created_at.strftime('%d.%m.%Y')}\n"
-                
-                # Считаем отклики
-                applications_count = self.db.session.query(Application).filter_by(job_id=job_id).count()
-                text += f"📨 <b>Откликов:</b> {applications_count}\n\n"
-                text += f"📝 <b>Описание:</b>\n{job.description}"
+                # Роль из кэша ролей: на популярной вакансии повторный показ не обращается к БД
+                role = self.user_cache.get_role(telegram_id)
+                if role is None:
+                    user = self.get_user(telegram_id)
+                    role = (user.id, user.user_type) if user else (None, None)
+                user_id, user_type = role
                 
                 markup = types.InlineKeyboardMarkup(row_width=2)
                 
-                if user and user.user_type == 'jobseeker':
-                    # Проверяем, не откликался ли уже пользователь
-                    existing_app = self.db.session.query(Application).filter_by(
-                        job_id=job_id,
-                        applicant_id=user.id
-                    ).first()
-                    
-                    if not existing_app:
+                if user_type == 'jobseeker':
+                    # Свой отклик - точечная проверка по индексу applicant_id, а не список всех откликнувшихся
+                    applied = self.db.session.query(
+                        self.db.session.query(Application).filter_by(job_id=job_id, applicant_id=user_id).exists()
+                    ).scalar()
+                    if not applied:
                         markup.add(
                             types.InlineKeyboardButton("📨 Откликнуться", callback_data=f"apply_job_{job_id}")
                         )
@@ -199,6 +247,8 @@ class TelegramHRBot:
                     reply_markup=markup
                 )
                 
+                self.job_views.add(job_id)
+                
         except Exception as e:
             self.logger.error(f"Ошибка в show_job_details: {e}")
     
@@ -233,12 +283,14 @@ class TelegramHRBot:
                 application = Application(
                     job_id=job_id,
                     applicant_id=user.id,
+                    employer_id=job.employer_id,
                     cover_letter="Отклик через Telegram бота",
                     status='pending',
                     created_at=datetime.utcnow()
                 )
                 self.db.session.add(application)
-                self.db.session.commit()
+                job.increment_applications()  # отклик и счетчик фиксируются одним commit
+                stats_cache.invalidate(job.employer_id)
                 
                 text = f"✅ <b>Отклик отправлен!</b>\n\n"
                 text += f"Вы откликнулись на вакансию:\n"
@@ -279,23 +331,7 @@ class TelegramHRBot:
                     self.bot.answer_callback_query(call.id, "Данные не найдены")
                     return
                 
-                status_names = {
-                    'pending': '⏳ Ожидает рассмотрения',
-                    'accepted': '✅ Принят',
-                    'rejected': '❌ Отклонен'
-                }
-                
-                text = f"📨 <b>Детали отклика</b>\n\n"
-                text += f"💼 <b>Вакансия:</b> {job.title}\n"
-                text += f"🏢 <b>Компания:</b> {job.company}\n\n"
-                text += f"👤 <b>Соискатель:</b> {applicant.get_full_name()}\n"
-                if applicant.username:
-                    text += f"📱 <b>Username:</b> @{applicant.username}\n"
-                text += f"📅 <b>Дата отклика:</b> {application.created_at.strftime('%d.%m.%Y %H:%M')}\n"
-                text += f"📊 <b>Статус:</b> {status_names.get(application.status, application.status)}\n\n"
-                
-                if application.cover_letter:
-                    text += f"📝 <b>Сопроводительное письмо:</b>\n{application.cover_letter}"
+                text = rendering.render_application_details(application, job, applicant)
                 
                 markup = types.InlineKeyboardMarkup(row_width=2)
                 
@@ -332,6 +368,7 @@ class TelegramHRBot:
                 
                 application.status = 'accepted'
                 self.db.session.commit()
+                stats_cache.invalidate(application.job.employer_id)
                 
                 self.bot.answer_callback_query(call.id, "✅ Отклик принят!")
                 self.view_application_details(call, application_id)
@@ -350,6 +387,7 @@ class TelegramHRBot:
                 
                 application.status = 'rejected'
                 self.db.session.commit()
+                stats_cache.invalidate(application.job.employer_id)
                 
                 self.bot.answer_callback_query(call.id, "❌ Отклик отклонен")
                 self.view_application_details(call, application_id)
@@ -496,8 +534,7 @@ class TelegramHRBot:
         telegram_id = self.get_or_create_user(message.from_user)
         
         with self.app.app_context():
-            # Получаем пользователя заново из базы
-            user = self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = self.get_user(telegram_id)
             
             print(f"DEBUG: Команда - Пользователь {telegram_id}, роль: {user.user_type}")
             
@@ -552,7 +589,7 @@ class TelegramHRBot:
         telegram_id = call.from_user.id
         
         with self.app.app_context():
-            user = self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = self.get_user(telegram_id)
             
             print(f"DEBUG: Callback - Пользователь {telegram_id}, роль: {user.user_type}")
             
@@ -655,11 +692,11 @@ class TelegramHRBot:
                 return
             
             # Устанавливаем состояние пользователя
-            self.user_states[message.from_user.id] = {
+            self.state_store.set(message.from_user.id, {
                 'action': 'creating_job',
                 'step': 'title',
                 'job_data': {}
-            }
+            })
             
             markup = types.InlineKeyboardMarkup()
             markup.add(types.InlineKeyboardButton("❌ Отмена", callback_data="cancel_job_creation"))
@@ -673,13 +710,25 @@ class TelegramHRBot:
                 reply_markup=markup
             )
     
-    def show_jobs_list(self, message, page=1):
-        """Показывает список вакансий"""
+    def count_active_jobs(self):
+        """Считает активные вакансии"""
         with self.app.app_context():
-            # Простой запрос всех активных вакансий
-            jobs = self.db.session.query(Job).filter_by(is_active=True).offset((page-1)*self.JOBS_PER_PAGE).limit(self.JOBS_PER_PAGE).all()
-            total_jobs = self.db.session.query(Job).filter_by(is_active=True).count()
-            total_pages = (total_jobs + self.JOBS_PER_PAGE - 1) // self.JOBS_PER_PAGE
+            return self.db.session.query(Job).filter_by(is_active=True).count()
+    
+    def show_jobs_list(self, message, page=1, cursor=None, backwards=False):
+        """Показывает список вакансий"""
+        with self.app.app_context(), read_replica.reads(self.db.session):
+            # Keyset-пагинация по (published_at, id): стоимость страницы не зависит от ее номера
+            jobs_page = keyset_paginate(
+                self.db.session.query(Job).filter(Job.is_active == True),
+                (Job.published_at, Job.id),
+                self.JOBS_PER_PAGE,
+                cursor=cursor,
+                backwards=backwards
+            )
+            jobs = jobs_page.items
+            total_jobs = self.active_jobs_count.get()
+            total_pages = max(page, (total_jobs + self.JOBS_PER_PAGE - 1) // self.JOBS_PER_PAGE)
             
             if not jobs:
                 markup = types.InlineKeyboardMarkup()
@@ -697,20 +746,7 @@ class TelegramHRBot:
             markup = types.InlineKeyboardMarkup(row_width=1)
             
             for job in jobs:
-                job_text = f"💼 <b>{job.title}</b>\n"
-                job_text += f"🏢 {job.company}\n"
-                job_text += f"📍 {job.location or 'Не указано'}\n"
-                
-                if job.salary_min and job.salary_max:
-                    job_text += f"💰 {job.salary_min:,} - {job.salary_max:,} руб.\n"
-                elif job.salary_min:
-                    job_text += f"💰 от {job.salary_min:,} руб.\n"
-                elif job.salary_max:
-                    job_text += f"💰 до {job.salary_max:,} руб.\n"
-                else:
-                    job_text += f"💰 По договоренности\n"
-                
-                text += job_text + "\n"
+                text += rendering.render_job_row(job) + "\n"
                 
                 markup.add(
                     types.InlineKeyboardButton(
@@ -721,13 +757,13 @@ class TelegramHRBot:
             
             # Навигация
             nav_buttons = []
-            if page > 1:
+            if page > 1 and jobs_page.has_prev:
                 nav_buttons.append(
-                    types.InlineKeyboardButton("⬅️ Назад", callback_data=f"jobs_page_{page-1}")
+                    types.InlineKeyboardButton("⬅️ Назад", callback_data=f"jobs_page_{page-1}_p_{jobs_page.first_cursor}")
                 )
-            if page < total_pages:
+            if jobs_page.has_next:
                 nav_buttons.append(
-                    types.InlineKeyboardButton("➡️ Далее", callback_data=f"jobs_page_{page+1}")
+                    types.InlineKeyboardButton("➡️ Далее", callback_data=f"jobs_page_{page+1}_n_{jobs_page.last_cursor}")
                 )
             
             if nav_buttons:
@@ -807,7 +843,24 @@ class TelegramHRBot:
                 reply_markup=markup
             )
 
-    def show_job_applications(self, message):
+    def count_employer_applications(self, employer_id: int) -> int:
+        """Число откликов на активные вакансии работодателя
+
+        Кэшируется в stats_cache (сбрасывается при новом отклике и по TTL),
+        а не считается COUNT(*) на каждой странице списка.
+        """
+        def compute():
+            total = (
+                self.db.session.query(func.count(Application.id))
+                .join(Job, Job.id == Application.job_id)
+                .filter(Application.employer_id == employer_id, Job.is_active == True)
+                .scalar()
+            )
+            return {'total': total}
+
+        return stats_cache.get_or_compute(('applications_total', employer_id), compute)['total']
+    
+    def show_job_applications(self, message, page=1, cursor=None, backwards=False):
         """Показывает отклики на вакансии работодателя"""
         telegram_id = self.get_or_create_user(message.from_user)
         
@@ -818,74 +871,100 @@ class TelegramHRBot:
                 self.bot.send_message(message.chat.id, "❌ Только работодатели могут просматривать отклики")
                 return
             
-            # Получаем все вакансии работодателя
-            jobs = self.db.session.query(Job).filter_by(employer_id=user.id, is_active=True).all()
-            
-            if not jobs:
-                markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu"))
-                
-                self.bot.send_message(
-                    message.chat.id,
-                    "📨 <b>Отклики на вакансии</b>\n\n😔 У вас нет активных вакансий.",
-                    parse_mode='HTML',
-                    reply_markup=markup
+            # Один запрос: отклики на активные вакансии работодателя вместе с названием
+            # вакансии и именем соискателя. Порядок (created_at, id) обслуживает индекс
+            # ix_applications_employer_created_id по копии employer_id в откликах
+            applications_query = (
+                self.db.session.query(
+                    Application.id,
+                    Application.status,
+                    Application.created_at,
+                    Job.title.label('job_title'),
+                    User.first_name,
+                    User.last_name,
+                    User.username,
+                    User.telegram_id,
                 )
-                return
-            
-            # Собираем все отклики на все вакансии
-            all_applications = []
-            for job in jobs:
-                applications = self.db.session.query(Application).filter_by(job_id=job.id).all()
-                for app_obj in applications:
-                    app_obj.job = job  # Добавляем информацию о вакансии
-                    all_applications.append(app_obj)
+                .join(Job, Job.id == Application.job_id)
+                .outerjoin(User, User.id == Application.applicant_id)
+                .filter(Application.employer_id == user.id, Job.is_active == True)
+            )
+            applications_page = keyset_paginate(
+                applications_query,
+                (Application.created_at, Application.id),
+                self.APPLICATIONS_PER_PAGE,
+                cursor=cursor,
+                backwards=backwards
+            )
             
-            if not all_applications:
+            if not applications_page.items and not cursor:
+                has_jobs = self.db.session.query(
+                    self.db.session.query(Job).filter_by(employer_id=user.id, is_active=True).exists()
+                ).scalar()
+                
                 markup = types.InlineKeyboardMarkup()
-                markup.add(
-                    types.InlineKeyboardButton("📋 Мои вакансии", callback_data="my_jobs"),
-                    types.InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
-                )
+                if has_jobs:
+                    markup.add(
+                        types.InlineKeyboardButton("📋 Мои вакансии", callback_data="my_jobs"),
+                        types.InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
+                    )
+                    text = "📨 <b>Отклики на вакансии</b>\n\n😔 Пока нет откликов на ваши вакансии."
+                else:
+                    markup.add(types.InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu"))
+                    text = "📨 <b>Отклики на вакансии</b>\n\n😔 У вас нет активных вакансий."
                 
                 self.bot.send_message(
                     message.chat.id,
-                    "📨 <b>Отклики на вакансии</b>\n\n😔 Пока нет откликов на ваши вакансии.",
+                    text,
                     parse_mode='HTML',
                     reply_markup=markup
                 )
                 return
             
-            # Сортируем по дате (новые сначала)
-            all_applications.sort(key=lambda x: x.created_at, reverse=True)
+            total_applications = self.count_employer_applications(user.id)
+            total_pages = max(page, (total_applications + self.APPLICATIONS_PER_PAGE - 1) // self.APPLICATIONS_PER_PAGE)
             
-            text = f"📨 <b>Отклики на вакансии</b> ({len(all_applications)})\n\n"
+            text = f"📨 <b>Отклики на вакансии</b> ({total_applications})\n"
+            text += f"📄 Страница {page} из {total_pages}\n\n"
             
             markup = types.InlineKeyboardMarkup(row_width=1)
             
-            for app_obj in all_applications:
-                # Получаем информацию о соискателе
-                applicant = self.db.session.query(User).get(app_obj.applicant_id)
+            for row in applications_page.items:
+                applicant_name = self.format_user_name(row.first_name, row.last_name, row.username, row.telegram_id)
                 
                 status_emoji = {
                     'pending': '⏳',
                     'accepted': '✅',
                     'rejected': '❌'
-                }.get(app_obj.status, '❓')
+                }.get(row.status, '❓')
                 
-                app_text = f"{status_emoji} <b>{app_obj.job.title}</b>\n"
-                app_text += f"👤 {applicant.get_full_name() if applicant else 'Неизвестный'}\n"
-                app_text += f"📅 {app_obj.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+                app_text = f"{status_emoji} <b>{row.job_title}</b>\n"
+                app_text += f"👤 {applicant_name}\n"
+                app_text += f"📅 {row.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
                 
                 text += app_text
                 
                 markup.add(
                     types.InlineKeyboardButton(
-                        f"{status_emoji} {applicant.get_full_name()[:20]}... → {app_obj.job.title[:15]}...",
-                        callback_data=f"view_application_{app_obj.id}"
+                        f"{status_emoji} {applicant_name[:20]}... → {row.job_title[:15]}...",
+                        callback_data=f"view_application_{row.id}"
                     )
                 )
             
+            # Навигация по страницам
+            nav_buttons = []
+            if page > 1 and applications_page.has_prev:
+                nav_buttons.append(
+                    types.InlineKeyboardButton("⬅️ Назад", callback_data=f"applications_page_{page-1}_p_{applications_page.first_cursor}")
+                )
+            if applications_page.has_next:
+                nav_buttons.append(
+                    types.InlineKeyboardButton("➡️ Далее", callback_data=f"applications_page_{page+1}_n_{applications_page.last_cursor}")
+                )
+            
+            if nav_buttons:
+                markup.row(*nav_buttons)
+            
             markup.add(
                 types.InlineKeyboardButton("📋 Мои вакансии", callback_data="my_jobs"),
                 types.InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")
@@ -898,11 +977,20 @@ class TelegramHRBot:
                 reply_markup=markup
             )
 
+    @staticmethod
+    def format_user_name(first_name, last_name, username, telegram_id):
+        """Полное имя пользователя по отдельным колонкам (как User.get_full_name)"""
+        if telegram_id is None:
+            return 'Неизвестный'
+        if first_name and last_name:
+            return f"{first_name} {last_name}"
+        return first_name or username or f"User {telegram_id}"
+
     def show_my_applications(self, message):
         """Показывает отклики пользователя"""
         telegram_id = self.get_or_create_user(message.from_user)
         
-        with self.app.app_context():
+        with self.app.app_context(), read_replica.reads(self.db.session):
             user = self.get_user(telegram_id)
             
             if user.user_type != 'jobseeker':
@@ -968,34 +1056,29 @@ class TelegramHRBot:
         """Показывает статистику работодателя"""
         telegram_id = self.get_or_create_user(message.from_user)
         
-        with self.app.app_context():
+        with self.app.app_context(), read_replica.reads(self.db.session):
             user = self.get_user(telegram_id)
             
             if user.user_type != 'employer':
                 self.bot.send_message(message.chat.id, "❌ Только работодатели могут просматривать статистику")
                 return
             
-            # Получаем статистику
-            total_jobs = self.db.session.query(Job).filter_by(employer_id=user.id, is_active=True).count()
-            total_applications = self.db.session.query(Application).join(Job).filter(Job.employer_id == user.id).count()
-            pending_applications = self.db.session.query(Application).join(Job).filter(
-                Job.employer_id == user.id, 
-                Application.status == 'pending'
-            ).count()
-            accepted_applications = self.db.session.query(Application).join(Job).filter(
-                Job.employer_id == user.id, 
-                Application.status == 'accepted'
-            ).count()
+            # Получаем статистику (один агрегирующий запрос, результат кэшируется)
+            stats = employer_statistics(user.id)
             
             text = f"📊 <b>Статистика работодателя</b>\n\n"
-            text += f"📋 <b>Активных вакансий:</b> {total_jobs}\n"
-            text += f"📨 <b>Всего откликов:</b> {total_applications}\n"
-            text += f"⏳ <b>Ожидают рассмотрения:</b> {pending_applications}\n"
-            text += f"✅ <b>Принято:</b> {accepted_applications}\n\n"
+            text += f"📋 <b>Активных вакансий:</b> {stats['active_jobs']}\n"
+            text += f"📨 <b>Всего откликов:</b> {stats['total']}\n"
+            text += f"⏳ <b>Ожидают рассмотрения:</b> {stats['pending']}\n"
+            text += f"✅ <b>Принято:</b> {stats['accepted']}\n"
+            text += f"❌ <b>Отклонено:</b> {stats['rejected']}\n\n"
             
-            if total_jobs > 0:
-                avg_applications = total_applications / total_jobs
-                text += f"📈 <b>Среднее откликов на вакансию:</b> {avg_applications:.1f}\n"
+            if stats['total'] > 0:
+                text += f"📬 <b>Доля рассмотренных:</b> {stats['response_rate']}%\n"
+                text += f"🎯 <b>Доля принятых:</b> {stats['acceptance_rate']}%\n"
+            
+            if stats['active_jobs'] > 0:
+                text += f"📈 <b>Среднее откликов на вакансию:</b> {stats['avg_applications']:.1f}\n"
             
             markup = types.InlineKeyboardMarkup()
             markup.add(
@@ -1082,20 +1165,34 @@ class TelegramHRBot:
                 job_id = int(data.split("_")[2])
                 self.start_job_application(call, job_id)
             elif data.startswith("jobs_page_"):
-                page = int(data.split("_")[2])
+                # Формат: jobs_page_<страница>_<n|p>_<курсор>; старые кнопки без курсора ведут на первую страницу
+                parts = data.split("_", 4)
+                page = int(parts[2])
+                cursor = parts[4] if len(parts) == 5 else None
+                backwards = len(parts) == 5 and parts[3] == 'p'
                 fake_message = type('obj', (object,), {
                     'chat': call.message.chat,
                     'from_user': call.from_user
                 })
-                self.show_jobs_list(fake_message, page)
+                self.show_jobs_list(fake_message, page if cursor else 1, cursor=cursor, backwards=backwards)
+            elif data.startswith("applications_page_"):
+                # Формат: applications_page_<страница>_<n|p>_<курсор>
+                parts = data.split("_", 4)
+                page = int(parts[2])
+                cursor = parts[4] if len(parts) == 5 else None
+                backwards = len(parts) == 5 and parts[3] == 'p'
+                fake_message = type('obj', (object,), {
+                    'chat': call.message.chat,
+                    'from_user': call.from_user
+                })
+                self.show_job_applications(fake_message, page if cursor else 1, cursor=cursor, backwards=backwards)
             elif data == "already_applied":
                 self.bot.answer_callback_query(call.id, "Вы уже откликнулись на эту вакансию")
             elif data == "about_bot":
                 self.show_about_bot(call)
             elif data == "cancel_job_creation":
                 # Сбрасываем состояние пользователя
-                if call.from_user.id in self.user_states:
-                    del self.user_states[call.from_user.id]
+                self.state_store.delete(call.from_user.id)
                 self.bot.edit_message_text(
                     text="❌ Создание вакансии отменено",
                     chat_id=call.message.chat.id,
@@ -1117,11 +1214,11 @@ class TelegramHRBot:
         """Подтверждает создание вакансии"""
         try:
             user_id = call.from_user.id
-            if user_id not in self.user_states:
+            state = self.state_store.get(user_id)
+            if state is None:
                 self.bot.answer_callback_query(call.id, "Сессия истекла, начните заново")
                 return
             
-            state = self.user_states[user_id]
             job_data = state.get('job_data', {})
             
             with self.app.app_context():
@@ -1138,7 +1235,7 @@ class TelegramHRBot:
                     employer_id=user.id,
                     employment_type='full-time',
                     experience_level='middle',
-                    skills_required='',
+                    skills_required=None,
                     is_active=True,
                     created_at=datetime.utcnow()
                 )
@@ -1146,8 +1243,12 @@ class TelegramHRBot:
                 self.db.session.add(job)
                 self.db.session.commit()
                 
+                # Подписчики уведомляются фоновым обработчиком события; NOTIFY выполняется
+                # в потоке шины, и ответ пользователю его не ждет
+                self.event_bus.publish_later(JOB_CREATED, {'job_id': job.id})
+                
                 # Сбрасываем состояние
-                del self.user_states[user_id]
+                self.state_store.delete(user_id)
                 
                 text = f"✅ <b>Вакансия создана успешно!</b>\n\n"
                 text += f"💼 <b>{job.title}</b>\n"
@@ -1197,12 +1298,12 @@ class TelegramHRBot:
         """Обработчик пользовательского ввода"""
         user_id = message.from_user.id
         
-        if user_id not in self.user_states:
+        state = self.state_store.get(user_id)
+        if state is None:
             # Если нет активного состояния, показываем меню
             self.show_main_menu(message)
             return
         
-        state = self.user_states[user_id]
         action = state.get('action')
         
         if action == 'creating_job':
@@ -1213,7 +1314,7 @@ class TelegramHRBot:
             self.handle_subscription_input(message, state)
         else:
             # Неизвестное состояние, сбрасываем
-            del self.user_states[user_id]
+            self.state_store.delete(user_id)
             self.show_main_menu(message)
     
     def handle_job_creation_input(self, message, state):
@@ -1264,6 +1365,9 @@ class TelegramHRBot:
             job_data['description'] = message.text
             state['step'] = 'confirm'
             self.show_job_confirmation(message, job_data)
+        
+        # Состояние из хранилища - копия, изменения нужно сохранить
+        self.state_store.set(message.from_user.id, state)
     
     def parse_salary(self, salary_text: str, job_data: dict):
         """Парсит зарплату из текста"""
@@ -1299,24 +1403,7 @@ class TelegramHRBot:
     
     def show_job_confirmation(self, message, job_data):
         """Показывает подтверждение создания вакансии"""
-        text = "📋 <b>Подтверждение создания вакансии</b>\n\n"
-        text += f"💼 <b>Название:</b> {job_data['title']}\n"
-        text += f"🏢 <b>Компания:</b> {job_data['company']}\n"
-        text += f"📍 <b>Местоположение:</b> {job_data['location']}\n"
-        
-        if 'salary_min' in job_data or 'salary_max' in job_data:
-            salary_min = job_data.get('salary_min', 0)
-            salary_max = job_data.get('salary_max', 0)
-            if salary_min and salary_max:
-                text += f"💰 <b>Зарплата:</b> {salary_min:,} - {salary_max:,} руб.\n"
-            elif salary_min:
-                text += f"💰 <b>Зарплата:</b> от {salary_min:,} руб.\n"
-            elif salary_max:
-                text += f"💰 <b>Зарплата:</b> до {salary_max:,} руб.\n"
-        else:
-            text += f"💰 <b>Зарплата:</b> По договоренности\n"
-        
-        text += f"\n📝 <b>Описание:</b>\n{job_data['description'][:200]}..."
+        text = rendering.render_job_confirmation(job_data)
         
         markup = types.InlineKeyboardMarkup(row_width=2)
         markup.add(
@@ -1339,6 +1426,7 @@ class TelegramHRBot:
             user = self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
             user.user_type = 'employer'
             self.db.session.commit()
+            self.user_cache.forget(telegram_id)
         
         self.bot.send_message(
             message.chat.id,
@@ -1358,6 +1446,7 @@ class TelegramHRBot:
             user = self.db.session.query(User).filter_by(telegram_id=telegram_id).first()
             user.user_type = 'jobseeker'
             self.db.session.commit()
+            self.user_cache.forget(telegram_id)
         
         self.bot.send_message(
             message.chat.id,
@@ -1403,6 +1492,15 @@ class TelegramHRBot:
         self.bot.send_message(message.chat.id, "🔧 Функция в разработке")
     
     def show_user_stats(self, message):
+        telegram_id = self.get_or_create_user(message.from_user)
+        
+        with self.app.app_context():
+            user = self.get_user(telegram_id)
+            is_employer = user is not None and user.user_type == 'employer'
+        
+        if is_employer:
+            self.show_employer_stats(message)
+            return
         self.bot.send_message(message.chat.id, "🔧 Функция в разработке")
     
     def handle_job_search_input(self, message, state):
@@ -1416,12 +1514,74 @@ class TelegramHRBot:
         self.logger.info("Запуск Telegram-бота в режиме polling...")
         self.bot.polling(none_stop=True)
     
-    def handle_webhook(self):
-        """Обработчик webhook"""
-        if request.headers.get('content-type') == 'application/json':
-            json_string = request.get_data().decode('utf-8')
-            update = telebot.types.Update.de_json(json_string)
-            self.bot.process_new_updates([update])
-            return "OK"
+    def get_webhook_secret(self) -> str:
+        """
+        Секрет webhook (заголовок X-Telegram-Bot-Api-Secret-Token)
+        
+        Берется из TELEGRAM_WEBHOOK_SECRET, иначе выводится из токена бота,
+        чтобы все реплики приложения проверяли одно и то же значение.
+        """
+        secret = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+        if secret:
+            return secret
+        return hashlib.sha256(f"webhook:{self.bot.token}".encode('utf-8')).hexdigest()
+    
+    def run_webhook(self, webhook_url: str, drop_pending_updates: bool = False):
+        """Регистрирует webhook в Telegram и запускает обработку update в фоне
+        
+        Webhook общий для всех реплик: если он уже указывает на webhook_url,
+        повторная регистрация пропускается, чтобы перезапуск одной реплики не
+        сбрасывал очередь update остальных (смена секрета требует ручного
+        setWebhook или TELEGRAM_WEBHOOK_FORCE_SET=true).
+        """
+        self.webhook_secret = self.get_webhook_secret()
+        self.update_processor.start()
+        max_connections = int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', 40))
+        force = os.getenv('TELEGRAM_WEBHOOK_FORCE_SET', 'false').lower() == 'true'
+        
+        info = self.bot.get_webhook_info()
+        if not force and info.url == webhook_url and info.max_connections == max_connections:
+            self.logger.info(f"Webhook уже зарегистрирован: {webhook_url}")
         else:
+            self.bot.set_webhook(
+                url=webhook_url,
+                secret_token=self.webhook_secret,
+                max_connections=max_connections,
+                drop_pending_updates=drop_pending_updates
+            )
+            self.logger.info(f"Webhook зарегистрирован: {webhook_url}")
+        
+        # При нескольких репликах webhook снимать нельзя: его снимает только явно настроенный экземпляр
+        remove_webhook = os.getenv('TELEGRAM_WEBHOOK_REMOVE_ON_EXIT', 'false').lower() == 'true'
+        atexit.register(self.stop_webhook, remove_webhook)
+    
+    def stop_webhook(self, remove_webhook: bool = False):
+        """Дожидается обработки принятых update и при необходимости снимает webhook"""
+        if remove_webhook:
+            try:
+                self.bot.remove_webhook()
+                self.logger.info("Webhook снят")
+            except Exception as e:
+                self.logger.error(f"Ошибка при снятии webhook: {e}")
+        self.update_processor.stop(timeout=30)
+    
+    def handle_webhook(self):
+        """Обработчик webhook: принимает update и сразу отвечает, обработка идет в фоне"""
+        secret = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        expected = getattr(self, 'webhook_secret', None) or self.get_webhook_secret()
+        if not hmac.compare_digest(secret, expected):
+            return "Forbidden", 403
+        
+        if request.mimetype != 'application/json':
             return "Bad Request", 400
+        
+        try:
+            update = telebot.types.Update.de_json(request.get_data().decode('utf-8'))
+        except Exception as e:
+            self.logger.warning(f"Некорректный update в webhook: {e}")
+            return "Bad Request", 400
+        
+        # Очередь переполнена - Telegram повторит доставку позже
+        if not self.update_processor.submit(update, block=False):
+            return "Service Unavailable", 503
+        return "OK"
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Тесты пакетной очистки
+"""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import Boolean, Column, Integer, MetaData, Table, create_engine, event, func, select, update
+from sqlalchemy.orm import Session
+
+import cleanup
+from cleanup import _run_chunked
+
+
+class TestRunChunked(unittest.TestCase):
+    """Тестирование _run_chunked (sqlite: FOR UPDATE SKIP LOCKED не выводится)"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        self.items = Table('items', MetaData(),
+                           Column('id', Integer, primary_key=True),
+                           Column('is_active', Boolean, nullable=False))
+        self.items.create(self.engine)
+        self.session = Session(self.engine)
+        patcher = mock.patch.object(cleanup, 'db', SimpleNamespace(session=self.session))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.statements = []
+        self.commits = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        event.listen(self.session, 'after_commit', self._on_commit)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _on_execute(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _on_commit(self, session):
+        self.commits += 1
+
+    def add_items(self, active: int, inactive: int = 0):
+        with self.engine.begin() as connection:
+            connection.execute(self.items.insert(), [{'is_active': True}] * active + [{'is_active': False}] * inactive)
+        self.statements.clear()
+
+    def deactivate(self, dry_run=False, chunk_size=10):
+        table = self.items
+        return _run_chunked(
+            'тест', table.c.id, table.c.is_active == True,
+            lambda ids: update(table).where(table.c.id.in_(ids)).values(is_active=False),
+            dry_run, chunk_size
+        )
+
+    def active_count(self):
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).where(self.items.c.is_active == True)).scalar()
+
+    def test_chunks_until_short_chunk(self):
+        """Пачки идут до первой неполной, каждая фиксируется отдельно"""
+        self.add_items(active=25, inactive=5)
+        self.assertEqual(self.deactivate(), 25)
+        self.assertEqual(self.commits, 3)
+        self.assertEqual(self.active_count(), 0)
+
+    def test_exact_multiple_ends_with_empty_chunk(self):
+        """При числе строк, кратном пачке, цикл завершается пустой пачкой"""
+        self.add_items(active=20)
+        self.assertEqual(self.deactivate(), 20)
+        self.assertEqual(self.commits, 3)
+
+    def test_nothing_to_do(self):
+        """Без подходящих строк - один запрос"""
+        self.add_items(active=0, inactive=3)
+        self.assertEqual(self.deactivate(), 0)
+        self.assertEqual((self.commits, len(self.statements)), (1, 1))
+
+    def test_dry_run_counts_without_changes(self):
+        """Проверка считает строки одним запросом, ничего не меняет и сразу завершается"""
+        self.add_items(active=25, inactive=5)
+        self.assertEqual(self.deactivate(dry_run=True), 25)
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].lstrip().upper().startswith('SELECT'))
+        self.assertEqual(self.commits, 0)
+        self.assertFalse(self.session.in_transaction())
+        self.assertEqual(self.active_count(), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
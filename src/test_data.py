@@ -38,7 +38,7 @@ with app.app_context():
         salary_max=150000,
         employment_type='full-time',
         experience_level='middle',
-        skills_required='Python, Flask, PostgreSQL',
+        skills_required=['Python', 'Flask', 'PostgreSQL'],
         employer_id=employer.id,  # ИСПОЛЬЗУЕМ РЕАЛЬНЫЙ ID!
         is_active=True
     )
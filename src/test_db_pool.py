@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Тесты метрик пула соединений БД
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import create_engine, exc, text
+
+from db_pool import InstrumentedQueuePool, pool_stats
+
+
+class TestInstrumentedQueuePool(unittest.TestCase):
+    """Тестирование счетчиков выдачи соединений"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=InstrumentedQueuePool,
+                                    pool_size=1, max_overflow=0, pool_timeout=0.05)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_checkouts_and_gauges(self):
+        """Выдачи считаются, занятые соединения видны в метриках"""
+        with self.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            stats = pool_stats(self.engine)
+            self.assertEqual(stats['checked_out'], 1)
+        stats = pool_stats(self.engine)
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(stats['size'], 1)
+
+    def test_timeout_is_counted(self):
+        """Исчерпание пула учитывается как таймаут"""
+        with self.engine.connect():
+            with self.assertRaises(exc.TimeoutError):
+                self.engine.connect()
+        stats = pool_stats(self.engine)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['checkouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Тесты очереди доставки уведомлений
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from telebot.apihelper import ApiTelegramException
+
+from delivery import NotificationDelivery, TokenBucket
+
+
+def telegram_error(code, retry_after=None):
+    """Создает исключение Telegram API с указанным кодом"""
+    result_json = {'ok': False, 'error_code': code, 'description': f'error {code}'}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class FakeBot:
+    """Заглушка TeleBot: запоминает отправленные сообщения и выдает заданные ошибки"""
+
+    def __init__(self, errors=None):
+        self.errors = dict(errors or {})
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.lock:
+            queue = self.errors.get(chat_id)
+            if queue:
+                raise queue.pop(0)
+            self.sent.append((chat_id, text, time.monotonic()))
+
+
+class TestNotificationDelivery(unittest.TestCase):
+    """Тестирование доставки с лимитами и повторами"""
+
+    def setUp(self):
+        self.bot = FakeBot()
+        self.delivery = NotificationDelivery(self.bot, workers=4, global_rate=1000, chat_interval=0.05, max_retries=2)
+
+    def tearDown(self):
+        self.delivery.stop(5)
+
+    def test_delivers_all_messages(self):
+        """Все сообщения доставляются, статистика считается"""
+        for chat_id in range(50):
+            self.delivery.enqueue(chat_id, f'msg {chat_id}', parse_mode='HTML')
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual(len(self.bot.sent), 50)
+        self.assertEqual(self.delivery.get_stats()['sent'], 50)
+
+    def test_per_chat_interval_and_order(self):
+        """Сообщения в один чат идут по порядку и не чаще интервала"""
+        for i in range(4):
+            self.delivery.enqueue(1, str(i))
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual([text for _, text, _ in self.bot.sent], ['0', '1', '2', '3'])
+        times = [sent_at for _, _, sent_at in self.bot.sent]
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreaterEqual(later - earlier, 0.04)
+
+    def test_retry_after_is_honoured(self):
+        """Ответ 429 откладывает повтор на retry_after секунд"""
+        self.bot.errors = {7: [telegram_error(429, retry_after=0.3)]}
+        started_at = time.monotonic()
+        self.delivery.enqueue(7, 'hello')
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual(len(self.bot.sent), 1)
+        self.assertGreaterEqual(self.bot.sent[0][2] - started_at, 0.3)
+        self.assertEqual(self.delivery.get_stats()['rate_limited'], 1)
+
+    def test_rate_limited_retries_are_capped(self):
+        """Сообщение, которое получает только 429, не повторяется бесконечно"""
+        self.bot.errors = {7: [telegram_error(429, retry_after=0.01) for _ in range(10)]}
+        self.delivery.max_rate_limited = 3
+        results = []
+        self.delivery.enqueue(7, 'hello', callback=lambda message, ok: results.append(ok))
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual(results, [False])
+        self.assertEqual(self.delivery.get_stats()['rate_limited'], 4)
+
+    def test_permanent_error_and_callback(self):
+        """Ошибка 403 не повторяется, callback получает результат"""
+        self.bot.errors = {5: [telegram_error(403)]}
+        results = []
+        self.delivery.enqueue(5, 'blocked', callback=lambda message, ok: results.append(ok))
+        self.delivery.enqueue(6, 'ok', callback=lambda message, ok: results.append(ok))
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual(sorted(results), [False, True])
+        self.assertEqual(self.delivery.get_stats()['failed'], 1)
+
+    def test_unexpected_error_finishes_message(self):
+        """Непредвиденная ошибка не теряет сообщение: оно завершается с ok=False без повторов"""
+        self.bot.errors = {5: [ValueError('bad markup'), ValueError('bad markup')]}
+        results = []
+        self.delivery.enqueue(5, 'broken', callback=lambda message, ok: results.append(ok))
+        self.assertTrue(self.delivery.join(5))
+        self.assertEqual(results, [False])
+        stats = self.delivery.get_stats()
+        self.assertEqual((stats['failed'], stats['retried']), (1, 0))
+        self.assertEqual(self.delivery.pending(), 0)
+
+    def test_token_bucket_rate(self):
+        """Token bucket ограничивает скорость выдачи"""
+        bucket = TokenBucket(rate=50, capacity=1)
+        started_at = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.18)
+
+
+if __name__ == '__main__':
+    unittest.main()
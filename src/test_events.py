@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Тесты шины событий
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from events import EventBus
+
+
+class TestEventBus(unittest.TestCase):
+    """Тестирование доставки событий в памяти процесса"""
+
+    def setUp(self):
+        self.bus = EventBus()
+
+    def tearDown(self):
+        self.bus.stop()
+
+    def test_publish_returns_before_handler(self):
+        """publish() не ждет обработчика, события доставляются по порядку"""
+        release = threading.Event()
+        received = []
+        done = threading.Event()
+
+        def handler(payload):
+            release.wait(5)
+            received.append(payload['job_id'])
+            if len(received) == 3:
+                done.set()
+
+        self.bus.subscribe('job_created', handler)
+        for job_id in range(3):
+            self.assertTrue(self.bus.publish('job_created', {'job_id': job_id}))
+        self.assertEqual(received, [])
+        release.set()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(received, [0, 1, 2])
+
+    def test_handler_error_does_not_stop_bus(self):
+        """Ошибка одного обработчика не мешает остальным"""
+        done = threading.Event()
+        self.bus.subscribe('job_created', lambda payload: 1 / 0)
+        self.bus.subscribe('job_created', lambda payload: done.set())
+        self.bus.publish('job_created', {'job_id': 1})
+        self.assertTrue(done.wait(5))
+        self.bus.stop()
+        stats = self.bus.get_stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['delivered'], 1)
+
+    def test_full_queue_drops_event(self):
+        """При переполненной очереди событие отбрасывается без блокировки"""
+        self.bus.stop()
+        self.bus = EventBus(queue_size=1)
+        release = threading.Event()
+        self.bus.subscribe('job_created', lambda payload: release.wait(5))
+        results = [self.bus.publish('job_created', {'job_id': job_id}) for job_id in range(5)]
+        release.set()
+        self.assertIn(False, results)
+        self.assertGreaterEqual(self.bus.get_stats()['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша карточек вакансий
+"""
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from job_cache import JobCardCache
+
+
+class TestJobCardCache(unittest.TestCase):
+    """Тестирование кэша карточек"""
+
+    def setUp(self):
+        self.cache = JobCardCache(max_size=2, ttl=60)
+
+    def test_hit_and_updated_at_mismatch(self):
+        """Карточка отдается из кэша, пока updated_at вакансии не изменился"""
+        job = SimpleNamespace(id=1, updated_at=datetime(2024, 1, 1))
+        renders = []
+        render = lambda job: renders.append(job.id) or f'card {job.updated_at:%d.%m}'
+
+        self.assertEqual(self.cache.get_or_render('row', job, render), 'card 01.01')
+        self.assertEqual(self.cache.get_or_render('row', job, render), 'card 01.01')
+        self.assertEqual(len(renders), 1)
+
+        job.updated_at = datetime(2024, 1, 2)
+        self.assertEqual(self.cache.get_or_render('row', job, render), 'card 02.01')
+        self.assertEqual(len(renders), 2)
+
+        stats = self.cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale']), (1, 2, 1))
+        self.assertEqual(stats['hit_rate'], 0.333)
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная карточка"""
+        self.cache.put('row', 1, None, 'a')
+        self.cache.put('row', 2, None, 'b')
+        self.cache.get('row', 1)
+        self.cache.put('row', 3, None, 'c')
+
+        self.assertEqual(self.cache.get('row', 1), 'a')
+        self.assertIsNone(self.cache.get('row', 2))
+        self.assertEqual(self.cache.get_stats()['evictions'], 1)
+
+    def test_kinds_are_bounded_separately(self):
+        """Массовая отрисовка одного вида не вытесняет карточки другого"""
+        self.cache.put('details', 1, None, 'hot')
+        for job_id in range(100):
+            self.cache.put('row', job_id, None, 'row')
+
+        self.assertEqual(self.cache.get('details', 1), 'hot')
+        self.assertEqual(self.cache.get_stats()['size'], {'details': 1, 'row': 2})
+
+    def test_ttl_and_invalidate(self):
+        """Карточка устаревает по TTL и удаляется при изменении вакансии"""
+        self.cache.ttl = 0.05
+        self.cache.put('row', 1, None, 'a')
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('row', 1))
+
+        self.cache.ttl = 60
+        self.cache.put('row', 1, None, 'a')
+        self.cache.put('details', 1, None, 'b')
+        self.cache.put('row', 2, None, 'c')
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get('row', 1))
+        self.assertIsNone(self.cache.get('details', 1))
+        self.assertEqual(self.cache.get('row', 2), 'c')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Тесты выбора ведущего планировщика
+"""
+
+import os
+import sys
+import unittest
+from contextlib import contextmanager, nullcontext
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import leader_election
+from leader_election import LeaderElector
+
+
+class FakeClock:
+    """Управляемое monotonic-время"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeDatabase:
+    """Заглушка SQLAlchemy: каждый execute берет следующий результат из outcomes
+
+    Результат - holder (аренда получена), None (занята другим экземпляром) или
+    исключение (ошибка БД). query_seconds сдвигает часы на время запроса.
+    """
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.outcomes = []
+        self.statements = []
+        self.query_seconds = 0.0
+        self.engine = SimpleNamespace(begin=self._begin)
+
+    @contextmanager
+    def _begin(self):
+        yield SimpleNamespace(execute=self._execute)
+
+    def _execute(self, statement):
+        self.statements.append(statement)
+        self.clock.now += self.query_seconds
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(first=lambda: None if outcome is None else (outcome,))
+
+
+class TestLeaderElector(unittest.TestCase):
+    """Тестирование аренды ведущего"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(leader_election, 'time', SimpleNamespace(monotonic=self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = FakeDatabase(self.clock)
+        app = SimpleNamespace(app_context=nullcontext)
+        self.elector = LeaderElector(app, self.db, ttl=30)
+
+    def test_acquire_and_expiry(self):
+        """Полученная аренда действует ttl секунд от начала запроса"""
+        self.db.outcomes = [self.elector.holder]
+        self.db.query_seconds = 2
+        self.assertTrue(self.elector.try_acquire())
+        self.assertTrue(self.elector.is_leader)
+
+        self.clock.now = 1000.0 + 29.9
+        self.assertTrue(self.elector.is_leader)
+        self.clock.now = 1000.0 + 30
+        self.assertFalse(self.elector.is_leader)
+
+    def test_lease_held_by_other(self):
+        """Аренда другого экземпляра - не ведущий"""
+        self.db.outcomes = [None]
+        self.assertFalse(self.elector.try_acquire())
+        self.assertFalse(self.elector.is_leader)
+
+    def test_renew_failure_keeps_lease_until_expiry(self):
+        """Ошибка продления не снимает роль раньше срока, но и не продлевает ее"""
+        self.db.outcomes = [self.elector.holder, RuntimeError('db down')]
+        self.assertTrue(self.elector.try_acquire())
+
+        self.clock.now += 10
+        with self.assertLogs('leader_election', 'WARNING'):
+            self.assertFalse(self.elector.try_acquire())
+        self.assertTrue(self.elector.is_leader)
+
+        self.clock.now = 1000.0 + 30
+        self.assertFalse(self.elector.is_leader)
+
+    def test_failure_after_expiry(self):
+        """Ошибка продления после истечения срока - роль сразу потеряна"""
+        self.db.outcomes = [self.elector.holder, RuntimeError('db down')]
+        self.elector.try_acquire()
+        self.clock.now += 31
+        self.assertFalse(self.elector.try_acquire())
+        self.assertFalse(self.elector.is_leader)
+        self.assertEqual(self.elector._valid_until, 0.0)
+
+    def test_renewal_extends_lease(self):
+        """Успешное продление переносит срок"""
+        self.db.outcomes = [self.elector.holder, self.elector.holder]
+        self.elector.try_acquire()
+        self.clock.now += 20
+        self.assertTrue(self.elector.try_acquire())
+        self.clock.now += 20
+        self.assertTrue(self.elector.is_leader)
+
+    def test_release(self):
+        """release() сразу снимает роль и освобождает аренду в БД"""
+        self.db.outcomes = [self.elector.holder]
+        self.elector.try_acquire()
+        self.elector.release()
+        self.assertFalse(self.elector.is_leader)
+        self.assertEqual(len(self.db.statements), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
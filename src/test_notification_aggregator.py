@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Тесты объединения уведомлений по пользователям
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from notification_aggregator import batched, group_by_user
+from fixtures import make_job, make_subscription
+
+
+class TestUserDigest(unittest.TestCase):
+    """Тестирование объединения, удаления повторов и лимитов"""
+
+    def test_group_by_user_merges_and_deduplicates(self):
+        """Вакансии подписок одного пользователя объединяются без повторов"""
+        first = make_subscription(1, user_id=10)
+        second = make_subscription(2, user_id=10)
+        other = make_subscription(3, user_id=20)
+        matches = [
+            (first, 100, [make_job(1), make_job(2)]),
+            (second, 100, [make_job(2), make_job(3)]),
+            (other, 200, [make_job(1)]),
+        ]
+        digests = list(group_by_user(matches))
+        self.assertEqual([digest.telegram_id for digest in digests], [100, 200])
+        self.assertEqual(list(digests[0].jobs), [1, 2, 3])
+        self.assertEqual([subscription.id for subscription in digests[0].matched_by[2]], [1, 2])
+        self.assertEqual(digests[0].jobs_by_subscription(), {1: 2, 2: 2})
+
+    def test_limit_keeps_newest_unsent_jobs(self):
+        """limit() убирает отправленные вакансии и оставляет самые новые"""
+        digest = next(group_by_user([
+            (make_subscription(1, user_id=10, max_notifications_per_day=3), 100,
+             [make_job(1, age_hours=5), make_job(2, age_hours=1), make_job(3, age_hours=3), make_job(4, age_hours=0)]),
+            (make_subscription(2, user_id=10, max_notifications_per_day=2), 100, [make_job(4, age_hours=0)]),
+        ]))
+        self.assertEqual(digest.daily_cap, 3)
+        digest.limit({4}, remaining=2)
+        self.assertEqual(list(digest.jobs), [2, 3])
+        self.assertEqual(digest.jobs_by_subscription(), {1: 2, 2: 0})
+
+    def test_limit_with_exhausted_cap(self):
+        """При исчерпанном лимите вакансий не остается"""
+        digest = next(group_by_user([(make_subscription(1, user_id=10), 100, [make_job(1)])]))
+        digest.limit(set(), remaining=-3)
+        self.assertEqual(len(digest.jobs), 0)
+
+    def test_batched(self):
+        """Поток разбивается на пачки заданного размера"""
+        self.assertEqual([len(batch) for batch in batched(range(5), size=2)], [2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Тесты курсоров, keyset-пагинации и кэша счетчика
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from pagination import CachedCount, decode_cursor, encode_cursor, keyset_paginate
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'items'
+
+    id = Column(Integer, primary_key=True)
+    published_at = Column(DateTime, nullable=False)
+
+
+class TestCursor(unittest.TestCase):
+    """Тестирование кодирования курсора"""
+
+    def test_round_trip(self):
+        """Все поддерживаемые типы восстанавливаются без потерь"""
+        values = [None, True, False, 0, -42, 2 ** 40, datetime(2024, 5, 6, 7, 8, 9, 123456), 0.125]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+
+    def test_fits_callback_data(self):
+        """Кнопка страницы с курсором (дата, id) укладывается в 64 байта callback_data"""
+        cursor = encode_cursor([datetime(2099, 12, 31, 23, 59, 59, 999999), 2 ** 31 - 1])
+        callback_data = f"applications_page_9999_n_{cursor}"
+        self.assertLessEqual(len(callback_data.encode('utf-8')), 64)
+
+    def test_unsupported_type(self):
+        """Неподдерживаемое значение не кодируется"""
+        with self.assertRaises(ValueError):
+            encode_cursor(['text'])
+
+    def test_tampered_cursor(self):
+        """Измененный курсор отклоняется ValueError"""
+        for cursor in ('x1', 'i!!', 'd', '', 'iz~q5'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+
+
+class TestKeysetPaginate(unittest.TestCase):
+    """Тестирование keyset-пагинации"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        started_at = datetime(2024, 1, 1)
+        # Пары вакансий с одинаковой датой проверяют порядок по id
+        self.session.add_all([
+            Item(id=i, published_at=started_at + timedelta(hours=i // 2)) for i in range(1, 12)
+        ])
+        self.session.commit()
+        self.columns = (Item.published_at, Item.id)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def paginate(self, cursor=None, backwards=False):
+        return keyset_paginate(self.session.query(Item), self.columns, 4, cursor=cursor, backwards=backwards)
+
+    def test_forward_and_back(self):
+        """Проход вперед по всем страницам и возврат на предыдущую"""
+        pages = [self.paginate()]
+        while pages[-1].has_next:
+            pages.append(self.paginate(pages[-1].last_cursor))
+
+        self.assertEqual([[item.id for item in page] for page in pages],
+                         [[11, 10, 9, 8], [7, 6, 5, 4], [3, 2, 1]])
+        self.assertFalse(pages[0].has_prev)
+        self.assertTrue(pages[1].has_prev)
+
+        previous = self.paginate(pages[2].first_cursor, backwards=True)
+        self.assertEqual([item.id for item in previous], [7, 6, 5, 4])
+        self.assertTrue(previous.has_prev)
+        first = self.paginate(previous.first_cursor, backwards=True)
+        self.assertEqual([item.id for item in first], [11, 10, 9, 8])
+        self.assertFalse(first.has_prev)
+
+    def test_cursor_of_wrong_length(self):
+        """Курсор с другим числом значений отклоняется до запроса"""
+        with self.assertRaises(ValueError):
+            self.paginate(encode_cursor([5]))
+
+
+class TestCachedCount(unittest.TestCase):
+    """Тестирование кэша счетчика"""
+
+    def setUp(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def slow_counter(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.calls * 10
+
+    def test_cached_until_ttl(self):
+        """Значение пересчитывается только по истечении ttl или после invalidate"""
+        counter = CachedCount(self.slow_counter, ttl=60)
+        self.release.set()
+        self.assertEqual((counter.get(), counter.get()), (10, 10))
+        counter.invalidate()
+        self.assertEqual(counter.get(), 20)
+        counter.ttl = 0
+        counter.invalidate()
+        self.assertEqual(counter.get(), 30)
+        self.assertEqual(counter.get(), 40)
+
+    def test_single_flight(self):
+        """Одновременные вызовы без значения ждут один пересчет"""
+        counter = CachedCount(self.slow_counter, ttl=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(counter.get())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [10] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_during_refresh(self):
+        """Пока идет пересчет, другие потоки получают прежнее значение без ожидания"""
+        counter = CachedCount(self.slow_counter, ttl=0)
+        self.release.set()
+        self.assertEqual(counter.get(), 10)
+
+        self.release.clear()
+        refresh = threading.Thread(target=counter.get)
+        refresh.start()
+        time.sleep(0.05)
+        started_at = time.monotonic()
+        self.assertEqual(counter.get(), 10)
+        self.assertLess(time.monotonic() - started_at, 1)
+        self.release.set()
+        refresh.join(5)
+        self.assertEqual(self.calls, 2)
+
+    def test_failed_refresh_is_retried(self):
+        """Ошибка пересчета передается вызывающему, следующий вызов пересчитывает снова"""
+        outcomes = [RuntimeError('db down'), 7]
+
+        def counter():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        cached = CachedCount(counter)
+        with self.assertRaises(RuntimeError):
+            cached.get()
+        self.assertEqual(cached.get(), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
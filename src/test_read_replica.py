@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Тесты выбора реплики для чтения
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, select, update
+
+import read_replica
+from db_pool import track_writes
+from read_replica import ReplicaRouter, RoutingSession, acting_as
+
+
+class TestReplicaRouter(unittest.TestCase):
+    """Тестирование маршрутизации чтения"""
+
+    def setUp(self):
+        """Маршрутизатор с уже выполненной проверкой реплики"""
+        self.router = ReplicaRouter('postgresql://replica/db', check_interval=60, read_your_writes_window=15)
+        self.router._healthy = True
+        self.router._checked_at = time.monotonic()
+
+    def test_healthy_replica_is_used(self):
+        """Доступная реплика получает чтение"""
+        self.assertTrue(self.router.choose())
+        self.assertEqual(self.router.get_stats()['replica_reads'], 1)
+
+    def test_fallback_when_unhealthy(self):
+        """Недоступная или отстающая реплика - чтение с основной БД"""
+        self.router._healthy = False
+        self.assertFalse(self.router.choose())
+        self.assertEqual(self.router.get_stats()['fallbacks'], 1)
+
+    def test_read_your_writes(self):
+        """После своей записи пользователь читает с основной БД, другие - с реплики"""
+        self.router.note_write(100)
+        with acting_as(100):
+            self.assertFalse(self.router.choose())
+        with acting_as(200):
+            self.assertTrue(self.router.choose())
+        self.assertEqual(self.router.get_stats()['read_your_writes'], 1)
+
+    def test_read_your_writes_window_expires(self):
+        """По истечении окна запись пользователя не влияет на выбор"""
+        self.router.read_your_writes_window = 0
+        self.router.note_write(100)
+        with acting_as(100):
+            self.assertTrue(self.router.choose())
+
+
+class TestRoutingSession(unittest.TestCase):
+    """Тестирование выбора соединения сессией"""
+
+    def setUp(self):
+        """Сессия с основной БД и доступной репликой (обе - sqlite в памяти)"""
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.db = SQLAlchemy(self.app, session_options={'class_': RoutingSession})
+        self.context = self.app.app_context()
+        self.context.push()
+
+        self.router = ReplicaRouter('sqlite://', check_interval=60)
+        self.router._engine = create_engine('sqlite://')
+        self.router._healthy = True
+        self.router._checked_at = time.monotonic()
+        patcher = mock.patch.object(read_replica, 'router', self.router)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        track_writes()
+
+        self.items = Table('items', MetaData(), Column('id', Integer, primary_key=True))
+        self.items.create(self.db.engine)
+        self.session = self.db.session()
+
+    def tearDown(self):
+        self.db.session.remove()
+        self.db.engine.dispose()
+        self.context.pop()
+        self.router._engine.dispose()
+
+    def bind_for(self, statement):
+        return self.session.get_bind(clause=statement)
+
+    def test_marked_select_goes_to_replica(self):
+        """SELECT с replica=True - на реплику, без отметки - на основную БД"""
+        statement = select(self.items.c.id)
+        self.assertIs(self.bind_for(statement.execution_options(replica=True)), self.router.engine())
+        self.assertIs(self.bind_for(statement), self.db.engine)
+
+    def test_reads_block(self):
+        """Внутри reads() на реплику идет любой SELECT"""
+        with read_replica.reads(self.db.session):
+            self.assertIs(self.bind_for(select(self.items.c.id)), self.router.engine())
+        self.assertIs(self.bind_for(select(self.items.c.id)), self.db.engine)
+
+    def test_locking_and_dml_go_to_primary(self):
+        """FOR UPDATE и изменения - всегда на основную БД"""
+        locking = select(self.items.c.id).with_for_update().execution_options(replica=True)
+        self.assertIs(self.bind_for(locking), self.db.engine)
+        statement = update(self.items).values(id=1).execution_options(replica=True)
+        self.assertIs(self.bind_for(statement), self.db.engine)
+
+    def test_core_write_pins_transaction_to_primary(self):
+        """После session.execute(update(...)) чтение до конца транзакции идет на основную БД"""
+        statement = select(self.items.c.id).execution_options(replica=True)
+        self.session.execute(update(self.items).values(id=1))
+        self.assertIs(self.bind_for(statement), self.db.engine)
+        self.session.commit()
+        self.assertIs(self.bind_for(statement), self.router.engine())
+
+    def test_unhealthy_replica(self):
+        """Недоступная реплика - чтение с основной БД"""
+        self.router._healthy = False
+        statement = select(self.items.c.id).execution_options(replica=True)
+        self.assertIs(self.bind_for(statement), self.db.engine)
+
+    def test_pinned_connection(self):
+        """session.connection(bind_arguments={'replica': True}) берет соединение реплики"""
+        connection = self.session.connection(bind_arguments={'replica': True})
+        self.assertIs(connection.engine, self.router.engine())
+        self.assertIs(self.session.connection().engine, self.db.engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Тесты шаблонов сообщений
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from job import Job, format_salary_range
+from job_cache import JobCardCache
+import rendering
+
+
+class TestRendering(unittest.TestCase):
+    """Тестирование отрисовки карточек вакансий"""
+
+    def setUp(self):
+        rendering.job_cards = JobCardCache(max_size=100, ttl=60)
+
+    def test_salary_range(self):
+        """Один формат зарплаты для всех сообщений"""
+        self.assertEqual(format_salary_range(100000, 150000, 'RUB'), '100,000 - 150,000 руб.')
+        self.assertEqual(format_salary_range(100000, None, 'RUB'), 'от 100,000 руб.')
+        self.assertEqual(format_salary_range(None, 5000, 'USD'), 'до 5,000 USD')
+        self.assertEqual(format_salary_range(None, None, 'RUB'), 'По договоренности')
+
+    def test_fields_are_escaped(self):
+        """Пользовательский текст экранируется для parse_mode='HTML'"""
+        job = Job(id=1, title='C++ <senior>', company='A & B', location=None, salary_min=100000,
+                  salary_max=None, salary_currency='RUB', description='x', created_at=datetime(2024, 5, 1),
+                  updated_at=datetime(2024, 5, 1))
+
+        self.assertEqual(
+            rendering.render_job_summary(job),
+            '<b>C++ &lt;senior&gt;</b> в A &amp; B\n   📍 Не указано | 💰 от 100,000 руб.\n'
+        )
+        self.assertIn('📨 <b>Откликов:</b> 3', rendering.render_job_details(job, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
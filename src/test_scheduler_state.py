@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Тесты границы видимых ID вакансий
+"""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from scheduler_state import JobIdHorizon
+
+
+class FakeExecutor:
+    """Заглушка соединения: execute возвращает заданные (last_job_id, xmin, xmax) по очереди"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+
+    def execute(self, statement):
+        row = self.snapshots.pop(0)
+        return SimpleNamespace(one=lambda: row)
+
+
+class TestJobIdHorizon(unittest.TestCase):
+    """Тестирование JobIdHorizon"""
+
+    def setUp(self):
+        self.horizon = JobIdHorizon()
+
+    def advance(self, *snapshots):
+        executor = FakeExecutor(*snapshots)
+        return [self.horizon.safe_job_id(executor) for _ in snapshots]
+
+    def test_no_writers_is_safe_immediately(self):
+        """Без незавершенных транзакций (xmin == xmax) последний ID безопасен сразу"""
+        self.assertEqual(self.advance((10, 500, 500), (15, 510, 510)), [10, 15])
+
+    def test_waits_for_open_transactions(self):
+        """ID становится безопасным, когда завершились все транзакции его снимка"""
+        self.assertEqual(self.advance(
+            (10, 95, 100),   # транзакции 95..99 еще идут и могут держать ID <= 10
+            (12, 98, 103),   # 95..97 завершились, но 98 и 99 еще нет
+            (12, 101, 103),  # все транзакции снимка с ID 10 завершились
+            (12, 103, 103),
+        ), [0, 0, 10, 12])
+        self.assertEqual(len(self.horizon._pending), 0)
+
+    def test_never_goes_back(self):
+        """Граница не уменьшается"""
+        self.assertEqual(self.advance((20, 100, 100), (20, 100, 105), (20, 100, 105)), [20, 20, 20])
+
+    def test_pending_is_bounded(self):
+        """Долгая транзакция не копит снимки сверх max_pending"""
+        self.horizon = JobIdHorizon(max_pending=3)
+        results = self.advance(*[(job_id, 50, 100 + job_id) for job_id in range(1, 11)])
+        self.assertEqual(results, [0] * 10)
+        self.assertEqual(len(self.horizon._pending), 3)
+        self.assertEqual(self.advance((10, 120, 120)), [10])
+
+
+if __name__ == '__main__':
+    unittest.main()
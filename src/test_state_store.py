@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Тесты хранилищ состояний диалогов
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from state_store import MemoryStateStore, RedisStateStore
+
+
+class FakeRedis:
+    """Локальная замена клиента Redis (get/setex/delete с учетом срока жизни)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None or item[0] <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return item[1].encode('utf-8')
+
+    def setex(self, key, ttl, value):
+        self.data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class StateStoreContract:
+    """Общие проверки для всех реализаций хранилища (хранилище - self.store из setUp)"""
+
+    def test_roundtrip_returns_copy(self):
+        """Состояние сохраняется целиком, get() возвращает независимую копию"""
+        state = {'action': 'creating_job', 'step': 'title', 'job_data': {'title': 'Python разработчик'}}
+        self.store.set(1, state)
+        loaded = self.store.get(1)
+        self.assertEqual(loaded, state)
+        loaded['step'] = 'company'
+        self.assertEqual(self.store.get(1)['step'], 'title')
+
+    def test_delete(self):
+        """Удаление состояния"""
+        self.store.set(1, {'step': 'title'})
+        self.store.delete(1)
+        self.store.delete(2)
+        self.assertIsNone(self.store.get(1))
+
+    def test_ttl_expiry(self):
+        """Состояние истекает по сроку жизни"""
+        self.store.ttl = 0.05
+        self.store.set(1, {'step': 'title'})
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get(1))
+
+
+class TestMemoryStateStore(StateStoreContract, unittest.TestCase):
+    """Тестирование хранилища в памяти"""
+
+    def setUp(self):
+        self.store = MemoryStateStore(ttl=60, max_size=3)
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованное состояние"""
+        for user_id in range(3):
+            self.store.set(user_id, {'n': user_id})
+        self.store.get(0)
+        self.store.set(3, {'n': 3})
+        self.assertIsNone(self.store.get(1))
+        self.assertEqual(self.store.get(0), {'n': 0})
+        self.assertEqual(len(self.store), 3)
+
+
+class TestRedisStateStore(StateStoreContract, unittest.TestCase):
+    """Тестирование хранилища в Redis (на локальной замене клиента)"""
+
+    def setUp(self):
+        self.store = RedisStateStore(FakeRedis(), ttl=60)
+
+    def test_compact_serialization(self):
+        """Состояние хранится компактным JSON без экранирования кириллицы"""
+        self.store.prefix = 'test:'
+        self.store.set(5, {'title': 'Менеджер', 'step': 'company'})
+        self.assertEqual(self.store.client.data['test:5'][1], '{"title":"Менеджер","step":"company"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Тесты инвертированного индекса немедленных подписок
+"""
+
+import json
+import os
+import random
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import event
+
+from subscription import Subscription
+from subscription_index import SubscriptionIndex
+from subscription_matcher import IndexedJob, MatcherCache
+from scheduler import NotificationScheduler
+from fixtures import make_job, make_subscription
+
+
+class TestSubscriptionIndex(unittest.TestCase):
+    """Тестирование подбора подписок по индексу"""
+
+    def setUp(self):
+        self.index = SubscriptionIndex()
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_keyword_match(self):
+        """Подписка по ключевому слову находится по подстроке описания"""
+        self.index.bulk_load([
+            make_subscription(1, {'keywords': 'Flask'}),
+            make_subscription(2, {'keywords': 'Django'}),
+        ])
+        self.assertEqual(self.index.match(make_job()), [1])
+
+    def test_location_without_job_location(self):
+        """Вакансия без местоположения подходит под фильтр по городу"""
+        self.index.bulk_load([make_subscription(1, {'location': 'Казань'})])
+        self.assertEqual(self.index.match(make_job(location=None)), [1])
+        self.assertEqual(self.index.match(make_job(location='Москва')), [])
+
+    def test_salary_and_blacklist(self):
+        """Минимальная зарплата и черный список компаний"""
+        self.index.bulk_load([
+            make_subscription(1, {}, min_salary=100000),
+            make_subscription(2, {}, min_salary=200000),
+            make_subscription(3, {}, company_blacklist=['тесткомп']),
+        ])
+        self.assertEqual(self.index.match(make_job()), [1])
+
+    def test_upsert_and_remove(self):
+        """Изменения подписок отражаются в индексе"""
+        subscription = make_subscription(1, {'keywords': 'python'})
+        self.index.bulk_load([subscription])
+        self.assertEqual(self.index.match(make_job()), [1])
+
+        subscription.is_paused = True
+        self.index.upsert(subscription)
+        self.assertEqual(self.index.match(make_job()), [])
+
+        subscription.is_paused = False
+        subscription.criteria = json.dumps({'keywords': 'golang'})
+        self.index.upsert(subscription)
+        self.assertEqual(self.index.match(make_job()), [])
+        self.assertEqual(self.index.match(make_job(title='Golang developer')), [1])
+
+        self.index.remove(1)
+        self.assertEqual(len(self.index), 0)
+
+    def test_close_removes_listeners(self):
+        """После close() индекс больше не подписан на события модели Subscription"""
+        self.assertTrue(event.contains(Subscription, 'after_update', self.index._on_change))
+        self.index.close()
+        for identifier, handler in (('after_insert', self.index._on_change), ('after_update', self.index._on_change),
+                                    ('after_delete', self.index._on_delete)):
+            self.assertFalse(event.contains(Subscription, identifier, handler))
+        self.index.close()  # повторный вызов безопасен
+
+    def test_matches_bruteforce(self):
+        """Результаты индекса совпадают с полным перебором job_matches_criteria"""
+        rng = random.Random(42)
+        words = ['python', 'java', 'go', 'flask', 'sql', 'менеджер', 'продажи', 'аналитик']
+        cities = ['Москва', 'Санкт-Петербург', 'Казань', 'Удаленно']
+        companies = ['Яндекс', 'Сбер', 'ТестКомпания', 'Озон']
+
+        subscriptions = []
+        for subscription_id in range(1, 301):
+            criteria = {}
+            if rng.random() < 0.6:
+                criteria['keywords'] = rng.choice(words)
+            if rng.random() < 0.3:
+                criteria['location'] = rng.choice(cities)[:rng.randint(2, 6)]
+            if rng.random() < 0.2:
+                criteria['company'] = rng.choice(companies)
+            subscriptions.append(make_subscription(
+                subscription_id,
+                criteria,
+                min_salary=rng.choice([None, 50000, 120000, 250000]),
+                exclude_keywords=[rng.choice(words)] if rng.random() < 0.2 else None,
+            ))
+        self.index.bulk_load(subscriptions)
+
+        for _ in range(50):
+            job = make_job(
+                title=' '.join(rng.sample(words, 2)),
+                description=' '.join(rng.sample(words, 4)),
+                company=rng.choice(companies),
+                location=rng.choice(cities + [None]),
+                salary_min=rng.choice([None, 60000, 130000, 300000]),
+            )
+            expected = [
+                s.id for s in subscriptions
+                if NotificationScheduler.job_matches_criteria(None, job, s.get_criteria_dict(), s)
+            ]
+            self.assertEqual(self.index.match(job), expected)
+
+
+
+class TestCompiledSubscription(unittest.TestCase):
+    """Тестирование скомпилированных критериев подписки"""
+
+    def test_cached_by_id_and_updated_at(self):
+        """Подписка разбирается заново только после изменения updated_at"""
+        cache = MatcherCache()
+        subscription = make_subscription(1, {'keywords': 'Python'}, updated_at=datetime(2024, 1, 1))
+        first = cache.get(subscription)
+        self.assertIs(cache.get(subscription), first)
+
+        subscription.criteria = json.dumps({'keywords': 'Go'})
+        subscription.updated_at = datetime(2024, 1, 2)
+        second = cache.get(subscription)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.keywords, 'go')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_unsaved_subscription_not_cached(self):
+        """Подписки без id или updated_at не кэшируются"""
+        cache = MatcherCache()
+        cache.get(make_subscription(None, {}))
+        self.assertEqual(len(cache), 0)
+
+    def test_immutable_and_prepared_filters(self):
+        """Критерии неизменяемы, списки приведены к нижнему регистру"""
+        compiled = MatcherCache().get(make_subscription(
+            1, {},
+            company_blacklist=['Сбер', 'ОЗОН'],
+            employment_types=['Full-Time'],
+        ))
+        self.assertEqual(compiled.company_blacklist, ('сбер', 'озон'))
+        self.assertEqual(compiled.employment_types, frozenset({'full-time'}))
+        with self.assertRaises(AttributeError):
+            compiled.keywords = 'python'
+
+    def test_enum_and_remote_filters(self):
+        """Фильтры по типу занятости и удаленной работе"""
+        compiled = MatcherCache().get(make_subscription(
+            1, {},
+            employment_types=['full-time', 'contract'],
+            only_remote=True,
+        ))
+        self.assertTrue(compiled.matches(IndexedJob(make_job(employment_type='Full-time', is_remote=True))))
+        self.assertFalse(compiled.matches(IndexedJob(make_job(employment_type='part-time', is_remote=True))))
+        self.assertFalse(compiled.matches(IndexedJob(make_job(employment_type='full-time', is_remote=False))))
+
+    def test_blacklist_pattern_escapes_special_characters(self):
+        """Элементы черного списка ищутся как подстроки, а не как регулярные выражения"""
+        compiled = MatcherCache().get(make_subscription(1, {}, company_blacklist=['a.b (c)']))
+        self.assertFalse(compiled.matches(IndexedJob(make_job(company='ООО a.b (c)'))))
+        self.assertTrue(compiled.matches(IndexedJob(make_job(company='axb c'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Тесты пакетной фиксации изменений
+"""
+
+import os
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import unit_of_work
+from unit_of_work import UnitOfWork, commit, current
+
+
+class FakeSession:
+    """Заглушка db.session: считает commit и rollback"""
+
+    def __init__(self):
+        self.new = set()
+        self.dirty = set()
+        self.deleted = set()
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+        self.dirty.clear()
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.dirty.clear()
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """Тестирование UnitOfWork"""
+
+    def setUp(self):
+        self.session = FakeSession()
+        patcher = mock.patch.object(unit_of_work, 'db', SimpleNamespace(session=self.session))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_commit_without_unit(self):
+        """Вне блока commit() фиксирует сразу"""
+        commit()
+        commit()
+        self.assertEqual(self.session.commits, 2)
+
+    def test_batches(self):
+        """Внутри блока commit выполняется раз в batch_size изменений и при выходе"""
+        with UnitOfWork(batch_size=3) as unit:
+            for _ in range(7):
+                commit()
+            self.assertEqual(self.session.commits, 2)
+        self.assertEqual(self.session.commits, 3)
+        self.assertEqual((unit.changes, unit.commits, unit.pending), (7, 3, 0))
+        self.assertIsNone(current())
+
+    def test_no_empty_commit(self):
+        """Блок без изменений не выполняет commit, несохраненные объекты сессии фиксируются"""
+        with UnitOfWork():
+            pass
+        self.assertEqual(self.session.commits, 0)
+
+        with UnitOfWork():
+            self.session.dirty.add('subscription')
+        self.assertEqual(self.session.commits, 1)
+
+    def test_rollback_on_error(self):
+        """При исключении незафиксированная пачка откатывается, исключение не подавляется"""
+        with self.assertRaises(RuntimeError):
+            with UnitOfWork(batch_size=2):
+                for _ in range(3):
+                    commit()
+                raise RuntimeError('boom')
+        self.assertEqual((self.session.commits, self.session.rollbacks), (1, 1))
+        self.assertIsNone(current())
+
+    def test_nested_uses_outer(self):
+        """Вложенный блок работает в составе внешнего и не фиксирует при выходе"""
+        with UnitOfWork() as outer:
+            with UnitOfWork() as inner:
+                self.assertIs(inner, outer)
+                commit()
+            self.assertEqual(self.session.commits, 0)
+            self.assertIs(current(), outer)
+        self.assertEqual((self.session.commits, outer.changes), (1, 1))
+
+    def test_nested_error_rolls_back_once(self):
+        """Исключение из вложенного блока откатывает внешний UnitOfWork один раз"""
+        with self.assertRaises(ValueError):
+            with UnitOfWork():
+                commit()
+                with UnitOfWork():
+                    raise ValueError('inner')
+        self.assertEqual((self.session.commits, self.session.rollbacks), (0, 1))
+
+    def test_per_thread(self):
+        """UnitOfWork одного потока не виден в другом"""
+        seen = []
+        with UnitOfWork():
+            thread = threading.Thread(target=lambda: seen.append(current()))
+            thread.start()
+            thread.join(5)
+        self.assertEqual(seen, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
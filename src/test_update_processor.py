@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Тесты пула обработки update
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import telebot
+from flask import Flask, has_app_context
+from telebot import apihelper, types
+
+from update_processor import PooledTeleBot, UpdateProcessor, update_chat_key
+from fixtures import make_update
+
+
+class FakeBot:
+    """Заглушка PooledTeleBot: запоминает порядок обработки update"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.update_processor = None
+        self.processed = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def dispatch_updates(self, updates):
+        assert has_app_context()
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.processed.extend((update.message.chat.id, update.update_id) for update in updates)
+        if updates[0].message.text == 'fail':
+            raise RuntimeError('handler error')
+
+
+class TestUpdateProcessor(unittest.TestCase):
+    """Тестирование порядка и параллельности обработки"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.bot = FakeBot()
+        # Воркеры запускаются при первом submit(), поэтому тест может заменить пул
+        self.processor = UpdateProcessor(self.bot, self.app, workers=4, queue_size=100)
+
+    def tearDown(self):
+        self.processor.stop(5)
+
+    def test_per_chat_order(self):
+        """Update одного чата обрабатываются в порядке поступления"""
+        self.bot.delay = 0.001
+        for update_id in range(200):
+            self.processor.submit(make_update(update_id, chat_id=update_id % 7))
+        self.assertTrue(self.processor.join(10))
+        for chat_id in range(7):
+            ids = [update_id for chat, update_id in self.bot.processed if chat == chat_id]
+            self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(self.bot.processed), 200)
+
+    def test_chats_processed_in_parallel(self):
+        """Медленный обработчик одного чата не блокирует остальные"""
+        self.bot.delay = 0.2
+        started_at = time.monotonic()
+        for chat_id in range(4):
+            self.processor.submit(make_update(chat_id, chat_id=chat_id))
+        self.assertTrue(self.processor.join(5))
+        self.assertLess(time.monotonic() - started_at, 0.6)
+        self.assertGreater(self.bot.max_active, 1)
+
+    def test_handler_error_does_not_stop_worker(self):
+        """Ошибка обработчика учитывается, воркер продолжает работу"""
+        self.processor = UpdateProcessor(self.bot, self.app, workers=1)
+        self.processor.submit(make_update(1, chat_id=1, text='fail'))
+        self.processor.submit(make_update(2, chat_id=1))
+        self.assertTrue(self.processor.join(5))
+        stats = self.processor.get_stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['processed'], 1)
+
+    def test_full_queue_rejects_without_blocking(self):
+        """При переполненной очереди submit(block=False) возвращает False"""
+        self.bot.delay = 0.2
+        self.processor = UpdateProcessor(self.bot, self.app, workers=1, queue_size=1)
+        results = [self.processor.submit(make_update(i, chat_id=1), block=False) for i in range(5)]
+        self.assertIn(False, results)
+        self.assertGreaterEqual(self.processor.get_stats()['rejected'], 1)
+
+    def test_polling_offset_advances_on_submit(self):
+        """PooledTeleBot сдвигает last_update_id сразу при постановке в очередь"""
+        bot = PooledTeleBot('123:abc')
+        self.processor = UpdateProcessor(bot, self.app, workers=1)
+        bot.dispatch_updates = lambda updates: None
+        bot.process_new_updates([make_update(41, chat_id=1), make_update(42, chat_id=2)])
+        self.assertEqual(bot.last_update_id, 42)
+        self.assertTrue(self.processor.join(5))
+
+    def test_before_request_for_every_api_call(self):
+        """before_request вызывается перед любым методом API этого бота и не трогает другие боты"""
+        calls = []
+        bot = PooledTeleBot('123:abc', before_request=lambda: calls.append('hook'))
+        other = telebot.TeleBot('456:def')
+
+        def sender(method, url, **kwargs):
+            calls.append(url.rsplit('/', 1)[-1])
+            return SimpleNamespace(status_code=200, text='{"ok": true, "result": true}',
+                                   json=lambda: {'ok': True, 'result': True})
+
+        with mock.patch.object(apihelper, 'CUSTOM_REQUEST_SENDER', sender):
+            bot.delete_message(1, 2)
+            bot.send_chat_action(1, 'typing')
+            other.delete_message(1, 2)
+            bot.before_request = None
+            bot.delete_message(1, 2)
+        self.assertEqual(calls, ['hook', 'deleteMessage', 'hook', 'sendChatAction', 'deleteMessage', 'deleteMessage'])
+
+    def test_chat_key_for_callback(self):
+        """Для callback_query ключом служит чат исходного сообщения"""
+        update = types.Update.de_json({
+            'update_id': 1,
+            'callback_query': {
+                'id': '1',
+                'from': {'id': 5, 'is_bot': False, 'first_name': 'Test'},
+                'chat_instance': 'x',
+                'data': 'main_menu',
+                'message': {'message_id': 1, 'date': 0, 'chat': {'id': 77, 'type': 'private'}, 'text': 'x'},
+            }
+        })
+        self.assertEqual(update_chat_key(update), 77)
+
+
+if __name__ == '__main__':
+    unittest.main()
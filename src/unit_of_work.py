@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+from core import db
+
+logger = logging.getLogger(__name__)
+
+# Сколько изменений накапливать до commit внутри UnitOfWork
+UOW_BATCH_SIZE = int(os.getenv('UOW_BATCH_SIZE', 500))
+
+_local = threading.local()
+
+
+class UnitOfWork:
+    """Пакетная фиксация изменений моделей
+
+    Внутри блока ``with UnitOfWork():`` методы моделей (mark_notification_sent,
+    deactivate, update_status и т.п.) не вызывают commit сами, а только
+    отмечают изменение; commit выполняется раз в batch_size изменений и при
+    выходе из блока. При исключении незафиксированная пачка откатывается.
+    Вложенные блоки используют внешний UnitOfWork.
+    """
+
+    def __init__(self, batch_size: int = UOW_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.pending = 0
+        self.commits = 0
+        self.changes = 0
+        self._outer: Optional['UnitOfWork'] = None
+
+    def __enter__(self):
+        self._outer = current()
+        if self._outer is None:
+            _local.unit = self
+        return self._outer or self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._outer is not None:
+            return False
+        _local.unit = None
+        if exc_type is not None:
+            db.session.rollback()
+            return False
+        self.flush()
+        return False
+
+    def add(self, count: int = 1):
+        """Отмечает изменения; при заполнении пачки фиксирует ее"""
+        self.pending += count
+        self.changes += count
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Фиксирует накопленную пачку"""
+        if not self.pending and not db.session.new and not db.session.dirty and not db.session.deleted:
+            return
+        db.session.commit()
+        self.commits += 1
+        self.pending = 0
+
+
+def current() -> Optional[UnitOfWork]:
+    """Активный UnitOfWork текущего потока (или None)"""
+    return getattr(_local, 'unit', None)
+
+
+def commit():
+    """Фиксирует изменения модели: сразу или в составе активного UnitOfWork"""
+    unit = current()
+    if unit is None:
+        db.session.commit()
+    else:
+        unit.add()
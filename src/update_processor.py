@@ -0,0 +1,245 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import telebot
+from telebot import apihelper, types
+
+from read_replica import acting_as
+
+logger = logging.getLogger(__name__)
+
+# Количество воркеров обработки update и размер очереди одного воркера
+DEFAULT_WORKERS = int(os.getenv('BOT_WORKERS', 8))
+DEFAULT_QUEUE_SIZE = int(os.getenv('BOT_QUEUE_SIZE', 100))
+
+# Поля Update, из которых берется чат для упорядочивания
+_MESSAGE_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                   'business_message', 'edited_business_message')
+_USER_FIELDS = ('callback_query', 'inline_query', 'chosen_inline_result', 'shipping_query',
+                'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request')
+
+# Маркер остановки воркера
+_STOP = object()
+
+# before_request ботов по токену (см. PooledTeleBot.before_request)
+_request_hooks: Dict[str, Callable[[], None]] = {}
+_make_request = apihelper._make_request
+
+
+def _make_hooked_request(token, method_name, method='get', params=None, files=None):
+    hook = _request_hooks.get(token)
+    if hook is not None:
+        hook()
+    return _make_request(token, method_name, method, params, files)
+
+
+def update_chat_key(update: types.Update) -> int:
+    """Ключ упорядочивания update: ID чата (или пользователя), иначе update_id"""
+    for field in _MESSAGE_FIELDS:
+        message = getattr(update, field, None)
+        if message is not None:
+            return message.chat.id
+    callback_query = getattr(update, 'callback_query', None)
+    if callback_query is not None and callback_query.message is not None:
+        return callback_query.message.chat.id
+    for field in _USER_FIELDS:
+        event = getattr(update, field, None)
+        if event is None:
+            continue
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+        if user is not None:
+            return user.id
+    return update.update_id
+
+
+class PooledTeleBot(telebot.TeleBot):
+    """TeleBot, передающий полученные update в UpdateProcessor
+
+    Бот создается с threaded=False: обработчики выполняются синхронно внутри
+    воркера UpdateProcessor, а не во встроенном пуле потоков telebot.
+
+    before_request (если задан) вызывается перед каждым запросом этого бота к
+    Telegram API: например, чтобы завершить транзакцию только с чтением на
+    время сетевого запроса. Перехват выполняется в apihelper._make_request,
+    через который идут все методы API, и только для токена этого бота;
+    запросы других ботов и CUSTOM_REQUEST_SENDER не затрагиваются.
+    """
+
+    def __init__(self, token, before_request: Optional[Callable[[], None]] = None, **kwargs):
+        kwargs.setdefault('threaded', False)
+        super().__init__(token, **kwargs)
+        self.update_processor: Optional['UpdateProcessor'] = None
+        self._before_request = None
+        self.before_request = before_request
+
+    @property
+    def before_request(self) -> Optional[Callable[[], None]]:
+        return self._before_request
+
+    @before_request.setter
+    def before_request(self, hook: Optional[Callable[[], None]]):
+        previous, self._before_request = self._before_request, hook
+        if hook is not None:
+            _request_hooks[self.token] = hook
+            apihelper._make_request = _make_hooked_request
+        elif previous is not None and _request_hooks.get(self.token) is previous:
+            del _request_hooks[self.token]
+
+    def process_new_updates(self, updates: List[types.Update]):
+        if self.update_processor is None:
+            return super().process_new_updates(updates)
+        for update in updates:
+            # last_update_id обновляется сразу, иначе polling получит те же update повторно
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            self.update_processor.submit(update)
+
+    def dispatch_updates(self, updates: List[types.Update]):
+        """Синхронно вызывает обработчики для update"""
+        super().process_new_updates(updates)
+
+
+class UpdateProcessor:
+    """Пул воркеров обработки update с сохранением порядка внутри чата
+
+    Update распределяются по воркерам по хэшу ID чата: сообщения одного чата
+    обрабатываются строго по очереди, разных чатов - параллельно. Каждый update
+    обрабатывается в собственном app_context Flask и, следовательно, в своей
+    сессии БД.
+    """
+
+    def __init__(self, bot: PooledTeleBot, app, workers: int = DEFAULT_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            bot: Экземпляр PooledTeleBot
+            app: Flask-приложение (для app_context)
+            workers: Количество воркеров
+            queue_size: Максимальный размер очереди одного воркера
+        """
+        self.bot = bot
+        self.app = app
+        self.workers = max(1, workers)
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.running = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'received': 0, 'processed': 0, 'failed': 0, 'rejected': 0}
+        self._busy_seconds = 0.0
+
+        bot.update_processor = self
+
+    def start(self):
+        """Запускает воркеры (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            self._threads = [
+                threading.Thread(target=self._worker, args=(shard,), name=f'updates-{i}', daemon=True)
+                for i, shard in enumerate(self._queues)
+            ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Обработчик update запущен: {self.workers} воркеров")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает воркеры после обработки уже принятых update"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            threads, self._threads = self._threads, []
+        for shard in self._queues:
+            shard.put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        logger.info("Обработчик update остановлен")
+
+    def submit(self, update: types.Update, block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Ставит update в очередь воркера его чата
+
+        Args:
+            update: Объект Update
+            block: Ждать освобождения места в очереди
+            timeout: Максимальное время ожидания (сек.)
+
+        Returns:
+            bool: False, если очередь переполнена и update не принят
+        """
+        self.start()
+        shard = self._queues[hash(update_chat_key(update)) % self.workers]
+        try:
+            shard.put(update, block=block, timeout=timeout)
+        except queue.Full:
+            self._count('rejected')
+            logger.warning(f"Очередь update переполнена, update {update.update_id} отклонен")
+            return False
+        self._count('received')
+        return True
+
+    def pending(self) -> int:
+        """Количество update, ожидающих обработки"""
+        return sum(shard.qsize() for shard in self._queues)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Ждет обработки всех принятых update; возвращает False по таймауту"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for shard in self._queues:
+            with shard.all_tasks_done:
+                while shard.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    shard.all_tasks_done.wait(remaining)
+        return True
+
+    def _worker(self, shard: queue.Queue):
+        while True:
+            update = shard.get()
+            try:
+                if update is _STOP:
+                    return
+                self._process(update)
+            finally:
+                shard.task_done()
+
+    def _process(self, update: types.Update):
+        started_at = time.monotonic()
+        try:
+            # Записи пользователя видны ему сразу: его чтение после записи идет на основную БД
+            with self.app.app_context(), acting_as(update_chat_key(update)):
+                self.bot.dispatch_updates([update])
+            self._count('processed')
+        except Exception as e:
+            self._count('failed')
+            logger.error(f"Ошибка обработки update {update.update_id}: {e}")
+        finally:
+            with self._stats_lock:
+                self._busy_seconds += time.monotonic() - started_at
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику обработки update"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            busy_seconds = self._busy_seconds
+        stats['workers'] = self.workers
+        stats['pending'] = self.pending()
+        handled = stats['processed'] + stats['failed']
+        stats['avg_handler_ms'] = round(busy_seconds / handled * 1000, 1) if handled else 0.0
+        return stats
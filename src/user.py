@@ -1,10 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from core import db
+from sqlalchemy.dialects.postgresql import JSONB
+from core import db, as_json_list
+import unit_of_work
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_skills', 'skills', postgresql_using='gin', postgresql_ops={'skills': 'jsonb_path_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     telegram_id = db.Column(db.BigInteger, unique=True, nullable=False, index=True)
@@ -22,7 +27,7 @@ class User(db.Model):
     position = db.Column(db.String(100), nullable=True)
     location = db.Column(db.String(100), nullable=True)
     bio = db.Column(db.Text, nullable=True)
-    skills = db.Column(db.Text, nullable=True)  # JSON string
+    skills = db.Column(JSONB, nullable=True)  # JSON array
     experience_years = db.Column(db.Integer, nullable=True)
     education = db.Column(db.Text, nullable=True)
     
@@ -69,10 +74,14 @@ class User(db.Model):
         else:
             return f"User {self.telegram_id}"
     
+    def get_skills_list(self):
+        """Возвращает список навыков"""
+        return as_json_list(self.skills)
+    
     def update_last_activity(self):
         """Обновляет время последней активности"""
         self.last_activity = datetime.utcnow()
-        db.session.commit()
+        unit_of_work.commit()
     
     def to_dict(self):
         """Преобразует объект в словарь для JSON"""
@@ -89,7 +98,7 @@ class User(db.Model):
             'position': self.position,
             'location': self.location,
             'bio': self.bio,
-            'skills': self.skills,
+            'skills': self.get_skills_list(),
             'experience_years': self.experience_years,
             'education': self.education,
             'resume_path': self.resume_path,
@@ -0,0 +1,257 @@
+import atexit
+import logging
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import BigInteger, DateTime, Integer, column, func, update, values
+from telebot.handler_backends import BaseMiddleware
+
+from user import User
+from job import Job
+
+logger = logging.getLogger(__name__)
+
+# Как часто сбрасывать накопленные отметки активности в БД (сек.)
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 30))
+
+# Максимум строк в одном UPDATE
+ACTIVITY_FLUSH_BATCH_SIZE = 1000
+
+# Кэш ролей пользователей между update: размер и время жизни записи (сек.)
+USER_ROLE_CACHE_SIZE = int(os.getenv('USER_ROLE_CACHE_SIZE', 10000))
+USER_ROLE_CACHE_TTL = float(os.getenv('USER_ROLE_CACHE_TTL', 60))
+
+
+class BufferedWriter(ABC):
+    """Буфер отметок в памяти с периодической записью в БД
+
+    Обработчики только добавляют отметку в буфер; фоновый поток раз в
+    flush_interval секунд записывает накопленное пачками UPDATE ... FROM
+    (VALUES ...). Подклассы задают объединение отметок одного ключа
+    (_merge) и запрос записи пачки (_update_statement).
+    """
+
+    name = 'buffered-writer'
+
+    def __init__(self, app, db, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.app = app
+        self.db = db
+        self.flush_interval = flush_interval
+
+        self._pending: Dict[int, object] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _add(self, key: int, value):
+        with self._lock:
+            self._pending[key] = self._merge(self._pending.get(key), value)
+        self.start()
+
+    @staticmethod
+    @abstractmethod
+    def _merge(current, value):
+        """Объединяет накопленную отметку ключа (или None) с новой"""
+
+    @staticmethod
+    @abstractmethod
+    def _update_statement(items):
+        """UPDATE для пачки [(ключ, отметка), ...]"""
+
+    def pending(self) -> int:
+        """Количество ключей с незаписанными отметками"""
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        """Запускает фоновую запись (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Останавливает фоновую запись и сбрасывает остаток буфера"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop_event.set()
+            thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Записывает накопленные отметки в БД, возвращает число ключей"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        items = list(pending.items())
+        try:
+            with self.app.app_context():
+                for start in range(0, len(items), ACTIVITY_FLUSH_BATCH_SIZE):
+                    self.db.session.execute(self._update_statement(items[start:start + ACTIVITY_FLUSH_BATCH_SIZE]))
+                self.db.session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка фоновой записи ({self.name}): {e}")
+            # Возвращаем отметки в буфер, чтобы записать их при следующей попытке
+            with self._lock:
+                for key, value in items:
+                    self._pending[key] = self._merge(self._pending.get(key), value)
+            return 0
+
+        logger.debug(f"Фоновая запись ({self.name}): {len(items)} строк")
+        return len(items)
+
+
+class ActivityTracker(BufferedWriter):
+    """Буфер отметок last_activity (из нескольких отметок пользователя сохраняется самая поздняя)"""
+
+    name = 'activity-tracker'
+
+    def touch(self, telegram_id: int, at: Optional[datetime] = None):
+        """Отмечает активность пользователя (без обращения к БД)"""
+        self._add(telegram_id, at or datetime.utcnow())
+
+    @staticmethod
+    def _merge(current, value):
+        return value if current is None or current < value else current
+
+    @staticmethod
+    def _update_statement(items):
+        activity = values(
+            column('telegram_id', BigInteger),
+            column('last_activity', DateTime),
+            name='activity'
+        ).data(items)
+        users = User.__table__
+        return (
+            update(users)
+            .where(users.c.telegram_id == activity.c.telegram_id)
+            .values(last_activity=func.greatest(
+                func.coalesce(users.c.last_activity, activity.c.last_activity),
+                activity.c.last_activity
+            ))
+        )
+
+
+class JobViewCounter(BufferedWriter):
+    """Буфер просмотров вакансий: views_count увеличивается пачкой, без записи на каждый просмотр"""
+
+    name = 'job-views'
+
+    def add(self, job_id: int, count: int = 1):
+        """Учитывает просмотр вакансии (без обращения к БД)"""
+        self._add(job_id, count)
+
+    @staticmethod
+    def _merge(current, value):
+        return (current or 0) + value
+
+    @staticmethod
+    def _update_statement(items):
+        views = values(
+            column('job_id', Integer),
+            column('views', Integer),
+            name='views'
+        ).data(items)
+        jobs = Job.__table__
+        return (
+            update(jobs)
+            .where(jobs.c.id == views.c.job_id)
+            # updated_at не меняется: просмотр не изменяет вакансию (ключ кэша карточек)
+            .values(views_count=func.coalesce(jobs.c.views_count, 0) + views.c.views, updated_at=jobs.c.updated_at)
+        )
+
+
+class UserCache:
+    """Кэш пользователей в пределах обработки одного update
+
+    Кэш хранится в thread-local и действует только между begin() и end(),
+    поэтому повторные get_user в одном обработчике не ходят в БД, а следующий
+    update всегда читает свежие данные. Вне update кэш выключен.
+
+    Отдельно между update хранятся только ID и роль пользователя (bounded
+    LRU с TTL): их достаточно для горячих экранов вроде карточки вакансии.
+    Смена роли в этом экземпляре сбрасывает запись сразу (forget), в других -
+    не позже чем через role_ttl секунд.
+    """
+
+    def __init__(self, role_cache_size: int = USER_ROLE_CACHE_SIZE, role_ttl: float = USER_ROLE_CACHE_TTL):
+        self._local = threading.local()
+        self.role_cache_size = role_cache_size
+        self.role_ttl = role_ttl
+        self._roles: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._roles_lock = threading.Lock()
+
+    def begin(self):
+        """Начинает обработку update с пустым кэшем"""
+        self._local.users = {}
+
+    def end(self):
+        """Завершает обработку update"""
+        self._local.users = None
+
+    def get(self, telegram_id: int) -> Optional[User]:
+        users = getattr(self._local, 'users', None)
+        return users.get(telegram_id) if users is not None else None
+
+    def get_role(self, telegram_id: int) -> Optional[Tuple[int, str]]:
+        """(user_id, user_type) пользователя без обращения к БД или None"""
+        now = time.monotonic()
+        with self._roles_lock:
+            entry = self._roles.get(telegram_id)
+            if entry is None:
+                return None
+            expires_at, role = entry
+            if expires_at <= now:
+                del self._roles[telegram_id]
+                return None
+            self._roles.move_to_end(telegram_id)
+            return role
+
+    def put(self, user: User):
+        users = getattr(self._local, 'users', None)
+        if users is not None:
+            users[user.telegram_id] = user
+        if self.role_cache_size > 0:
+            with self._roles_lock:
+                self._roles[user.telegram_id] = (time.monotonic() + self.role_ttl, (user.id, user.user_type))
+                self._roles.move_to_end(user.telegram_id)
+                while len(self._roles) > self.role_cache_size:
+                    self._roles.popitem(last=False)
+
+    def forget(self, telegram_id: int):
+        """Удаляет пользователя из кэша (после изменения его данных)"""
+        users = getattr(self._local, 'users', None)
+        if users is not None:
+            users.pop(telegram_id, None)
+        with self._roles_lock:
+            self._roles.pop(telegram_id, None)
+
+
+class UserCacheMiddleware(BaseMiddleware):
+    """Middleware telebot: открывает кэш пользователей на время обработки update"""
+
+    def __init__(self, user_cache: UserCache, update_types=('message', 'edited_message', 'callback_query')):
+        super().__init__()
+        self.user_cache = user_cache
+        self.update_types = list(update_types)
+
+    def pre_process(self, message, data):
+        self.user_cache.begin()
+
+    def post_process(self, message, data, exception):
+        self.user_cache.end()